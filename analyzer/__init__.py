@@ -0,0 +1,5 @@
+from analyzer.api import scan
+from analyzer.analyze import ScanResult
+from analyzer.estimator import Estimate, estimate
+
+__all__ = ["scan", "ScanResult", "estimate", "Estimate"]
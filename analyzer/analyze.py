@@ -4,10 +4,84 @@ import stat
 
 from collections import defaultdict
 
-from analyzer.categories import Typer
+from analyzer.categories import Classifier
+from analyzer.distribution import SizeDistribution
 from analyzer import utils
 
 
+class ScanResult:
+    """
+    The ScanResult class holds the results of a directory analysis.
+
+    Public Attributes:
+        categories (dict): Total size in bytes of each file type category.
+        big_files (list): (path, size) pairs of files bigger than the threshold.
+        unusual_permissions (list): (path, mode, description) tuples of files with unusual permissions.
+        classification (list): Lines describing the classification policy and its statistics.
+        classification_stats (dict): Statistics of the classification, as returned by Classifier.stats().
+        distributions (dict): SizeDistribution of the sizes of the files of each category.
+
+    Public Methods:
+        summary(): Get the summary of file types and their sizes.
+        distribution_summary(): Get the summary of the distributions of file sizes of each category.
+    """
+
+    def __init__(
+        self,
+        categories: dict,
+        big_files: list,
+        unusual_permissions: list,
+        classification: list,
+        classification_stats: dict = None,
+        distributions: dict = None,
+    ):
+        """
+        Initialize the ScanResult.
+
+        Args:
+            categories (dict): Total size in bytes of each file type category.
+            big_files (list): (path, size) pairs of files bigger than the threshold.
+            unusual_permissions (list): (path, mode, description) tuples of files with unusual permissions.
+            classification (list): Lines describing the classification policy and its statistics.
+            classification_stats (dict): Statistics of the classification, to merge results (default: None).
+            distributions (dict): SizeDistribution of the sizes of the files of each category (default: None).
+        """
+        self.categories = categories
+        self.big_files = big_files
+        self.unusual_permissions = unusual_permissions
+        self.classification = classification
+        self.classification_stats = classification_stats
+        self.distributions = distributions if distributions is not None else {}
+
+    def summary(self) -> list:
+        """
+        Get the summary of file types and their sizes, followed by the classification policy used.
+
+        Returns:
+            list: Lines of the summary.
+        """
+        lines = [
+            f"{key}: {utils.file_size(value)}."
+            for key, value in self.categories.items()
+        ]
+        return lines + self.classification
+
+    def distribution_summary(self) -> list:
+        """
+        Get the summary of the distributions of file sizes of each category: the number of files,
+        the quantiles of their sizes and the histogram of their sizes with log2 buckets.
+        Directories and symbolic links are not included.
+
+        Returns:
+            list: Lines of the summary.
+        """
+        lines = []
+        for category, distribution in self.distributions.items():
+            if distribution.count():
+                lines.extend(distribution.summary(category))
+        return lines
+
+
 class Analyzer:
     """
     The Analyzer class provides functionality to analyze files in a directory,
@@ -18,9 +92,11 @@ class Analyzer:
         None
 
     Public Methods:
-        add(path: str): Add a file or a directory to the analyzer and log its information.
-        add_link(path:str): Add a symbolic link to the analyzer without following it.
+        add(path: str, file_stat: os.stat_result = None): Add a file or a directory to the analyzer and log its information.
+        add_link(path: str, link_stat: os.stat_result = None): Add a symbolic link to the analyzer without following it.
         print_summary(): Print the summary of file types and their sizes to stdout.
+        result(): Get the results of the analysis as a ScanResult.
+        merge(result: ScanResult): Add the results of an analysis done elsewhere.
         close(): Close the output files.
     """
 
@@ -29,6 +105,14 @@ class Analyzer:
         threshold: int = 2048,
         unusual_perm_out: str = "report.txt",
         big_files_out: str = "",
+        policy: str = "signature",
+        sample_rate: float = 0.1,
+        empty_files: str = "extension",
+        max_sniff_size: int = 0,
+        sniff_offline: bool = False,
+        collect: bool = False,
+        recorders: list = None,
+        scheduler=None,
     ):
         """
         Initialize the Analyzer.
@@ -37,16 +121,48 @@ class Analyzer:
             threshold (int): The size threshold for identifying large files (default: 2048 bytes).
             unusual_perm_out (str): Path to the file for logging files with unusual permissions (default: "report.txt").
             big_files_out (str): Path to the file for logging large files (default: ""). If no file is provided, sys.stdout is used.
+            policy (str): The classification policy, one of Classifier.POLICIES (default: "signature").
+            sample_rate (float): The fraction of files verified by signature with the "sample" policy (default: 0.1).
+            empty_files (str): How to classify empty files: by "extension" or as "empty" (default: "extension").
+            max_sniff_size (int): Files bigger than this size are classified without reading (default: 0, no limit).
+            sniff_offline (bool): Whether to read offline (stub) files to classify them (default: False).
+            collect (bool): Whether to collect large files and files with unusual permissions in memory
+                            for the result() instead of logging them to files (default: False).
+            recorders (list): Objects with record(path, file_stat, category) and close() methods,
+                              which are given every analyzed entry, e.g. ScanIndex (default: None).
+                              They are closed together with the analyzer.
+            scheduler (IOScheduler): The scheduler throttling the reads of files to classify them
+                                     (default: None, no throttling).
 
         Raises:
+            ValueError: If the classification policies or the sample rate are invalid.
             Exception: If unable to open the specified output files.
         """
-        self._typer = Typer()  # Instantiate the Typer class from the categories module
+        # Instantiate the Classifier class from the categories module
+        self._classifier = Classifier(
+            policy,
+            sample_rate,
+            empty_files=empty_files,
+            max_sniff_size=max_sniff_size,
+            sniff_offline=sniff_offline,
+            scheduler=scheduler,
+        )
         self._type_size_count = defaultdict(int)  # Initialize a counter for file types
+        self._distributions = {}  # SizeDistribution of the files of each category
         self._threshold = (
             threshold  # Set the size threshold for identifying large files
         )
 
+        # Large files (size) and files with unusual permissions (mode, description)
+        # collected for the result, by path
+        self._big_files = {}
+        self._unusual_permissions = {}
+        self._recorders = list(recorders) if recorders else []
+        self._collect = collect
+        if collect:
+            self._up_out = self._bf_out = None
+            return
+
         # Open the file for logging files with unusual permissions
         self._up_out = open(unusual_perm_out, "w")
         try:
@@ -68,85 +184,182 @@ class Analyzer:
 
         unusual_perm = utils.unusual_permissions(mode)
         if unusual_perm:
-            self._up_out.write(f"{path}: {stat.filemode(mode)} ({unusual_perm})\n")
+            self._log_unusual_permissions(path, mode, unusual_perm)
 
-    def _add_dir(self, path: str):
+    def _log_unusual_permissions(self, path: str, mode: int, description: str):
+        """
+        Log or collect a file with unusual permissions.
+
+        Args:
+            path (str): The path to the file.
+            mode (int): The mode (permissions) of the file.
+            description (str): The description of the unusual permissions.
+        """
+        if self._collect:
+            self._unusual_permissions[path] = (mode, description)
+        else:
+            self._up_out.write(f"{path}: {stat.filemode(mode)} ({description})\n")
+
+    def _log_big_file(self, path: str, size: int):
+        """
+        Log or collect a large file.
+
+        Args:
+            path (str): The path to the file.
+            size (int): The size of the file in bytes.
+        """
+        if self._collect:
+            self._big_files[path] = size
+        else:
+            self._bf_out.write(f"{path}: {utils.file_size(size)}\n")
+
+    def _add_dir(self, path: str, dir_stat: os.stat_result):
         """
         Add a directory to the analyzer and log its information.
         Directories are treated as a separate file category and counted in total size statistic.
 
         Args:
             path (str): The path to the directory to analyze.
+            dir_stat (os.stat_result): The stat result of the directory.
         """
-        dir_size = os.path.getsize(path)
-        mode = os.stat(path).st_mode
-        self._log_permissions(mode, path)
-        self._type_size_count["directories"] += dir_size
+        self._log_permissions(dir_stat.st_mode, path)
+        self._type_size_count["directories"] += dir_stat.st_size
+        self._record(path, dir_stat, "directories")
 
-    def add(self, path: str):
+    def add(self, path: str, file_stat: os.stat_result = None):
         """
         Add a file or a directory to the analyzer and log its information.
 
         Args:
             path (str): The path to the file/directory to analyze.
+            file_stat (os.stat_result): The stat result of the file/directory, if it is already known
+                                        (e.g. from directory traversal). If not provided, the path is stat'ed.
         """
-        if os.path.isdir(path):
-            self._add_dir(path)
+        if file_stat is None:
+            file_stat = os.stat(path)  # Get file statistics
+        if stat.S_ISDIR(file_stat.st_mode):
+            self._add_dir(path, file_stat)
         else:
-            self._add_file(path)
+            self._add_file(path, file_stat)
 
-    def _add_file(self, path: str):
+    def _add_file(self, path: str, file_stat: os.stat_result):
         """
         Add a file to the analyzer and log its information.
 
         Args:
             path (str): The path to the file to analyze.
+            file_stat (os.stat_result): The stat result of the file.
         """
-        file_stat = os.stat(path)  # Get file statistics
         self._log_permissions(
             file_stat.st_mode, path
         )  # Analyze file permissions and log if unusual
 
-        category = ""
-
-        # Determine the file type category based on its file signature
-        try:
-            category = self._typer.from_signature(path)
-        # If the file can't be read, its type is obtained from its extension
-        except PermissionError:
-            category = self._typer.from_extension(path)
+        # Determine the file type category according to the classification policy,
+        # the stat result lets it skip reading files that are empty, offline or too big
+        category = self._classifier.classify(path, file_stat)
         if file_stat.st_size > self._threshold:
-            self._bf_out.write(
-                f"{path}: {utils.file_size(file_stat.st_size)}\n"
-            )  # Log large files
+            self._log_big_file(path, file_stat.st_size)  # Log large files
         self._type_size_count[
             category
         ] += file_stat.st_size  # Update the file type counter
+        distribution = self._distributions.get(category)
+        if distribution is None:
+            distribution = self._distributions[category] = SizeDistribution()
+        distribution.add(file_stat.st_size)
+        self._record(path, file_stat, category)
 
-    def add_link(self, path: str):
+    def add_link(self, path: str, link_stat: os.stat_result = None):
         """
         Add a symbolic link to the analyzer and log its information.
         The link is treated as a regular file of a separate category and it is not resolved.
 
         Args:
             path (str): The path to the file to analyze.
+            link_stat (os.stat_result): The lstat result of the link, if it is already known.
+                                        If not provided, the path is lstat'ed.
         """
-        link_stat = os.lstat(path)
+        if link_stat is None:
+            link_stat = os.lstat(path)
         mode = link_stat.st_mode
         self._log_permissions(mode, path)
         self._type_size_count["symlink"] += link_stat.st_size
+        self._record(path, link_stat, "symlink")
+
+    def _record(self, path: str, file_stat: os.stat_result, category: str):
+        """
+        Pass an analyzed entry to the recorders.
+
+        Args:
+            path (str): The path to the entry.
+            file_stat (os.stat_result): The stat result of the entry.
+            category (str): The file type category of the entry.
+        """
+        for recorder in self._recorders:
+            recorder.record(path, file_stat, category)
 
     def print_summary(self):
         """
-        Print the summary of file types and their sizes to stdout.
+        Print the summary of file types and their sizes to stdout,
+        followed by the classification policy used.
+        """
+        for line in self.result().summary():
+            print(line)
+
+    def result(self) -> ScanResult:
+        """
+        Get the results of the analysis.
+        Large files and files with unusual permissions are included only if the analyzer collects them.
+
+        Returns:
+            ScanResult: The results of the analysis.
+        """
+        return ScanResult(
+            dict(self._type_size_count),
+            list(self._big_files.items()),
+            [
+                (path, mode, description)
+                for path, (mode, description) in self._unusual_permissions.items()
+            ],
+            self._classifier.summary(),
+            self._classifier.stats(),
+            {
+                category: distribution.copy()
+                for category, distribution in self._distributions.items()
+            },
+        )
+
+    def merge(self, result: ScanResult):
+        """
+        Add the results of an analysis done elsewhere, e.g. by a worker of a distributed scan.
+        Large files and files with unusual permissions of the result are logged or collected
+        as if they were analyzed here. The recorders are not given the entries of the result.
+
+        Args:
+            result (ScanResult): The results to add, with their classification statistics
+                                 and distributions of file sizes.
         """
-        for key, value in self._type_size_count.items():
-            print(f"{key}: {utils.file_size(value)}.")
+        for category, size in result.categories.items():
+            self._type_size_count[category] += size
+        for path, size in result.big_files:
+            self._log_big_file(path, size)
+        for path, mode, description in result.unusual_permissions:
+            self._log_unusual_permissions(path, mode, description)
+        if result.classification_stats is not None:
+            self._classifier.merge(result.classification_stats)
+        for category, distribution in result.distributions.items():
+            if category in self._distributions:
+                self._distributions[category].merge(distribution)
+            else:
+                self._distributions[category] = distribution.copy()
 
     def close(self):
         """
-        Close the output files.
+        Close the output files and the recorders.
         """
+        for recorder in self._recorders:
+            recorder.close()
+        if self._collect:
+            return
         if not self._up_out.closed:
             self._up_out.close()
         if self._bf_out is not sys.stdout and not self._bf_out.closed:
@@ -0,0 +1,50 @@
+from analyzer.analyze import Analyzer, ScanResult
+from analyzer import traverse
+from analyzer import utils
+
+
+def scan(
+    path: str,
+    threshold: int = 100,
+    follow_links: bool = False,
+    backend: str = "scandir",
+    scheduler=None,
+    **options,
+) -> ScanResult:
+    """
+    Analyze a directory and return the results instead of printing them.
+
+    Large files and files with unusual permissions are collected in the result instead of
+    being logged to files. Errors met during traversal are still reported to stderr.
+
+    Args:
+        path (str): The path to the directory to analyze.
+        threshold (int): The size threshold for identifying large files (default: 100 bytes).
+        follow_links (bool): Whether to follow symbolic links (default: False).
+        backend (str): The backend to enumerate directory entries: "scandir" or "getdents" (default: "scandir").
+        scheduler (IOScheduler): The scheduler throttling the I/O of the scan (default: None, no throttling).
+        **options: Classification options passed to the Analyzer, e.g. policy="extension".
+
+    Returns:
+        ScanResult: The results of the analysis.
+
+    Raises:
+        ValueError: If the classification options are invalid.
+
+    Examples:
+        >>> result = scan("~/Documents", policy="extension")
+        >>> result.categories
+        {'directories': 8192, 'text': 1024, 'pdf': 204800}
+    """
+    analyzer = Analyzer(threshold, collect=True, scheduler=scheduler, **options)
+    try:
+        traverse.traverse_directory(
+            utils.normalize_path(path),
+            analyzer,
+            follow_links=follow_links,
+            backend=backend,
+            scheduler=scheduler,
+        )
+        return analyzer.result()
+    finally:
+        analyzer.close()
@@ -1,39 +1,138 @@
-import magic
-import mimetypes
+import contextlib
+import functools
+import math
+import os
+import threading
+
+from collections import defaultdict
+
+
+class MagicPool:
+    """
+    The MagicPool class provides a bounded pool of libmagic handles.
+
+    A libmagic handle must not be used by several threads at once, so each thread checks out
+    a handle of its own for the time of a single classification and returns it afterwards.
+    Handles are created lazily, importing libmagic and loading the magic database only when
+    no idle handle is left, and are reused afterwards. If the pool is exhausted, threads wait for a handle to be returned.
+
+    Public methods:
+        handle: Check out a libmagic handle for the duration of a with block.
+        size: Get the number of handles created by the pool.
+    """
+
+    def __init__(self, max_size: int = 0):
+        """
+        Initialize the MagicPool.
+
+        Args:
+            max_size (int): The maximum number of handles (default: 0, the number of CPUs).
+        """
+        self._max_size = max_size or os.cpu_count() or 1
+        self._idle = []  # Handles available for checkout
+        self._created = 0  # Number of handles created so far
+        self._condition = threading.Condition()
+
+    def _checkout(self) -> "magic.Magic":
+        """
+        Take an idle handle from the pool or create a new one if the pool is not full.
+        Blocks until a handle is returned to the pool if it is full.
+
+        Returns:
+            magic.Magic: A libmagic handle for MIME type detection.
+        """
+        with self._condition:
+            while not self._idle and self._created >= self._max_size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        # Loading the magic database is slow, so it is done outside of the lock.
+        # libmagic is imported here, so that runs without content classification don't pay for it.
+        try:
+            import magic
+
+            return magic.Magic(mime=True)
+        except Exception:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def _checkin(self, mime: "magic.Magic"):
+        """
+        Return a handle to the pool.
+
+        Args:
+            mime (magic.Magic): The handle taken from the pool.
+        """
+        with self._condition:
+            self._idle.append(mime)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def handle(self):
+        """
+        Check out a libmagic handle for the duration of a with block.
+
+        Yields:
+            magic.Magic: A libmagic handle for MIME type detection.
+        """
+        mime = self._checkout()
+        try:
+            yield mime
+        finally:
+            self._checkin(mime)
+
+    def size(self) -> int:
+        """
+        Get the number of handles created by the pool.
+
+        Returns:
+            int: The number of handles.
+        """
+        return self._created
 
 
 class Typer:
     """
     The Typer class provides functionality for categorizing files based on MIME types and file extensions.
+    Typer instances are safe to use from several threads: libmagic handles are taken from a shared MagicPool.
 
     Public methods:
         from_extension: Determine the file type category based on the file extension.
+        extension_category: Get the extension of a file and the file type category it maps to.
         from_signature: Determine the file type category based on the file signature (magic number).
+        read_size: Get the maximum number of bytes read from a file to determine its signature.
     """
 
-    _instance = None
     _CATEGORIES_ARCHIVE = ["zip", "x-tar", "x-gzip", "x-bzip2", "x-rar-compressed"]
+    _extension_categories = None  # Extension to category table, built on first use
+    _suffix_map = (
+        None  # Suffix aliases of the mimetypes database, e.g. ".tgz": ".tar.gz"
+    )
+    _encodings_map = None  # Encoding suffixes of the mimetypes database, e.g. ".gz"
+    _shared_pool = MagicPool()  # Pool of libmagic handles shared by all instances
+    _read_size = None  # Bytes libmagic reads from a file, queried on first use
+    _DEFAULT_READ_SIZE = (
+        1024**2
+    )  # Bytes read by libmagic versions that can't be queried
 
-    def __new__(cls):
-        """
-        Get the singleton instance of the Typer class.
-
-        Returns:
-            Typer: The singleton instance of the Typer class.
+    def __init__(self, pool: MagicPool = None):
         """
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+        Initialize the Typer instance with a pool of libmagic handles for MIME type detection.
 
-    def __init__(self):
-        """
-        Initialize the Typer instance with the magic module for MIME type detection.
+        Args:
+            pool (MagicPool): The pool of libmagic handles to use (default: None, the pool shared by all instances).
         """
-        self._mime = magic.Magic(mime=True)
+        self._pool = Typer._shared_pool if pool is None else pool
 
-    def _get_general_category(self, file_type: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _get_general_category(file_type: str) -> str:
         """
         Get the general category of a file type.
+        Results are memoized, as the number of distinct MIME types met during traversal is small.
 
         Args:
             file_type (str): The MIME type of the file.
@@ -52,6 +151,49 @@ class Typer:
             return "executable"
         return category
 
+    @classmethod
+    def _get_extension_categories(cls) -> dict:
+        """
+        Get the table mapping file extensions to categories.
+        The table is built once from the mimetypes database, which is imported on first use.
+
+        Returns:
+            dict: The file extension to category table.
+        """
+        if cls._extension_categories is None:
+            import mimetypes
+
+            if not mimetypes.inited:
+                mimetypes.init()
+            cls._suffix_map = mimetypes.suffix_map
+            cls._encodings_map = mimetypes.encodings_map
+            cls._extension_categories = {
+                ext: cls._get_general_category(file_type)
+                for ext, file_type in mimetypes.types_map.items()
+            }
+        return cls._extension_categories
+
+    @classmethod
+    def _get_extension(cls, path: str) -> str:
+        """
+        Get the extension of a file the same way mimetypes.guess_type does:
+        suffix aliases (e.g. ".tgz") are expanded and encoding suffixes (e.g. ".gz") are stripped.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            str: The lowercase extension of the file, or "" if it has none.
+        """
+        if cls._extension_categories is None:
+            cls._get_extension_categories()
+        base, ext = os.path.splitext(path)
+        while ext.lower() in cls._suffix_map:
+            base, ext = os.path.splitext(base + cls._suffix_map[ext.lower()])
+        if ext in cls._encodings_map:
+            base, ext = os.path.splitext(base)
+        return ext.lower()
+
     def from_extension(self, path: str) -> str:
         """
         Determine the file type category based on the file extension.
@@ -62,10 +204,21 @@ class Typer:
         Returns:
             str: The file type category.
         """
-        file_type = mimetypes.guess_type(path)[0]
-        if not file_type:
-            return "unknown"
-        return self._get_general_category(file_type)
+        return self.extension_category(path)[1]
+
+    def extension_category(self, path: str) -> tuple:
+        """
+        Get the extension of a file, as mimetypes.guess_type finds it, and the file type category it maps to.
+
+        Args:
+            path (str): The path to the file.
+
+        Returns:
+            tuple: The lowercase extension, or "" if the file has none, and the file type category.
+        """
+        categories = self._get_extension_categories()
+        ext = self._get_extension(os.fspath(path))
+        return ext, categories.get(ext, "unknown")
 
     def from_signature(self, path: str) -> str:
         """
@@ -78,7 +231,282 @@ class Typer:
         Returns:
             str: The file type category.
         """
-        file_type = self._mime.from_file(path)
+        with self._pool.handle() as mime:
+            file_type = mime.from_file(path)
         if "empty" in file_type:
             return self.from_extension(path)
         return self._get_general_category(file_type)
+
+    def read_size(self) -> int:
+        """
+        Get the maximum number of bytes read from a file to determine its signature.
+
+        Returns:
+            int: The number of bytes.
+        """
+        if Typer._read_size is None:
+            with self._pool.handle() as mime:
+                try:
+                    import magic
+
+                    Typer._read_size = mime.getparam(magic.MAGIC_PARAM_BYTES_MAX)
+                except (AttributeError, NotImplementedError):
+                    Typer._read_size = Typer._DEFAULT_READ_SIZE
+        return Typer._read_size
+
+
+class Classifier:
+    """
+    The Classifier class determines file type categories according to a classification policy.
+
+    Policies:
+        signature: Every readable file is classified by its signature (magic number).
+        extension: Every file is classified by its extension, no file contents are read.
+        extension-first: Files are classified by their extension, the signature is read only
+                         for files with unknown or ambiguous extensions.
+        sample: As extension-first, but the signature is also read for a fraction of files
+                of every known extension to estimate how often the extension is mislabeled.
+
+    Size policies:
+        If the stat result of a file is provided, files which are pointless or expensive to open
+        are classified by their extension without reading: empty files, offline (stub) files
+        with no allocated blocks, such as files migrated to tape by HSM, and files bigger than a limit.
+
+    Public methods:
+        classify: Determine the file type category of a file according to the policy.
+        summary: Get the description of the policy and its statistics.
+        stats: Get the statistics of the classification.
+        merge: Add statistics of a classification done elsewhere.
+        can_read: Check whether a file may be read according to the size policies.
+    """
+
+    POLICIES = ("signature", "extension", "extension-first", "sample")
+    EMPTY_FILES_POLICIES = ("extension", "empty")
+    # Extensions that don't tell much about the contents of a file
+    _AMBIGUOUS_EXTENSIONS = frozenset({".bin", ".dat", ".data", ".tmp", ".bak", ".old"})
+    # Files with no allocated blocks and bigger than this are considered offline.
+    # Smaller files may have their data stored inline in the inode.
+    _STUB_MIN_SIZE = 4096
+
+    def __init__(
+        self,
+        policy: str = "signature",
+        sample_rate: float = 0.1,
+        empty_files: str = "extension",
+        max_sniff_size: int = 0,
+        sniff_offline: bool = False,
+        scheduler=None,
+    ):
+        """
+        Initialize the Classifier.
+
+        Args:
+            policy (str): The classification policy, one of Classifier.POLICIES (default: "signature").
+            sample_rate (float): The fraction of files of each extension to verify by their signature
+                                 with the "sample" policy (default: 0.1).
+            empty_files (str): How to classify empty files: by their "extension" or as a separate
+                               "empty" category (default: "extension").
+            max_sniff_size (int): Files bigger than this size in bytes are not read (default: 0, no limit).
+            sniff_offline (bool): Whether to read offline (stub) files (default: False).
+            scheduler (IOScheduler): The scheduler throttling the reads of files (default: None, no throttling).
+
+        Raises:
+            ValueError: If the policy, the sample rate or the empty files policy is invalid.
+        """
+        if policy not in Classifier.POLICIES:
+            raise ValueError(f"Invalid classification policy: {policy}.")
+        if not 0 < sample_rate <= 1:
+            raise ValueError(f"Invalid sample rate {sample_rate}: should be in (0, 1].")
+        if empty_files not in Classifier.EMPTY_FILES_POLICIES:
+            raise ValueError(f"Invalid empty files policy: {empty_files}.")
+        self._typer = Typer()
+        self._policy = policy
+        self._sample_rate = sample_rate
+        self._empty_files = empty_files
+        self._max_sniff_size = max_sniff_size
+        self._sniff_offline = sniff_offline
+        self._scheduler = scheduler
+        self._files = 0  # Number of classified files
+        self._reads = 0  # Number of files classified by their signature
+        self._skipped = 0  # Number of files not read due to the size policies
+        self._seen = defaultdict(int)  # Files seen per extension
+        self._verified = defaultdict(int)  # Files verified by signature per extension
+        self._mislabeled = defaultdict(int)  # Files with a misleading extension
+
+    def _from_signature(self, path: str, file_stat=None) -> str:
+        """
+        Determine the file type category based on the file signature.
+        If the file can't be read, its type is obtained from its extension.
+
+        Args:
+            path (str): The path to the file.
+            file_stat (os.stat_result): The stat result of the file, used to throttle the read.
+
+        Returns:
+            str: The file type category.
+        """
+        self._reads += 1
+        try:
+            if self._scheduler is None:
+                return self._typer.from_signature(path)
+            size = self._typer.read_size()
+            if file_stat is not None:
+                size = min(file_stat.st_size, size)
+            with self._scheduler.content(size):
+                return self._typer.from_signature(path)
+        except PermissionError:
+            return self._typer.from_extension(path)
+
+    @staticmethod
+    def can_read(
+        file_stat, max_sniff_size: int = 0, sniff_offline: bool = False
+    ) -> bool:
+        """
+        Check whether a file may be read according to the size policies.
+
+        Args:
+            file_stat (os.stat_result): The stat result of the file, or None if it is unknown.
+            max_sniff_size (int): Files bigger than this size may not be read (default: 0, no limit).
+            sniff_offline (bool): Whether offline (stub) files may be read (default: False).
+
+        Returns:
+            bool: True if the file may be read.
+        """
+        if file_stat is None:
+            return True
+        size = file_stat.st_size
+        return not (
+            size == 0
+            or (max_sniff_size and size > max_sniff_size)
+            or (
+                not sniff_offline
+                and size > Classifier._STUB_MIN_SIZE
+                and getattr(file_stat, "st_blocks", None) == 0
+            )
+        )
+
+    def _can_read(self, file_stat) -> bool:
+        """
+        Check whether a file may be read according to the size policies of the classifier,
+        counting the files skipped.
+
+        Args:
+            file_stat (os.stat_result): The stat result of the file, or None if it is unknown.
+
+        Returns:
+            bool: True if the file may be read.
+        """
+        if Classifier.can_read(file_stat, self._max_sniff_size, self._sniff_offline):
+            return True
+        self._skipped += 1
+        return False
+
+    def _needs_sample(self, ext: str) -> bool:
+        """
+        Check whether the next file with the given extension should be verified by its signature.
+        Files are picked evenly, so that the verified fraction of each extension stays at the sample rate.
+
+        Args:
+            ext (str): The extension of the file.
+
+        Returns:
+            bool: True if the file should be verified.
+        """
+        self._seen[ext] += 1
+        return self._verified[ext] < math.ceil(self._seen[ext] * self._sample_rate)
+
+    def classify(self, path: str, file_stat=None) -> str:
+        """
+        Determine the file type category of a file according to the classification policy.
+
+        Args:
+            path (str): The path to the file.
+            file_stat (os.stat_result): The stat result of the file, used to apply the size policies.
+                                        If not provided, the size policies are not applied.
+
+        Returns:
+            str: The file type category.
+        """
+        self._files += 1
+        if (
+            file_stat is not None
+            and file_stat.st_size == 0
+            and self._empty_files == "empty"
+        ):
+            return "empty"
+        if self._policy == "signature":
+            if self._can_read(file_stat):
+                return self._from_signature(path, file_stat)
+            return self._typer.from_extension(path)
+
+        ext, category = self._typer.extension_category(path)
+        if self._policy == "extension":
+            return category
+
+        if category == "unknown" or ext in Classifier._AMBIGUOUS_EXTENSIONS:
+            if self._can_read(file_stat):
+                return self._from_signature(path, file_stat)
+            return category
+        if (
+            self._policy == "sample"
+            and self._needs_sample(ext)
+            and self._can_read(file_stat)
+        ):
+            signature_category = self._from_signature(path, file_stat)
+            self._verified[ext] += 1
+            if signature_category != category:
+                self._mislabeled[ext] += 1
+            return signature_category
+        return category
+
+    def summary(self) -> list:
+        """
+        Get the description of the classification policy and its statistics.
+
+        Returns:
+            list: Lines describing the policy, the number of files read and,
+                  with the "sample" policy, the estimated mislabel rate of each extension.
+        """
+        skipped = f", {self._skipped} skipped by size" if self._skipped else ""
+        lines = [
+            f"classification policy: {self._policy} "
+            f"({self._reads} of {self._files} files read{skipped})."
+        ]
+        for ext, verified in sorted(self._verified.items()):
+            mislabeled = self._mislabeled[ext]
+            lines.append(
+                f"{ext}: {mislabeled} of {verified} sampled files mislabeled "
+                f"({100 * mislabeled / verified:.1f}%)."
+            )
+        return lines
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the classification, e.g. to merge them into another classifier.
+
+        Returns:
+            dict: Numbers of files classified, read and skipped by size,
+                  and numbers of sampled and mislabeled files by extension.
+        """
+        return {
+            "files": self._files,
+            "reads": self._reads,
+            "skipped": self._skipped,
+            "verified": dict(self._verified),
+            "mislabeled": dict(self._mislabeled),
+        }
+
+    def merge(self, stats: dict):
+        """
+        Add statistics of a classification done elsewhere, e.g. by a worker of a distributed scan.
+
+        Args:
+            stats (dict): Statistics returned by stats().
+        """
+        self._files += stats["files"]
+        self._reads += stats["reads"]
+        self._skipped += stats["skipped"]
+        for ext, verified in stats["verified"].items():
+            self._verified[ext] += verified
+        for ext, mislabeled in stats["mislabeled"].items():
+            self._mislabeled[ext] += mislabeled
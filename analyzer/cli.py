@@ -1,6 +1,12 @@
 import argparse
 import re
 import os
+import sys
+
+from analyzer.categories import Classifier
+
+# Commands other than scanning a directory, given as the first argument
+COMMANDS = ("query", "diff", "status", "worker")
 
 
 def valid_dir(value):
@@ -85,9 +91,236 @@ def size_type(value):
     return ivalue
 
 
+def rate_type(value):
+    """
+    Validate and parse the sample rate value.
+
+    Args:
+        value (str): The sample rate provided as a string, a fraction (e.g. 0.05) or a percentage (e.g. 5%).
+
+    Returns:
+        float: The parsed sample rate in (0, 1].
+
+    Raises:
+        argparse.ArgumentTypeError: If the sample rate value is invalid.
+    """
+    try:
+        rate = float(value[:-1]) / 100 if value.strip().endswith("%") else float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Sample rate can't be set to [{value}] value."
+        )
+    if not 0 < rate <= 1:
+        raise argparse.ArgumentTypeError(
+            f"Invalid sample rate {value}: should be in (0, 1] or (0%, 100%]."
+        )
+    return rate
+
+
+def positive_type(value):
+    """
+    Validate and parse a positive number, e.g. a rate or a latency.
+
+    Args:
+        value (str): The number provided as a string.
+
+    Returns:
+        float: The parsed number.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not a positive number.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid number: [{value}].")
+    if not 0 < number < float("inf"):
+        raise argparse.ArgumentTypeError(
+            f"Invalid value {value}: should be a positive number."
+        )
+    return number
+
+
+def id_type(database):
+    """
+    Build a validator of a user or group, given by its id or by its name.
+
+    Args:
+        database (str): "user" or "group".
+
+    Returns:
+        function: The validator, which returns the numeric id.
+    """
+
+    def validate(value):
+        if value.isdigit():
+            return int(value)
+        try:
+            if database == "user":
+                import pwd
+
+                return pwd.getpwnam(value).pw_uid
+            import grp
+
+            return grp.getgrnam(value).gr_gid
+        except (ImportError, KeyError):
+            raise argparse.ArgumentTypeError(f"Unknown {database}: {value}.")
+
+    return validate
+
+
+def get_query_args(argv: list):
+    """
+    Parse command-line arguments of the query command.
+
+    Args:
+        argv (list): The command-line arguments following the command name.
+
+    Returns:
+        argparse.Namespace: The parsed command-line arguments.
+
+    Expected command-line arguments:
+        index: The path to the index database written with --index.
+
+    Optional command-line flags:
+        --category: Optional file type category of the entries.
+        --min-size, --max-size: Optional size limits of the entries.
+        --owner, --group: Optional user and group of the entries, by id or name.
+        --perm: Optional unusual permission the entries must have, can be repeated.
+        --parent: Optional directory the entries are in.
+        --limit: Optional maximum number of entries to output.
+    """
+    from analyzer import index  # Deferred to keep startup fast for other commands
+
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} query",
+        description="Query a scan index written with --index.",
+    )
+    parser.add_argument("index", help="A path to the index database.")
+    parser.add_argument("--category", help="A file type category, e.g. 'text'.")
+    parser.add_argument(
+        "--min-size",
+        type=size_type,
+        help="A minimum size in bytes, KB, MB or GB. E.g.: '1GB'.",
+    )
+    parser.add_argument(
+        "--max-size",
+        type=size_type,
+        help="A maximum size in bytes, KB, MB or GB. E.g.: '1GB'.",
+    )
+    parser.add_argument(
+        "--owner", type=id_type("user"), help="A user name or id of the owner."
+    )
+    parser.add_argument("--group", type=id_type("group"), help="A group name or id.")
+    parser.add_argument(
+        "--perm",
+        action="append",
+        choices=index.FLAGS,
+        default=[],
+        help="An unusual permission the entries must have. Can be repeated.",
+    )
+    parser.add_argument("--parent", help="A directory the entries are in.")
+    parser.add_argument(
+        "--limit", type=int, help="A maximum number of entries to output."
+    )
+    args = parser.parse_args(argv)
+    args.command = "query"
+    return args
+
+
+def get_diff_args(argv: list):
+    """
+    Parse command-line arguments of the diff command.
+
+    Args:
+        argv (list): The command-line arguments following the command name.
+
+    Returns:
+        argparse.Namespace: The parsed command-line arguments.
+
+    Expected command-line arguments:
+        old: The path to the older snapshot written with --snapshot.
+        new: The path to the newer snapshot written with --snapshot.
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} diff",
+        description="Report the changes between two snapshots written with --snapshot.",
+    )
+    parser.add_argument("old", help="A path to the older snapshot.")
+    parser.add_argument("new", help="A path to the newer snapshot.")
+    args = parser.parse_args(argv)
+    args.command = "diff"
+    return args
+
+
+def get_status_args(argv: list):
+    """
+    Parse command-line arguments of the status command.
+
+    Args:
+        argv (list): The command-line arguments following the command name.
+
+    Returns:
+        argparse.Namespace: The parsed command-line arguments.
+
+    Expected command-line arguments:
+        socket: The path to the socket of a running watch given with --watch.
+
+    Optional command-line arguments:
+        request: Optional results to get: summary, big-files, permissions or distribution.
+    """
+    from analyzer import watch  # Deferred to keep startup fast for other commands
+
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} status",
+        description="Get the current results of a directory watched with --watch.",
+    )
+    parser.add_argument("socket", help="A path to the socket of the watch.")
+    parser.add_argument(
+        "request",
+        nargs="?",
+        choices=watch.REQUESTS,
+        default="summary",
+        help="The results to get: the summary of file types, big files, files "
+        "with unusual permissions or the distributions of file sizes. "
+        "Defaults to summary.",
+    )
+    args = parser.parse_args(argv)
+    args.command = "status"
+    return args
+
+
+def get_worker_args(argv: list):
+    """
+    Parse command-line arguments of the worker command.
+
+    Args:
+        argv (list): The command-line arguments following the command name.
+
+    Returns:
+        argparse.Namespace: The parsed command-line arguments.
+
+    Expected command-line arguments:
+        address: The address of the coordinator given with --coordinator.
+    """
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} worker",
+        description="Scan the work handed out by a coordinator started with --coordinator.",
+    )
+    parser.add_argument(
+        "address",
+        help="The address of the coordinator: HOST:PORT or the path to a Unix socket.",
+    )
+    args = parser.parse_args(argv)
+    args.command = "worker"
+    return args
+
+
 def get_args():
     """
     Parse command-line arguments and return the parsed arguments.
+    If the first argument is one of COMMANDS, the arguments of the command are parsed instead,
+    and the command is set in the 'command' attribute. Otherwise it is set to "scan".
 
     Returns:
         argparse.Namespace: The parsed command-line arguments.
@@ -100,8 +333,46 @@ def get_args():
                          The threshold value can be provided with optional units (e.g., 100KB, 1MB).
         --report-big-files: Optional flag to enable reporting of large files found during analysis.
         -f, --report-file: Optional path to specify the file to write the analysis report to.
+        -l, --follow-links: Optional flag to follow symlinks during traversal.
+        -c, --classify: Optional classification policy: signature, extension, extension-first or sample.
+        --sample-rate: Optional fraction of files verified by signature with the sample policy.
+        --empty-files: Optional policy for empty files: classify by extension or as a separate category.
+        --sniff-max-size: Optional size above which files are classified without reading them.
+        --sniff-offline: Optional flag to read offline (stub) files to classify them.
+        --index: Optional path to write an SQLite index of the scan results to.
+        --snapshot: Optional path to write a snapshot of the scan results to.
+        --watch: Optional path to a socket to serve results on while watching the directory for changes.
+        --workers: Optional number of local worker processes to scan with.
+        --coordinator: Optional address to hand out work to workers on.
+        --worker-timeout: Optional time in seconds after which a silent worker's work is assigned again.
+        --estimate: Optional number of random paths to estimate the results from instead of scanning.
+        --max-metadata-rate: Optional budget of metadata operations (listings and stat calls) per second.
+        --max-read-rate: Optional budget of bytes read per second to classify files.
+        --target-latency: Optional latency in milliseconds above which the budgets are lowered.
+        --distribution: Optional flag to output the distribution of file sizes of each category.
+        --prioritize: Optional snapshots of previous scans to scan the heaviest or fastest-growing
+                      directories first.
+        --time-budget: Optional time in seconds after which the scan stops and reports its coverage.
+        --max-memory: Optional memory budget of the scan, beyond which its data is spilled to temporary files.
+        --compressibility: Optional budget of bytes read to estimate the savings of compression of each category.
+        --compress-workers: Optional number of threads reading and compressing the sampled blocks.
     """
-    parser = argparse.ArgumentParser()
+    if len(sys.argv) > 1 and sys.argv[1] == "query":
+        return get_query_args(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "diff":
+        return get_diff_args(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        return get_status_args(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        return get_worker_args(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(
+        epilog="Other commands: query (query an index written with --index), "
+        "diff (compare two snapshots written with --snapshot), "
+        "status (get the results of a directory watched with --watch), "
+        "worker (scan the work handed out by a coordinator). "
+        "Run '%(prog)s COMMAND -h' for details."
+    )
     parser.add_argument(
         "-t",
         "--threshold",
@@ -126,5 +397,238 @@ def get_args():
         action="store_true",
         help="Follow symlink during directory traversal.",
     )
+    parser.add_argument(
+        "-c",
+        "--classify",
+        choices=Classifier.POLICIES,
+        default="signature",
+        help="A policy to determine file categories: by signature (reads every file), "
+        "by extension (reads no files), by extension with signature check of unknown "
+        "or ambiguous extensions, or as extension-first with a sampled signature check "
+        "to estimate mislabel rates. Defaults to signature.",
+    )
+    parser.add_argument(
+        "--sample-rate",
+        type=rate_type,
+        default=0.1,
+        help="A fraction of files of each extension to check by signature with the "
+        "sample policy. E.g.: '0.05', '5%%'. Defaults to 0.1.",
+    )
+    parser.add_argument(
+        "--empty-files",
+        choices=Classifier.EMPTY_FILES_POLICIES,
+        default="extension",
+        help="Classify empty files by extension or as a separate 'empty' category. "
+        "Empty files are never read. Defaults to extension.",
+    )
+    parser.add_argument(
+        "--sniff-max-size",
+        type=size_type,
+        default=0,
+        help="Files bigger than this size in bytes, KB, MB or GB are classified by "
+        "extension without reading them. E.g.: '10GB'. Defaults to no limit.",
+    )
+    parser.add_argument(
+        "--sniff-offline",
+        action="store_true",
+        help="Read offline (stub) files with no allocated blocks to classify them. "
+        "Reading such files may trigger a recall from tape.",
+    )
+    parser.add_argument(
+        "--index",
+        help="A path to write an SQLite index of all scanned entries to, "
+        "to be queried later with the query command. Warning: an existing "
+        "index at the path is overwritten.",
+    )
+    parser.add_argument(
+        "--snapshot",
+        help="A path to write a compact snapshot of all scanned entries to, "
+        "to be compared with another snapshot with the diff command. Warning: an "
+        "existing snapshot at the path is overwritten.",
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="SOCKET",
+        help="Keep running after the scan and update the results as the directory "
+        "changes (Linux only). Current results are served on the Unix socket at the "
+        "given path, see the status command.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="A number of local worker processes to split the scan between.",
+    )
+    parser.add_argument(
+        "--coordinator",
+        metavar="ADDRESS",
+        help="Hand out the scan to workers connecting to this address: HOST:PORT "
+        "or the path to a Unix socket. Workers on other hosts are started with the "
+        "worker command and must see the directory at the same path.",
+    )
+    parser.add_argument(
+        "--worker-timeout",
+        type=positive_type,
+        default=60.0,
+        metavar="SECONDS",
+        help="The time after which a worker which sent no heartbeat is considered "
+        "lost and its work is assigned again. Defaults to 60.",
+    )
+    parser.add_argument(
+        "--estimate",
+        type=int,
+        metavar="SAMPLES",
+        help="Estimate the size and the number of entries of each category from "
+        "this many random paths down the tree instead of scanning all of it. "
+        "More paths take longer and give smaller margins. E.g.: '1000'. "
+        "Big files and unusual permissions are not reported.",
+    )
+    parser.add_argument(
+        "--max-metadata-rate",
+        type=positive_type,
+        metavar="OPS",
+        help="A budget of metadata operations (directory listings and stat calls) "
+        "per second, to throttle scans of shared storage. E.g.: '2000'. "
+        "Defaults to no limit.",
+    )
+    parser.add_argument(
+        "--max-read-rate",
+        type=size_type,
+        metavar="SIZE",
+        help="A budget of bytes read per second to classify files, in bytes, KB, MB "
+        "or GB. E.g.: '20MB'. Defaults to no limit.",
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=positive_type,
+        metavar="MS",
+        help="A latency of single operations in milliseconds: while operations are "
+        "slower, the budgets are lowered, and raised back once they are faster. "
+        "Requires --max-metadata-rate or --max-read-rate. E.g.: '20'.",
+    )
+    parser.add_argument(
+        "--distribution",
+        action="store_true",
+        help="Output the distribution of file sizes of each category after the "
+        "summary: the median, 90th and 99th percentiles and a histogram with "
+        "power-of-two buckets of the numbers of files and their sizes.",
+    )
+    parser.add_argument(
+        "--prioritize",
+        nargs="+",
+        metavar="SNAPSHOT",
+        help="Scan the directories with the most data in a snapshot of a previous scan "
+        "first. Given an older snapshot after it, scan the directories expected to be "
+        "the biggest at their current growth first. Directories not in the snapshot "
+        "are scanned last.",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=positive_type,
+        metavar="SECONDS",
+        help="Stop the scan after this many seconds and report the directories left "
+        "unscanned. With --prioritize, the share of the data of the previous scan "
+        "covered is reported too. E.g.: '600'.",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=size_type,
+        metavar="SIZE",
+        help="A memory budget of the scan in bytes, KB, MB or GB. The visited "
+        "directories, the queue of directories to scan and the entries of the "
+        "snapshot and the index are spilled to temporary files to stay within it. "
+        "E.g.: '256MB'. Defaults to no limit.",
+    )
+    parser.add_argument(
+        "--compressibility",
+        type=size_type,
+        metavar="BUDGET",
+        help="Estimate how much space transparent compression would save on each "
+        "category, from blocks of files sampled by size and compressed with zlib "
+        "and lzma, reading at most this many bytes, in bytes, KB, MB or GB. "
+        "E.g.: '256MB'.",
+    )
+    parser.add_argument(
+        "--compress-workers",
+        type=int,
+        default=4,
+        help="A number of threads reading and compressing the sampled blocks of "
+        "--compressibility. Defaults to 4.",
+    )
     args = parser.parse_args()
+    if args.watch and (args.follow_links or args.index or args.snapshot):
+        parser.error(
+            "--watch can't be combined with --follow-links, --index or --snapshot."
+        )
+    if args.workers < 0:
+        parser.error("--workers should be a positive number.")
+    if (args.workers or args.coordinator) and (
+        args.watch or args.index or args.snapshot or args.follow_links
+    ):
+        # Each unit of work has its own visited directories, so a directory linked to
+        # from several units would be counted in each of them
+        parser.error(
+            "--workers and --coordinator can't be combined with --watch, --index, "
+            "--snapshot or --follow-links."
+        )
+    if args.estimate is not None:
+        if args.estimate < 2:
+            parser.error("--estimate should be at least 2.")
+        if (
+            args.watch
+            or args.index
+            or args.snapshot
+            or args.workers
+            or args.coordinator
+            or args.distribution
+        ):
+            parser.error(
+                "--estimate can't be combined with --watch, --index, --snapshot, "
+                "--workers, --coordinator or --distribution."
+            )
+    throttled = args.max_metadata_rate or args.max_read_rate
+    if args.target_latency and not throttled:
+        parser.error(
+            "--target-latency requires --max-metadata-rate or --max-read-rate."
+        )
+    if throttled and (args.workers or args.coordinator):
+        parser.error(
+            "--max-metadata-rate and --max-read-rate can't be combined with "
+            "--workers or --coordinator."
+        )
+    if args.prioritize and len(args.prioritize) > 2:
+        parser.error("--prioritize takes a snapshot and an optional older snapshot.")
+    if (args.prioritize or args.time_budget) and (
+        args.watch or args.workers or args.coordinator or args.estimate is not None
+    ):
+        parser.error(
+            "--prioritize and --time-budget can't be combined with --watch, "
+            "--workers, --coordinator or --estimate."
+        )
+    if args.time_budget and args.snapshot:
+        parser.error(
+            "--time-budget can't be combined with --snapshot: the directories left "
+            "unscanned would be missing from the snapshot."
+        )
+    if args.max_memory and (
+        args.watch
+        or args.workers
+        or args.coordinator
+        or args.estimate is not None
+        or args.prioritize
+    ):
+        parser.error(
+            "--max-memory can't be combined with --watch, --workers, --coordinator, "
+            "--estimate or --prioritize."
+        )
+    if args.compress_workers < 1:
+        parser.error("--compress-workers should be at least 1.")
+    if args.compressibility and (
+        args.watch or args.workers or args.coordinator or args.estimate is not None
+    ):
+        parser.error(
+            "--compressibility can't be combined with --watch, --workers, "
+            "--coordinator or --estimate."
+        )
+    args.command = "scan"
     return args
@@ -0,0 +1,326 @@
+import collections
+import heapq
+import itertools
+import math
+import os
+import stat
+import zlib
+
+from analyzer import utils
+from analyzer.categories import Classifier
+
+# Size of the sampled blocks: the record size transparent compression works on in ZFS and btrfs
+BLOCK_SIZE = 128 * 1024
+# Maximum number of blocks sampled from a file: its first block and blocks at random offsets
+BLOCKS_PER_FILE = 4
+# lzma preset: the fastest, as its ratios are within a few percent of the default preset's on blocks
+LZMA_PRESET = 1
+# Entropy in bits per byte above which a block is deemed incompressible without compressing it
+ENTROPY_THRESHOLD = 7.9
+# Number of bytes of a block the entropy is computed on, evenly spaced
+_ENTROPY_SAMPLE = 8192
+
+
+def byte_entropy(data: bytes) -> float:
+    """
+    Get the Shannon entropy of the bytes of data, from 0 (a single byte value) to 8 (random bytes).
+    Large data is subsampled to _ENTROPY_SAMPLE evenly spaced bytes.
+
+    Args:
+        data (bytes): The data.
+
+    Returns:
+        float: The entropy in bits per byte, 0 for empty data.
+    """
+    if len(data) > _ENTROPY_SAMPLE:
+        data = data[:: len(data) // _ENTROPY_SAMPLE]
+    length = len(data)
+    return -sum(
+        count / length * math.log2(count / length)
+        for count in collections.Counter(data).values()
+    )
+
+
+def compressed_sizes(block: bytes, lzma_compress=None) -> tuple:
+    """
+    Get the sizes of a block compressed with zlib and lzma. Blocks whose entropy is above
+    ENTROPY_THRESHOLD, e.g. already compressed or encrypted data, are not compressed.
+
+    Args:
+        block (bytes): The block.
+        lzma_compress (function): lzma.compress, for callers compressing many blocks to import lzma
+                                  once (default: None, lzma is imported by this call).
+
+    Returns:
+        tuple: The sizes in bytes with zlib and with lzma, at most the size of the block,
+               and whether the block was compressed.
+    """
+    if lzma_compress is None:
+        import lzma  # Deferred to keep startup fast for runs without compressibility sampling
+
+        lzma_compress = lzma.compress
+    if byte_entropy(block) > ENTROPY_THRESHOLD:
+        return len(block), len(block), False
+    return (
+        min(len(zlib.compress(block, 6)), len(block)),
+        min(len(lzma_compress(block, preset=LZMA_PRESET)), len(block)),
+        True,
+    )
+
+
+class CompressionSampler:
+    """
+    The CompressionSampler class estimates how much space transparent compression would save
+    on the files of each category, from blocks sampled within a budget of bytes read.
+
+    It is a recorder of an Analyzer. Files are sampled with a probability proportional to their size
+    (weighted reservoir sampling), so that the estimate follows the bytes, as many files as the budget
+    allows for BLOCKS_PER_FILE blocks each. Once the scan is over, the blocks of the sampled files are
+    read and compressed in a thread pool: the first block of each file, which the classification
+    by signature reads too and may still be in the page cache, and blocks at random offsets.
+    The compression ratio of a category is the mean of the ratios of its sampled files, and the savings are its size
+    times one minus the ratio. Sizes are the space allocated to files, so that sparse files don't inflate the savings,
+    and files the size policies of the Classifier don't read, such as offline (stub) files, are not sampled.
+
+    Public Methods:
+        record(path: str, file_stat: os.stat_result, category: str): Consider a file for sampling.
+        estimates(): Sample the files and get the estimated compression ratios of each category.
+        summary(): Get the summary of the estimated savings.
+        close(): Do nothing, the files are sampled by estimates().
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        block_size: int = BLOCK_SIZE,
+        blocks: int = BLOCKS_PER_FILE,
+        workers: int = 4,
+        scheduler=None,
+        max_sniff_size: int = 0,
+        sniff_offline: bool = False,
+        seed=None,
+    ):
+        """
+        Initialize the CompressionSampler.
+
+        Args:
+            budget (int): The maximum number of bytes read from files to sample them.
+            block_size (int): The size of the sampled blocks in bytes (default: BLOCK_SIZE, 128 KB).
+            blocks (int): The maximum number of blocks sampled from a file (default: BLOCKS_PER_FILE).
+            workers (int): The number of threads reading and compressing blocks (default: 4).
+            scheduler (IOScheduler): The scheduler throttling the reads of blocks (default: None, no throttling).
+            max_sniff_size (int): Files bigger than this size are not sampled (default: 0, no limit).
+            sniff_offline (bool): Whether to sample offline (stub) files (default: False).
+            seed: The seed of the random choices, for reproducible samples (default: None).
+
+        Raises:
+            ValueError: If the budget is smaller than the blocks of a file, or a size or number is not positive.
+        """
+        if block_size <= 0 or blocks <= 0 or workers <= 0:
+            raise ValueError(
+                "Invalid sampling: block size, blocks and workers should be positive."
+            )
+        if budget < block_size * blocks:
+            raise ValueError(
+                f"Invalid sampling budget {budget}: should be at least {blocks} blocks "
+                f"of {block_size} bytes."
+            )
+        self._block_size = block_size
+        self._blocks = blocks
+        self._workers = workers
+        self._scheduler = scheduler
+        self._max_sniff_size = max_sniff_size
+        self._sniff_offline = sniff_offline
+        import random  # Deferred to keep startup fast for runs without compressibility sampling
+
+        self._random = random.Random(seed)
+        self._capacity = budget // (block_size * blocks)  # Number of files sampled
+        # Heap of (key, order, path, size, category) of the sampled files
+        self._reservoir = []
+        self._order = itertools.count()
+        # Space allocated to the files of each category
+        self._sizes = collections.defaultdict(int)
+        self._estimates = None
+        self._stats = {"read": 0, "blocks": 0, "compressed": 0, "errors": 0}
+
+    def record(self, path: str, file_stat: os.stat_result, category: str):
+        """
+        Consider a file for sampling. Only regular files with allocated space that the size policies
+        allow to read are sampled, with a probability proportional to their allocated space.
+
+        Args:
+            path (str): The path to the file.
+            file_stat (os.stat_result): The stat result of the file.
+            category (str): The file type category of the file.
+        """
+        size = file_stat.st_size
+        if (
+            not stat.S_ISREG(file_stat.st_mode)
+            or not size
+            or not Classifier.can_read(
+                file_stat, self._max_sniff_size, self._sniff_offline
+            )
+        ):
+            return
+        # st_blocks counts 512-byte units, whatever the block size of the filesystem
+        allocated = getattr(file_stat, "st_blocks", None)
+        allocated = size if allocated is None else allocated * 512
+        if not allocated:
+            return
+        self._sizes[category] += allocated
+        # The files with the largest random()**(1/allocated) keys are a sample weighted by allocated space,
+        # the logarithm of the key is compared to avoid underflows
+        key = math.log(1 - self._random.random()) / allocated
+        if len(self._reservoir) < self._capacity:
+            heapq.heappush(
+                self._reservoir, (key, next(self._order), path, size, category)
+            )
+        elif key > self._reservoir[0][0]:
+            heapq.heapreplace(
+                self._reservoir, (key, next(self._order), path, size, category)
+            )
+
+    def _offsets(self, size: int) -> list:
+        """
+        Choose the offsets of the blocks sampled from a file: its first block and blocks at random.
+
+        Args:
+            size (int): The size of the file.
+
+        Returns:
+            list: The offsets in bytes, sorted.
+        """
+        count = math.ceil(size / self._block_size)
+        others = self._random.sample(range(1, count), min(self._blocks, count) - 1)
+        return [block * self._block_size for block in [0] + sorted(others)]
+
+    def _sample(self, path: str, size: int, offsets: list, lzma_compress) -> tuple:
+        """
+        Read and compress the blocks of a file.
+
+        Args:
+            path (str): The path to the file.
+            size (int): The size of the file.
+            offsets (list): The offsets of the blocks.
+            lzma_compress (function): lzma.compress.
+
+        Returns:
+            tuple: The bytes read, their sizes compressed with zlib and with lzma, the number of blocks read
+                   and the number of blocks compressed, or None if the file can't be read.
+        """
+        read = zlib_size = lzma_size = blocks = compressed = 0
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            for offset in offsets:
+                if self._scheduler is None:
+                    block = os.pread(fd, self._block_size, offset)
+                else:
+                    with self._scheduler.content(min(self._block_size, size - offset)):
+                        block = os.pread(fd, self._block_size, offset)
+                if not block:
+                    break
+                sizes = compressed_sizes(block, lzma_compress)
+                read += len(block)
+                blocks += 1
+                zlib_size += sizes[0]
+                lzma_size += sizes[1]
+                compressed += sizes[2]
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+        return (read, zlib_size, lzma_size, blocks, compressed) if read else None
+
+    def estimates(self) -> dict:
+        """
+        Sample the files, once, and get the estimated compression ratios of each category.
+
+        Returns:
+            dict: (size, files sampled, zlib ratio, lzma ratio) tuples by category. The ratios are
+                  the compressed size over the original size, None if no file of the category was sampled.
+        """
+        if self._estimates is not None:
+            return self._estimates
+        # Deferred to keep startup fast for runs without compressibility sampling
+        import lzma
+        from concurrent.futures import ThreadPoolExecutor
+
+        files = [
+            (path, size, self._offsets(size), category)
+            for _, _, path, size, category in sorted(self._reservoir)
+        ]
+        ratios = collections.defaultdict(list)
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            results = pool.map(
+                lambda file: self._sample(*file[:3], lzma.compress), files
+            )
+            for file, result in zip(files, results):
+                if result is None:
+                    self._stats["errors"] += 1
+                    continue
+                read, zlib_size, lzma_size, blocks, compressed = result
+                category = file[3]
+                self._stats["read"] += read
+                self._stats["blocks"] += blocks
+                self._stats["compressed"] += compressed
+                ratios[category].append((zlib_size / read, lzma_size / read))
+        self._estimates = {}
+        for category, size in self._sizes.items():
+            sampled = ratios.get(category, [])
+            if sampled:
+                zlib_ratio = sum(ratio for ratio, _ in sampled) / len(sampled)
+                lzma_ratio = sum(ratio for _, ratio in sampled) / len(sampled)
+            else:
+                zlib_ratio = lzma_ratio = None
+            self._estimates[category] = (size, len(sampled), zlib_ratio, lzma_ratio)
+        return self._estimates
+
+    def summary(self) -> list:
+        """
+        Get the summary of the estimated savings of each category and of all of them,
+        followed by the bytes read and the blocks skipped by the entropy prefilter.
+
+        Returns:
+            list: Lines of the summary.
+        """
+        lines = []
+        total = {"size": 0, "zlib": 0, "lzma": 0}
+        for category, (size, files, zlib_ratio, lzma_ratio) in self.estimates().items():
+            if zlib_ratio is None:
+                lines.append(f"{category}: {utils.file_size(size)}, not sampled.")
+                continue
+            zlib_saved = size * (1 - zlib_ratio)
+            lzma_saved = size * (1 - lzma_ratio)
+            total["size"] += size
+            total["zlib"] += zlib_saved
+            total["lzma"] += lzma_saved
+            lines.append(
+                f"{category}: {utils.file_size(size)}, {files} files sampled, "
+                f"zlib saves {utils.file_size(round(zlib_saved))} ({1 - zlib_ratio:.0%}), "
+                f"lzma {utils.file_size(round(lzma_saved))} ({1 - lzma_ratio:.0%})."
+            )
+        if total["size"]:
+            lines.append(
+                f"Estimated savings of the sampled categories: "
+                f"zlib {utils.file_size(round(total['zlib']))} "
+                f"({total['zlib'] / total['size']:.0%}), "
+                f"lzma {utils.file_size(round(total['lzma']))} "
+                f"({total['lzma'] / total['size']:.0%}) "
+                f"of {utils.file_size(total['size'])}."
+            )
+        stats = self._stats
+        skipped = stats["blocks"] - stats["compressed"]
+        errors = f", {stats['errors']} files unreadable" if stats["errors"] else ""
+        lines.append(
+            f"Compressibility sampling: {utils.file_size(stats['read'])} read, "
+            f"{skipped} of {stats['blocks']} blocks skipped by the entropy prefilter{errors}."
+        )
+        return lines
+
+    def close(self):
+        """
+        Do nothing: the files are sampled by estimates(), once the scan is over.
+        """
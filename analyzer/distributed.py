@@ -0,0 +1,672 @@
+import collections
+import os
+import sys
+import time
+
+from analyzer.analyze import Analyzer, ScanResult
+from analyzer.distribution import SizeDistribution
+from analyzer import traverse
+from analyzer import utils
+
+_FINDINGS_BATCH = 10000  # Big files or unusual permissions sent in a single message
+# Time an idle worker waits before asking for work again, in seconds
+_WAIT_INTERVAL = 0.1
+# Number of heartbeats a worker sends within the worker timeout
+_HEARTBEATS = 4
+
+
+def parse_address(address: str) -> tuple:
+    """
+    Parse the address of a coordinator: "host:port" for TCP, or the path to a Unix socket.
+
+    Args:
+        address (str): The address.
+
+    Returns:
+        tuple: The socket family and the address in the form the socket module expects.
+    """
+    import socket  # Deferred to keep startup fast for runs on a single host
+
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and os.sep not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+
+def _send(connection, message: dict):
+    """
+    Send a message as a line of JSON. Paths which are not valid UTF-8 are kept as escaped surrogates.
+
+    Args:
+        connection (socket.socket): The connection.
+        message (dict): The message.
+    """
+    import json  # Deferred to keep startup fast for runs on a single host
+
+    connection.sendall(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class _Unit:
+    """
+    A unit of work: directories to traverse, without the excluded directories under them,
+    which were handed out as other units.
+    """
+
+    __slots__ = ("id", "dirs", "excluded", "owner", "big_files", "unusual_permissions")
+
+    def __init__(self, unit_id: int, dirs: list):
+        self.id = unit_id
+        self.dirs = dirs
+        self.excluded = []
+        self.owner = None  # The connection of the worker the unit is assigned to
+        # Findings received for the unit, merged once the unit is complete
+        self.big_files = []
+        self.unusual_permissions = []
+
+
+class _Worker:
+    """
+    The state of a connected worker, as seen by the coordinator.
+    """
+
+    __slots__ = ("connection", "buffer", "unit", "waiting", "last_seen")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.buffer = b""  # Received data not yet parsed into messages
+        self.unit = None
+        self.waiting = False  # Whether the worker was told to wait for work
+        self.last_seen = time.monotonic()
+
+
+class Coordinator:
+    """
+    The Coordinator class scans a directory with workers connected over TCP or a Unix socket.
+
+    The tree is split into units of work, lists of directories, which are handed out to workers.
+    A worker traverses the directories of its unit and sends back the partial results,
+    which are merged into the global results once the unit is complete.
+    When workers are idle, busy workers are asked to hand out part of the directories they
+    have queued as new units, so skewed subtrees are spread between workers.
+    Workers send heartbeats from a separate thread, so listing a huge or slow directory doesn't
+    make them silent. The unit of a worker which disconnects or stops sending heartbeats is
+    assigned again, without the directories it handed out, and its partial results are dropped.
+    Each unit keeps its own visited directories, so symbolic links are not followed:
+    a directory reached from several units would be counted in each of them.
+
+    Public Attributes:
+        address (str): The address workers connect to, with the actual port if port 0 was given.
+
+    Public Methods:
+        start(): Create the socket workers connect to.
+        run(processes: list = ()): Hand out work until the whole directory is scanned.
+        print_summary(): Print the summary of file types and their sizes to stdout.
+        result(): Get the merged results as a ScanResult.
+        close(): Close the socket and the output files.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        address: str,
+        threshold: int = 100,
+        backend: str = "scandir",
+        worker_timeout: float = 60.0,
+        unusual_perm_out: str = "report.txt",
+        big_files_out: str = "",
+        collect: bool = False,
+        **options,
+    ):
+        """
+        Initialize the Coordinator.
+
+        Args:
+            directory (str): The path to the directory to scan.
+            address (str): The address to listen on: "host:port" for TCP, or the path to a Unix socket.
+            threshold (int): The size threshold for identifying large files (default: 100 bytes).
+            backend (str): The backend workers enumerate directory entries with (default: "scandir").
+            worker_timeout (float): The time in seconds after which a silent worker is considered dead
+                                    and its work is assigned again (default: 60.0).
+            unusual_perm_out (str): Path to the file for logging files with unusual permissions (default: "report.txt").
+            big_files_out (str): Path to the file for logging large files (default: ""). If no file is provided, sys.stdout is used.
+            collect (bool): Whether to collect large files and files with unusual permissions for the result()
+                            instead of logging them to files (default: False).
+            **options: Classification options passed to the analyzers, e.g. policy="extension".
+
+        Raises:
+            ValueError: If the classification options are invalid.
+            Exception: If unable to open the specified output files.
+        """
+        self._directory = utils.normalize_path(directory)
+        self.address = address
+        self._worker_timeout = worker_timeout
+        # The configuration sent to workers
+        self._config = {
+            "type": "config",
+            "threshold": threshold,
+            "backend": backend,
+            "heartbeat": worker_timeout / _HEARTBEATS,
+            "options": options,
+        }
+        self._analyzer = Analyzer(
+            threshold,
+            unusual_perm_out=unusual_perm_out,
+            big_files_out=big_files_out,
+            collect=collect,
+            **options,
+        )
+        self._pending = collections.deque([_Unit(0, [self._directory])])
+        self._units = {0: self._pending[0]}  # Units not complete yet, by id
+        self._next_id = 1
+        self._workers = {}  # Connected workers by file descriptor
+        self._server = None
+        self._selector = None
+        self._socket_path = None  # The path to the Unix socket, removed on close
+
+    def start(self):
+        """
+        Create the socket workers connect to.
+
+        Raises:
+            OSError: If the socket can't be created.
+        """
+        import selectors
+        import socket
+
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                server.bind(address)
+            except OSError:
+                server.close()
+                raise
+            self._server, self._socket_path = server, address
+        else:
+            self._server = socket.create_server(address)
+            host, port = self._server.getsockname()[:2]
+            self.address = f"{host}:{port}"
+        self._server.listen()
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+
+    def run(self, processes: list = ()):
+        """
+        Hand out work and merge the partial results until the whole directory is scanned.
+
+        Args:
+            processes (list): Local worker processes, e.g. started with start_workers().
+                              If they have all exited while no other worker is connected,
+                              the scan can't complete.
+
+        Raises:
+            RuntimeError: If the local worker processes have all exited before the scan is complete.
+        """
+        import selectors
+
+        while self._units:
+            if (
+                processes
+                and not self._workers
+                and not any(process.is_alive() for process in processes)
+            ):
+                raise RuntimeError("all worker processes exited")
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self._server:
+                    connection, _ = self._server.accept()
+                    self._workers[connection.fileno()] = _Worker(connection)
+                    self._selector.register(connection, selectors.EVENT_READ)
+                else:
+                    self._receive(self._workers[key.fileobj.fileno()])
+            self._check_timeouts()
+
+    def _receive(self, worker: _Worker):
+        """
+        Read the data sent by a worker and answer its complete messages.
+        A worker which closed the connection or sent an invalid message is dropped.
+
+        Args:
+            worker (_Worker): The worker.
+        """
+        import json
+
+        try:
+            data = worker.connection.recv(1024 * 1024)
+            if not data:
+                raise ConnectionResetError
+            worker.buffer += data
+            worker.last_seen = time.monotonic()
+            while b"\n" in worker.buffer:
+                line, worker.buffer = worker.buffer.split(b"\n", 1)
+                _send(worker.connection, self._answer(worker, json.loads(line)))
+        except (OSError, ValueError):
+            self._drop(worker)
+
+    def _answer(self, worker: _Worker, message: dict) -> dict:
+        """
+        Handle a message of a worker.
+
+        Args:
+            worker (_Worker): The worker.
+            message (dict): The message.
+
+        Returns:
+            dict: The answer.
+        """
+        kind = message["type"]
+        if kind == "hello":
+            return self._config
+        if kind == "heartbeat":
+            return {"type": "ok"}
+        if kind == "request":
+            return self._assign(worker)
+        unit = self._units.get(message.get("unit"))
+        if unit is None or unit.owner is not worker:
+            # The unit was assigned again, e.g. after the worker was silent for too long
+            return {"type": "abandon"}
+        if kind == "progress":
+            idle = any(other.waiting for other in self._workers.values())
+            return {"type": "ok", "donate": idle and not self._pending}
+        if kind == "donate":
+            # The directories are split between the idle workers
+            dirs = message["dirs"]
+            idle = sum(other.waiting for other in self._workers.values())
+            count = min(len(dirs), max(idle, 1))
+            for i in range(count):
+                self._add_unit(dirs[i::count])
+            unit.excluded.extend(dirs)
+        elif kind == "findings":
+            unit.big_files.extend(message["big_files"])
+            unit.unusual_permissions.extend(message["unusual_permissions"])
+        elif kind == "complete":
+            self._analyzer.merge(
+                ScanResult(
+                    message["categories"],
+                    unit.big_files,
+                    unit.unusual_permissions,
+                    [],
+                    message["classification_stats"],
+                    {
+                        category: SizeDistribution.from_dict(distribution)
+                        for category, distribution in message["distributions"].items()
+                    },
+                )
+            )
+            del self._units[unit.id]
+            worker.unit = None
+        return {"type": "ok"}
+
+    def _add_unit(self, dirs: list):
+        """
+        Add a unit of work to the pending ones.
+
+        Args:
+            dirs (list): The directories of the unit.
+        """
+        unit = _Unit(self._next_id, dirs)
+        self._next_id += 1
+        self._units[unit.id] = unit
+        self._pending.append(unit)
+
+    def _assign(self, worker: _Worker) -> dict:
+        """
+        Assign a pending unit to a worker asking for work.
+
+        Args:
+            worker (_Worker): The worker.
+
+        Returns:
+            dict: The unit, or an instruction to wait for work or to stop.
+        """
+        worker.waiting = False
+        if not self._units:
+            return {"type": "done"}
+        if not self._pending:
+            worker.waiting = True
+            return {"type": "wait"}
+        unit = self._pending.popleft()
+        unit.owner = worker
+        worker.unit = unit
+        return {
+            "type": "work",
+            "unit": unit.id,
+            "dirs": unit.dirs,
+            "excluded": unit.excluded,
+        }
+
+    def _drop(self, worker: _Worker):
+        """
+        Disconnect a worker and assign its unit again, from scratch.
+
+        Args:
+            worker (_Worker): The worker.
+        """
+        self._workers.pop(worker.connection.fileno(), None)
+        try:
+            self._selector.unregister(worker.connection)
+        except (KeyError, ValueError):
+            pass
+        worker.connection.close()
+        unit = worker.unit
+        if unit is not None and unit.id in self._units:
+            print(
+                "Warning: a worker was lost. Assigning its work again.",
+                file=sys.stderr,
+            )
+            unit.owner = None
+            unit.big_files, unit.unusual_permissions = [], []
+            self._pending.appendleft(unit)
+
+    def _check_timeouts(self):
+        """
+        Drop the workers silent for longer than the worker timeout.
+        """
+        now = time.monotonic()
+        for worker in list(self._workers.values()):
+            if now - worker.last_seen > self._worker_timeout:
+                self._drop(worker)
+
+    def print_summary(self):
+        """
+        Print the summary of file types and their sizes to stdout,
+        followed by the classification policy used.
+        """
+        self._analyzer.print_summary()
+
+    def result(self) -> ScanResult:
+        """
+        Get the merged results of the units completed so far.
+
+        Returns:
+            ScanResult: The merged results.
+        """
+        return self._analyzer.result()
+
+    def close(self):
+        """
+        Close the socket, which stops the remaining workers, and the output files.
+        """
+        if self._selector is not None:
+            for worker in list(self._workers.values()):
+                worker.connection.close()
+            self._workers = {}
+            self._selector.close()
+            self._selector = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if self._socket_path is not None:
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+            self._socket_path = None
+        self._analyzer.close()
+
+
+class _Abandoned(Exception):
+    """
+    Raised to stop traversing a unit which was assigned to another worker.
+    """
+
+
+class _WorkerConnection:
+    """
+    The connection of a worker to the coordinator.
+    Every message sent gets exactly one answer, so messages of the heartbeat thread
+    and of the scan are sent one at a time.
+    """
+
+    def __init__(self, connection):
+        import threading
+
+        self._connection = connection
+        self._reader = connection.makefile("rb")
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def ask(self, message: dict) -> dict:
+        """
+        Send a message and wait for the answer.
+
+        Returns:
+            dict: The answer, or a "disconnected" message if the connection was closed.
+        """
+        import json
+
+        with self._lock:
+            try:
+                _send(self._connection, message)
+                line = self._reader.readline()
+            except (OSError, ValueError):
+                line = b""
+        if not line:
+            return {"type": "disconnected"}
+        return json.loads(line)
+
+    def start_heartbeat(self, interval: float):
+        """
+        Send heartbeats every interval seconds from a thread, until the connection is closed.
+
+        Args:
+            interval (float): The time between heartbeats in seconds.
+        """
+        import threading
+
+        def beat():
+            while not self._closed.wait(interval):
+                if self.ask({"type": "heartbeat"})["type"] != "ok":
+                    return
+
+        threading.Thread(target=beat, daemon=True).start()
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._reader.close()
+            self._connection.close()
+
+
+def _scan_unit(
+    coordinator: _WorkerConnection, config: dict, unit: dict, interval: float
+):
+    """
+    Traverse the directories of a unit and send the partial results to the coordinator.
+    Progress is reported every interval seconds, and part of the queued directories are handed out
+    if the coordinator asks for it.
+
+    Args:
+        coordinator (_WorkerConnection): The connection to the coordinator.
+        config (dict): The configuration sent by the coordinator.
+        unit (dict): The unit of work.
+        interval (float): The time between progress reports in seconds.
+
+    Raises:
+        _Abandoned: If the unit was assigned to another worker.
+    """
+    unit_id = unit["unit"]
+    excluded = frozenset(unit["excluded"])
+    analyzer = Analyzer(config["threshold"], collect=True, **config["options"])
+    last_report = time.monotonic()
+
+    def report(queue: list):
+        nonlocal last_report
+        if time.monotonic() - last_report < interval:
+            return
+        last_report = time.monotonic()
+        answer = coordinator.ask({"type": "progress", "unit": unit_id})
+        if answer["type"] != "ok":
+            raise _Abandoned
+        if answer["donate"] and len(queue) > 1:
+            # The directories queued first were found first: they are likely the biggest subtrees.
+            # Excluded directories, already handed out, are not handed out again.
+            donated = [
+                path for path in queue[: len(queue) // 2] if path not in excluded
+            ]
+            del queue[: len(queue) // 2]
+            answer = coordinator.ask(
+                {"type": "donate", "unit": unit_id, "dirs": donated}
+            )
+            if answer["type"] != "ok":
+                raise _Abandoned
+
+    queue = list(unit["dirs"])
+    visited = set()
+    for path in queue:
+        try:
+            visited.add(traverse.dir_key(os.stat(path)))
+        except OSError:
+            pass  # The error is reported when the directory is scanned
+    try:
+        traverse.traverse_queue(
+            queue,
+            analyzer,
+            visited,
+            backend=config["backend"],
+            excluded=excluded,
+            on_listed=report,
+        )
+        result = analyzer.result()
+    finally:
+        analyzer.close()
+
+    # Findings are sent in batches, then the totals
+    big_files, unusual = result.big_files, result.unusual_permissions
+    for start in range(0, max(len(big_files), len(unusual)), _FINDINGS_BATCH):
+        answer = coordinator.ask(
+            {
+                "type": "findings",
+                "unit": unit_id,
+                "big_files": big_files[start : start + _FINDINGS_BATCH],
+                "unusual_permissions": unusual[start : start + _FINDINGS_BATCH],
+            }
+        )
+        if answer["type"] != "ok":
+            raise _Abandoned
+    coordinator.ask(
+        {
+            "type": "complete",
+            "unit": unit_id,
+            "categories": result.categories,
+            "classification_stats": result.classification_stats,
+            "distributions": {
+                category: distribution.to_dict()
+                for category, distribution in result.distributions.items()
+            },
+        }
+    )
+
+
+def _connect(address: str, connect_timeout: float):
+    """
+    Connect to a coordinator.
+
+    Args:
+        address (str): The address of the coordinator: "host:port" for TCP, or the path to a Unix socket.
+        connect_timeout (float): The time to keep trying to connect in seconds.
+
+    Returns:
+        socket.socket: The connection.
+
+    Raises:
+        OSError: If the coordinator can't be reached.
+    """
+    import socket
+
+    family, sock_address = parse_address(address)
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            if family == socket.AF_UNIX:
+                connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    connection.connect(sock_address)
+                except OSError:
+                    connection.close()
+                    raise
+            else:
+                connection = socket.create_connection(sock_address)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(_WAIT_INTERVAL)
+    return connection
+
+
+def _work(coordinator: _WorkerConnection, interval: float) -> bool:
+    """
+    Scan the units of work a coordinator hands out until it tells to stop.
+
+    Args:
+        coordinator (_WorkerConnection): The connection to the coordinator.
+        interval (float): The time between progress reports in seconds.
+
+    Returns:
+        bool: Whether the connection was lost before the coordinator told to stop.
+    """
+    config = coordinator.ask({"type": "hello"})
+    if config["type"] != "config":
+        return config["type"] == "disconnected"
+    coordinator.start_heartbeat(config["heartbeat"])
+    while True:
+        answer = coordinator.ask({"type": "request"})
+        if answer["type"] in ("done", "disconnected"):
+            return answer["type"] == "disconnected"
+        if answer["type"] == "wait":
+            time.sleep(_WAIT_INTERVAL)
+            continue
+        try:
+            _scan_unit(coordinator, config, answer, interval)
+        except _Abandoned:
+            pass
+
+
+def run_worker(address: str, interval: float = 0.5, connect_timeout: float = 10.0):
+    """
+    Connect to a coordinator and scan the units of work it hands out until it tells to stop.
+    If the connection is lost, e.g. because the coordinator took the worker for dead,
+    the worker connects again and asks for new work, and stops if the coordinator is gone.
+
+    Args:
+        address (str): The address of the coordinator: "host:port" for TCP, or the path to a Unix socket.
+        interval (float): The time between progress reports in seconds (default: 0.5).
+        connect_timeout (float): The time to keep trying to connect in seconds (default: 10.0).
+
+    Raises:
+        OSError: If the coordinator can't be reached.
+    """
+    connection = _connect(address, connect_timeout)
+    while True:
+        coordinator = _WorkerConnection(connection)
+        try:
+            if not _work(coordinator, interval):
+                return
+        finally:
+            coordinator.close()
+        try:
+            # A coordinator which completed the scan no longer accepts connections
+            connection = _connect(address, 0)
+        except OSError:
+            return
+
+
+def start_workers(address: str, count: int) -> list:
+    """
+    Start local worker processes.
+
+    Args:
+        address (str): The address of the coordinator.
+        count (int): The number of workers.
+
+    Returns:
+        list: The started multiprocessing.Process objects.
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, args=(address,), daemon=True)
+        for _ in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
@@ -0,0 +1,363 @@
+import math
+
+from analyzer import utils
+
+# Buckets of the histograms: bucket 0 holds empty files and bucket i the sizes in [2**(i-1), 2**i),
+# up to the largest file size of 2**63 - 1 bytes
+HISTOGRAM_BUCKETS = 64
+# Quantiles of the summaries
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class DDSketch:
+    """
+    The DDSketch class estimates quantiles of sizes with a bounded relative error.
+
+    Sizes are counted in buckets whose bounds grow geometrically by gamma = (1 + a) / (1 - a),
+    a being the relative accuracy, and a quantile is estimated by the middle of its bucket:
+    the estimate is within a of the true value, whatever the distribution of the sizes.
+    The buckets cover all file sizes in a fixed-size array, so adding a size takes constant time
+    and sketches with the same accuracy are merged by adding their arrays.
+
+    Public Attributes:
+        relative_accuracy (float): The relative accuracy of the quantiles.
+        count (int): The number of sizes added.
+
+    Public Methods:
+        add(size: int): Add a size.
+        remove(size: int): Remove a size added before.
+        merge(other: DDSketch): Add the sizes of another sketch.
+        quantile(q: float): Estimate a quantile of the sizes.
+        copy(): Get a copy of the sketch.
+        to_dict(): Get a JSON-serializable representation of the sketch.
+        from_dict(data: dict): Create a sketch from its representation.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        """
+        Initialize an empty DDSketch.
+
+        Args:
+            relative_accuracy (float): The relative accuracy of the quantiles (default: 0.01, 1%).
+
+        Raises:
+            ValueError: If the relative accuracy is not in (0, 1).
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                f"Invalid relative accuracy {relative_accuracy}: should be in (0, 1)."
+            )
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._gamma = gamma
+        self._multiplier = 1 / math.log(gamma)
+        self._zeros = 0  # Number of empty files, which have no logarithm
+        self._buckets = [0] * (math.ceil(63 * math.log(2) * self._multiplier) + 1)
+
+    def _index(self, size: int) -> int:
+        """
+        Get the bucket of a positive size: the bucket i holds the sizes in (gamma**(i-1), gamma**i].
+        """
+        return math.ceil(math.log(size) * self._multiplier)
+
+    def add(self, size: int):
+        """
+        Add a size.
+
+        Args:
+            size (int): The size in bytes.
+        """
+        self.count += 1
+        if size > 0:
+            self._buckets[self._index(size)] += 1
+        else:
+            self._zeros += 1
+
+    def remove(self, size: int):
+        """
+        Remove a size added before.
+
+        Args:
+            size (int): The size in bytes.
+        """
+        self.count -= 1
+        if size > 0:
+            self._buckets[self._index(size)] -= 1
+        else:
+            self._zeros -= 1
+
+    def merge(self, other: "DDSketch"):
+        """
+        Add the sizes of another sketch.
+
+        Args:
+            other (DDSketch): The sketch to add, with the same relative accuracy.
+
+        Raises:
+            ValueError: If the relative accuracies of the sketches differ.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(
+                "Sketches with different relative accuracies can't be merged."
+            )
+        self.count += other.count
+        self._zeros += other._zeros
+        self._buckets = [a + b for a, b in zip(self._buckets, other._buckets)]
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile of the sizes.
+
+        Args:
+            q (float): The quantile, in [0, 1], e.g. 0.5 for the median.
+
+        Returns:
+            float: The estimated size, or None if the sketch is empty.
+
+        Raises:
+            ValueError: If the quantile is not in [0, 1].
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"Invalid quantile {q}: should be in [0, 1].")
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for index, count in enumerate(self._buckets):
+            seen += count
+            if rank < seen:
+                return 2 * self._gamma**index / (self._gamma + 1)
+        return 2 * self._gamma ** (len(self._buckets) - 1) / (self._gamma + 1)
+
+    def copy(self) -> "DDSketch":
+        """
+        Get a copy of the sketch.
+
+        Returns:
+            DDSketch: The copy.
+        """
+        sketch = DDSketch(self.relative_accuracy)
+        sketch.merge(self)
+        return sketch
+
+    def to_dict(self) -> dict:
+        """
+        Get a JSON-serializable representation of the sketch, listing the non-empty buckets only.
+
+        Returns:
+            dict: The representation of the sketch.
+        """
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zeros": self._zeros,
+            "buckets": [
+                [index, count] for index, count in enumerate(self._buckets) if count
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DDSketch":
+        """
+        Create a sketch from its representation.
+
+        Args:
+            data (dict): The representation returned by to_dict().
+
+        Returns:
+            DDSketch: The sketch.
+        """
+        sketch = cls(data["relative_accuracy"])
+        sketch._zeros = data["zeros"]
+        sketch.count = sketch._zeros
+        for index, count in data["buckets"]:
+            sketch._buckets[index] = count
+            sketch.count += count
+        return sketch
+
+
+class SizeDistribution:
+    """
+    The SizeDistribution class holds the distribution of the sizes of files, e.g. of a category:
+    a histogram with log2 buckets of the numbers of files and of their bytes, and a DDSketch
+    estimating quantiles of the sizes. Both are fixed-size arrays, so adding a size takes
+    constant time, and distributions are merged by adding their arrays.
+
+    Public Attributes:
+        counts (list): The number of files of each bucket of the histogram, see HISTOGRAM_BUCKETS.
+        sizes (list): The total size in bytes of the files of each bucket of the histogram.
+        sketch (DDSketch): The sketch of the sizes.
+
+    Public Methods:
+        add(size: int): Add the size of a file.
+        remove(size: int): Remove the size of a file added before.
+        merge(other: SizeDistribution): Add the sizes of another distribution.
+        count(): Get the number of files.
+        quantile(q: float): Estimate a quantile of the sizes.
+        buckets(): Get the non-empty buckets of the histogram.
+        summary(name: str): Get the summary of the distribution.
+        copy(): Get a copy of the distribution.
+        to_dict(): Get a JSON-serializable representation of the distribution.
+        from_dict(data: dict): Create a distribution from its representation.
+    """
+
+    def __init__(self, sketch: DDSketch = None):
+        """
+        Initialize an empty SizeDistribution.
+
+        Args:
+            sketch (DDSketch): The empty sketch to estimate quantiles with (default: None, 1% accuracy).
+        """
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.sizes = [0] * HISTOGRAM_BUCKETS
+        self.sketch = DDSketch() if sketch is None else sketch
+
+    def add(self, size: int):
+        """
+        Add the size of a file.
+
+        Args:
+            size (int): The size in bytes.
+        """
+        bucket = size.bit_length()
+        self.counts[bucket] += 1
+        self.sizes[bucket] += size
+        self.sketch.add(size)
+
+    def remove(self, size: int):
+        """
+        Remove the size of a file added before.
+
+        Args:
+            size (int): The size in bytes.
+        """
+        bucket = size.bit_length()
+        self.counts[bucket] -= 1
+        self.sizes[bucket] -= size
+        self.sketch.remove(size)
+
+    def merge(self, other: "SizeDistribution"):
+        """
+        Add the sizes of another distribution.
+
+        Args:
+            other (SizeDistribution): The distribution to add.
+
+        Raises:
+            ValueError: If the relative accuracies of the sketches differ.
+        """
+        self.sketch.merge(other.sketch)
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sizes = [a + b for a, b in zip(self.sizes, other.sizes)]
+
+    def count(self) -> int:
+        """
+        Get the number of files.
+
+        Returns:
+            int: The number of files.
+        """
+        return self.sketch.count
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile of the sizes, within the relative accuracy of the sketch.
+
+        Args:
+            q (float): The quantile, in [0, 1], e.g. 0.5 for the median.
+
+        Returns:
+            float: The estimated size in bytes, or None if there are no files.
+        """
+        return self.sketch.quantile(q)
+
+    def buckets(self) -> list:
+        """
+        Get the non-empty buckets of the histogram.
+
+        Returns:
+            list: (lower bound, upper bound, count, size) tuples. The bounds are in bytes,
+                  the lower bound is included and the upper bound excluded.
+        """
+        return [
+            (
+                2 ** (bucket - 1) if bucket else 0,
+                2**bucket if bucket else 1,
+                count,
+                size,
+            )
+            for bucket, (count, size) in enumerate(zip(self.counts, self.sizes))
+            if count
+        ]
+
+    def summary(self, name: str) -> list:
+        """
+        Get the summary of the distribution: the number of files and the quantiles of their sizes,
+        followed by the non-empty buckets of the histogram.
+
+        Args:
+            name (str): The name of the distribution, e.g. its category.
+
+        Returns:
+            list: Lines of the summary.
+        """
+        quantiles = ", ".join(
+            f"p{q * 100:g} {utils.file_size(round(self.quantile(q)))}"
+            for q in QUANTILES
+        )
+        lines = [f"{name}: {self.count()} files, {quantiles}."]
+        for low, high, count, size in self.buckets():
+            bounds = (
+                "[0 B]"
+                if not low
+                else f"[{utils.file_size(low)}, {utils.file_size(high)})"
+            )
+            lines.append(f"  {bounds}: {count} files, {utils.file_size(size)}.")
+        return lines
+
+    def copy(self) -> "SizeDistribution":
+        """
+        Get a copy of the distribution.
+
+        Returns:
+            SizeDistribution: The copy.
+        """
+        distribution = SizeDistribution(self.sketch.copy())
+        distribution.counts = list(self.counts)
+        distribution.sizes = list(self.sizes)
+        return distribution
+
+    def to_dict(self) -> dict:
+        """
+        Get a JSON-serializable representation of the distribution, listing the non-empty buckets only.
+
+        Returns:
+            dict: The representation of the distribution.
+        """
+        return {
+            "histogram": [
+                [bucket, count, size]
+                for bucket, (count, size) in enumerate(zip(self.counts, self.sizes))
+                if count
+            ],
+            "sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SizeDistribution":
+        """
+        Create a distribution from its representation.
+
+        Args:
+            data (dict): The representation returned by to_dict().
+
+        Returns:
+            SizeDistribution: The distribution.
+        """
+        distribution = cls(DDSketch.from_dict(data["sketch"]))
+        for bucket, count, size in data["histogram"]:
+            distribution.counts[bucket] = count
+            distribution.sizes[bucket] = size
+        return distribution
@@ -0,0 +1,396 @@
+import ctypes
+import errno
+import os
+import stat
+import struct
+import sys
+import threading
+
+# getdents64 system call numbers by machine architecture
+_SYS_GETDENTS64 = {
+    "x86_64": 217,
+    "aarch64": 61,
+    "riscv64": 61,
+    "ppc64le": 202,
+    "s390x": 220,
+}
+
+_BUFFER_SIZE = 1024 * 1024  # Size of the buffer for directory entries
+_STATX_SIZE = 256  # Size of struct statx
+
+_DT_UNKNOWN = 0
+_DT_DIR = 4
+_DT_REG = 8
+_DT_LNK = 10
+
+_AT_FDCWD = -100
+_AT_SYMLINK_NOFOLLOW = 0x100
+_AT_NO_AUTOMOUNT = 0x800
+
+# Fields of struct statx requested from the kernel: only the ones used by the analyzer
+_STATX_TYPE = 0x1
+_STATX_MODE = 0x2
+_STATX_NLINK = 0x4
+_STATX_UID = 0x8
+_STATX_GID = 0x10
+_STATX_MTIME = 0x40
+_STATX_INO = 0x100
+_STATX_SIZE = 0x200
+_STATX_BLOCKS = 0x400
+_STATX_MASK = (
+    _STATX_TYPE
+    | _STATX_MODE
+    | _STATX_NLINK
+    | _STATX_UID
+    | _STATX_GID
+    | _STATX_MTIME
+    | _STATX_INO
+    | _STATX_SIZE
+    | _STATX_BLOCKS
+)
+
+# struct linux_dirent64: d_ino, d_off, d_reclen, d_type, followed by d_name
+_DIRENT = struct.Struct("=QqHB")
+# struct statx from offset 16: stx_nlink, stx_uid, stx_gid, stx_mode, stx_ino, stx_size, stx_blocks,
+# stx_mtime.tv_sec and tv_nsec at 112, stx_dev_major and stx_dev_minor at 136
+_STATX_FIELDS = struct.Struct("=IIIH2xQQQ56xqI4x8xII")
+
+
+def _load_libc():
+    """
+    Load the C library functions used by the backend.
+
+    Returns:
+        tuple: The syscall and statx functions and the getdents64 system call number,
+               or None if the backend is not supported on this platform.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    sys_getdents64 = _SYS_GETDENTS64.get(os.uname().machine)
+    if sys_getdents64 is None:
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        syscall, statx = libc.syscall, libc.statx
+    except (OSError, AttributeError):
+        return None
+    # Arguments are passed as plain ints, bytes and buffers, which ctypes converts
+    # much faster than when argtypes are declared
+    syscall.restype = ctypes.c_long
+    statx.restype = ctypes.c_int
+    return syscall, statx, sys_getdents64
+
+
+def _probe_statx() -> bool:
+    """
+    Check that the statx system call works: the C library may provide it while the kernel
+    doesn't (before Linux 4.11) or a seccomp filter denies it, e.g. in some containers.
+
+    Returns:
+        bool: False if statx fails with ENOSYS or EPERM, True otherwise.
+    """
+    buf = ctypes.create_string_buffer(_STATX_SIZE)
+    if _statx_call(_AT_FDCWD, b"/", _AT_NO_AUTOMOUNT, _STATX_MASK, buf) == 0:
+        return True
+    return ctypes.get_errno() not in (errno.ENOSYS, errno.EPERM)
+
+
+_LIBC = _load_libc()
+_statx_call = _LIBC[1] if _LIBC is not None else None
+AVAILABLE = _LIBC is not None and _probe_statx()
+
+_FS_ENCODING = sys.getfilesystemencoding()
+
+# Buffers are reused between calls in the same thread
+_local = threading.local()
+
+
+def _raise_errno(path: str):
+    """
+    Raise an OSError for the errno of the last failed C library call.
+
+    Args:
+        path (str): The path the call failed for.
+
+    Raises:
+        OSError: Always.
+    """
+    err = ctypes.get_errno()
+    raise OSError(err, os.strerror(err), path)
+
+
+def _statx(dir_fd: int, name: bytes, path: str, follow_symlinks: bool):
+    """
+    Get the status of a file with the statx system call.
+
+    Args:
+        dir_fd (int): The directory file descriptor the name is relative to, or _AT_FDCWD.
+        name (bytes): The name of the file relative to dir_fd.
+        path (str): The path of the file, used in error messages.
+        follow_symlinks (bool): Whether to follow a symbolic link.
+
+    Returns:
+        os.stat_result: The status of the file with the fields used by the analyzer.
+
+    Raises:
+        OSError: If the status can't be obtained.
+    """
+    buf = getattr(_local, "statx", None)
+    if buf is None:
+        buf = _local.statx = ctypes.create_string_buffer(_STATX_SIZE)
+    flags = _AT_NO_AUTOMOUNT | (0 if follow_symlinks else _AT_SYMLINK_NOFOLLOW)
+    if _statx_call(dir_fd, name, flags, _STATX_MASK, buf) != 0:
+        _raise_errno(path)
+    (
+        nlink,
+        uid,
+        gid,
+        mode,
+        ino,
+        size,
+        blocks,
+        mtime_sec,
+        mtime_nsec,
+        dev_major,
+        dev_minor,
+    ) = _STATX_FIELDS.unpack_from(buf, 16)
+    # The fields not in the sequence part of os.stat_result are passed positionally as well:
+    # st_atime, st_mtime, st_ctime, st_atime_ns, st_mtime_ns, st_ctime_ns, st_blksize, st_blocks.
+    # It is much faster than passing them in a dict.
+    return os.stat_result(
+        (
+            mode,
+            ino,
+            os.makedev(dev_major, dev_minor),
+            nlink,
+            uid,
+            gid,
+            size,
+            0,
+            mtime_sec,
+            0,
+            None,
+            mtime_sec + mtime_nsec / 1e9,
+            None,
+            None,
+            mtime_sec * 1_000_000_000 + mtime_nsec,
+            None,
+            None,
+            blocks,
+        )
+    )
+
+
+class _DirHandle:
+    """
+    An open directory shared by the entries read from it.
+    Entries stat'ed while the directory is open use its descriptor to avoid path lookups.
+    """
+
+    __slots__ = ("fd",)
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+
+class DirEntry:
+    """
+    The DirEntry class represents a directory entry read with getdents64.
+    It provides the same interface as os.DirEntry, and status is obtained with statx.
+
+    Public Attributes:
+        name (str): The name of the entry.
+        path (str): The path of the entry.
+
+    Public Methods:
+        inode(): Get the inode number of the entry.
+        is_dir(follow_symlinks=True): Check whether the entry is a directory.
+        is_file(follow_symlinks=True): Check whether the entry is a regular file.
+        is_symlink(): Check whether the entry is a symbolic link.
+        stat(follow_symlinks=True): Get the status of the entry.
+    """
+
+    __slots__ = ("name", "path", "_name", "_ino", "_d_type", "_dir", "_stat", "_lstat")
+
+    def __init__(self, dir_path: str, name: bytes, ino: int, d_type: int, dir_handle):
+        # dir_path ends with a path separator
+        self._name = name
+        self.name = name.decode(_FS_ENCODING, "surrogateescape")
+        self.path = dir_path + self.name
+        self._ino = ino
+        self._d_type = d_type
+        self._dir = dir_handle
+        self._stat = None
+        self._lstat = None
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<DirEntry {self.name!r}>"
+
+    def _do_stat(self, follow_symlinks: bool) -> os.stat_result:
+        """
+        Get the status of the entry relative to its directory if it is still open.
+        """
+        if self._dir.fd >= 0:
+            return _statx(self._dir.fd, self._name, self.path, follow_symlinks)
+        return _statx(_AT_FDCWD, os.fsencode(self.path), self.path, follow_symlinks)
+
+    def inode(self) -> int:
+        """
+        Get the inode number of the entry, as read from the directory.
+        """
+        return self._ino
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        """
+        Get the status of the entry. The result is cached.
+        """
+        if self._lstat is None:
+            self._lstat = self._do_stat(False)
+        if not follow_symlinks or not stat.S_ISLNK(self._lstat.st_mode):
+            return self._lstat
+        if self._stat is None:
+            self._stat = self._do_stat(True)
+        return self._stat
+
+    def is_symlink(self) -> bool:
+        """
+        Check whether the entry is a symbolic link, without a system call if the file system reports types.
+        """
+        if self._d_type != _DT_UNKNOWN:
+            return self._d_type == _DT_LNK
+        return stat.S_ISLNK(self.stat(follow_symlinks=False).st_mode)
+
+    def _test_mode(self, test, d_type: int, follow_symlinks: bool) -> bool:
+        """
+        Check the type of the entry by the type read from the directory,
+        or by its status for symbolic links and file systems which don't report types.
+        """
+        if self._d_type not in (_DT_UNKNOWN, _DT_LNK) or (
+            self._d_type == _DT_LNK and not follow_symlinks
+        ):
+            return self._d_type == d_type
+        try:
+            return test(self.stat(follow_symlinks=follow_symlinks).st_mode)
+        except FileNotFoundError:
+            return False
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        """
+        Check whether the entry is a directory.
+        """
+        return self._test_mode(stat.S_ISDIR, _DT_DIR, follow_symlinks)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        """
+        Check whether the entry is a regular file.
+        """
+        return self._test_mode(stat.S_ISREG, _DT_REG, follow_symlinks)
+
+
+class _ScandirIterator:
+    """
+    An iterator over the entries of a directory read with getdents64 into a buffer reused between calls.
+    Like os.scandir, the directory is opened on creation and closed when the iteration ends.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._prefix = os.path.join(path, "")  # Prefix of the paths of the entries
+        self._dir = _DirHandle(
+            os.open(path, os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC)
+        )
+        # Take the buffer of this thread, a nested iterator allocates a buffer of its own
+        self._buf = getattr(_local, "dirents", None) or bytearray(_BUFFER_SIZE)
+        _local.dirents = None
+        self._iterator = self._iterate()
+
+    def __iter__(self):
+        return self._iterator
+
+    def __next__(self) -> DirEntry:
+        return next(self._iterator)
+
+    def _iterate(self):
+        """
+        Yield the entries of the directory batch by batch and close it at the end.
+        """
+        try:
+            while self._dir.fd >= 0:
+                more, entries = self._read()
+                if not more:
+                    break
+                yield from entries
+        finally:
+            self.close()
+
+    def _read(self) -> tuple:
+        """
+        Read the next batch of entries into the buffer and parse them in place.
+        Only the names are copied out of the buffer.
+
+        Returns:
+            tuple: False if there are no more entries, and the list of entries of the batch.
+
+        Raises:
+            OSError: If the directory can't be read.
+        """
+        syscall, _, sys_getdents64 = _LIBC
+        buf = self._buf
+        c_buf = (ctypes.c_char * len(buf)).from_buffer(buf)
+        nread = syscall(sys_getdents64, self._dir.fd, c_buf, len(buf))
+        del c_buf  # Release the export of the buffer
+        if nread < 0:
+            _raise_errno(self._path)
+        entries = []
+        prefix, dir_handle = self._prefix, self._dir
+        offset = 0
+        while offset < nread:
+            ino, _, reclen, d_type = _DIRENT.unpack_from(buf, offset)
+            name_start = offset + _DIRENT.size
+            name_end = buf.find(b"\0", name_start, offset + reclen)
+            name = bytes(buf[name_start:name_end])
+            offset += reclen
+            if name != b"." and name != b"..":
+                entries.append(DirEntry(prefix, name, ino, d_type, dir_handle))
+        return nread > 0, entries
+
+    def close(self):
+        """
+        Close the directory and return the buffer for reuse.
+        """
+        if getattr(self, "_dir", None) is not None and self._dir.fd >= 0:
+            os.close(self._dir.fd)
+            self._dir.fd = -1
+            _local.dirents = self._buf
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def scandir(path: str):
+    """
+    Iterate over the entries of a directory with getdents64 and statx.
+    Falls back to os.scandir if the system calls are not supported on this platform
+    or statx is not supported by the kernel.
+
+    Args:
+        path (str): The path to the directory.
+
+    Returns:
+        Iterator: An iterator of DirEntry (or os.DirEntry) objects.
+
+    Raises:
+        OSError: If the directory can't be opened.
+    """
+    if not AVAILABLE:
+        return os.scandir(path)
+    return _ScandirIterator(os.fspath(path))
@@ -0,0 +1,261 @@
+import os
+
+# Bits of the flags column for unusual permissions
+FLAGS = {
+    "setuid": 0o4000,
+    "setgid": 0o2000,
+    "world-writable": 0o2,
+    "no-permissions": 0o1000000,  # Outside of the mode bits, as it is the absence of bits
+}
+
+_SCHEMA = """
+CREATE TABLE entries (
+    path TEXT NOT NULL,
+    parent TEXT NOT NULL,
+    category TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    gid INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    flags INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+)
+"""
+
+_INDEXES = (
+    "CREATE INDEX entries_size ON entries (size)",
+    "CREATE INDEX entries_category ON entries (category, size)",
+    "CREATE INDEX entries_uid ON entries (uid, size)",
+    "CREATE INDEX entries_gid ON entries (gid, size)",
+    "CREATE INDEX entries_flags ON entries (flags, size)",
+    "CREATE INDEX entries_parent ON entries (parent)",
+)
+
+
+def _to_text(path: str) -> str:
+    """
+    Convert a path to text which can be stored in the database.
+    Bytes of file names which are not valid UTF-8 are replaced by backslash escapes.
+
+    Args:
+        path (str): The path.
+
+    Returns:
+        str: The path as valid UTF-8 text.
+    """
+    if path.isascii():
+        return path
+    return path.encode("utf-8", "surrogateescape").decode("utf-8", "backslashreplace")
+
+
+def permission_flags(mode: int) -> int:
+    """
+    Get the flags of unusual permissions of a file.
+    Unlike utils.unusual_permissions, all unusual permissions of the file are reported.
+
+    Args:
+        mode (int): File mode bits representing permissions.
+
+    Returns:
+        int: A combination of FLAGS values.
+    """
+    flags = mode & (FLAGS["setuid"] | FLAGS["setgid"] | FLAGS["world-writable"])
+    if mode & 0o777 == 0:
+        flags |= FLAGS["no-permissions"]
+    return flags
+
+
+class ScanIndex:
+    """
+    The ScanIndex class writes scan results to an indexed SQLite database,
+    which can be queried later without rescanning the directory.
+
+    Entries are inserted in large transactions, and the indexes are built once all entries are inserted.
+
+    Public Methods:
+        record(path: str, file_stat: os.stat_result, category: str): Add an entry to the index.
+        close(): Write the remaining entries, build the indexes and close the database.
+    """
+
+    _BATCH_SIZE = 50000  # Number of entries inserted in a single transaction
+    _ENTRY_MEMORY = 400  # Estimated memory of an entry waiting to be inserted, in bytes
+
+    def __init__(self, path: str, max_memory: int = 0):
+        """
+        Initialize the ScanIndex. An existing database at the path is overwritten.
+
+        Args:
+            path (str): The path to the database file.
+            max_memory (int): The memory budget of the entries waiting to be inserted in bytes.
+                              Transactions are made smaller to fit (default: 0, no limit).
+
+        Raises:
+            OSError: If an existing database can't be removed.
+            sqlite3.Error: If the database can't be created.
+        """
+        import sqlite3  # Deferred to keep startup fast for runs without an index
+
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._batch = []
+        self._batch_size = ScanIndex._BATCH_SIZE
+        if max_memory:
+            self._batch_size = max(
+                min(self._batch_size, max_memory // ScanIndex._ENTRY_MEMORY), 1
+            )
+
+    def record(self, path: str, file_stat: os.stat_result, category: str):
+        """
+        Add an entry to the index.
+
+        Args:
+            path (str): The path to the entry.
+            file_stat (os.stat_result): The stat result of the entry.
+            category (str): The file type category of the entry.
+        """
+        path = _to_text(path)
+        self._batch.append(
+            (
+                path,
+                os.path.dirname(path),
+                category,
+                file_stat.st_size,
+                file_stat.st_uid,
+                file_stat.st_gid,
+                file_stat.st_mode,
+                permission_flags(file_stat.st_mode),
+                file_stat.st_mtime_ns,
+            )
+        )
+        if len(self._batch) >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        """
+        Insert the pending entries in a single transaction.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", self._batch
+            )
+        self._batch = []
+
+    def close(self):
+        """
+        Write the remaining entries, build the indexes and close the database,
+        leaving it in rollback journal mode so it can be queried from a read-only directory.
+        """
+        if self._connection is None:
+            return
+        self._flush()
+        with self._connection:
+            for statement in _INDEXES:
+                self._connection.execute(statement)
+        self._connection.execute("ANALYZE")
+        # WAL speeds up writing; once written, the index is read only, and a database in WAL mode
+        # can't be opened by a reader without creating -wal and -shm files next to it
+        self._connection.execute("PRAGMA journal_mode=DELETE")
+        self._connection.close()
+        self._connection = None
+
+
+def query(
+    path: str,
+    category: str = None,
+    min_size: int = None,
+    max_size: int = None,
+    uid: int = None,
+    gid: int = None,
+    flags: list = (),
+    parent: str = None,
+    limit: int = None,
+) -> list:
+    """
+    Query entries of a scan index. Entries are filtered by all the given conditions.
+
+    Args:
+        path (str): The path to the database file.
+        category (str): The file type category of the entries.
+        min_size (int): The minimum size of the entries in bytes (inclusive).
+        max_size (int): The maximum size of the entries in bytes (inclusive).
+        uid (int): The owner of the entries.
+        gid (int): The group of the entries.
+        flags (list): Unusual permissions the entries must have, keys of FLAGS.
+        parent (str): The directory the entries are in.
+        limit (int): The maximum number of entries to return.
+
+    Returns:
+        list: (path, category, size, uid, gid, mode) tuples of the matching entries, the biggest first.
+
+    Raises:
+        FileNotFoundError: If the database doesn't exist.
+        sqlite3.Error: If the database can't be queried.
+    """
+    import sqlite3
+    import urllib.parse
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(2, "No such file or directory", path)
+    conditions, params = [], []
+    for column, value in (("category", category), ("uid", uid), ("gid", gid)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if parent is not None:
+        conditions.append("parent = ?")
+        params.append(_to_text(os.path.abspath(parent)))
+    if min_size is not None:
+        conditions.append("size >= ?")
+        params.append(min_size)
+    if max_size is not None:
+        conditions.append("size <= ?")
+        params.append(max_size)
+    if flags:
+        # Flag combinations having all the requested flags are listed, so the index can be used
+        required = 0
+        for flag in flags:
+            required |= FLAGS[flag]
+        combinations = [
+            combination
+            for combination in map(_combination, range(1 << len(FLAGS)))
+            if combination & required == required
+        ]
+        conditions.append(f"flags IN ({', '.join('?' * len(combinations))})")
+        params.extend(combinations)
+
+    sql = "SELECT path, category, size, uid, gid, mode FROM entries"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY size DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    uri = f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+    connection = sqlite3.connect(uri, uri=True)
+    try:
+        return connection.execute(sql, params).fetchall()
+    finally:
+        connection.close()
+
+
+def _combination(value: int) -> int:
+    """
+    Get the combination of FLAGS values selected by the bits of a number.
+
+    Args:
+        value (int): A number whose i-th bit selects the i-th flag of FLAGS.
+
+    Returns:
+        int: The combination of FLAGS values.
+    """
+    flags = 0
+    for i, flag in enumerate(FLAGS.values()):
+        if value & (1 << i):
+            flags |= flag
+    return flags
@@ -0,0 +1,186 @@
+import collections
+import heapq
+import itertools
+import os
+
+from analyzer import snapshot
+
+
+def subtree_sizes(snapshot_path: str) -> dict:
+    """
+    Get the total size of the entries under each directory of a snapshot.
+
+    The size of each entry is added to its parent directory, then the directories are rolled up
+    into their parents, the deepest first, so the snapshot is read once and only the directories
+    are kept in memory. The directories above the scanned directory are not included.
+
+    Args:
+        snapshot_path (str): The path to the snapshot file.
+
+    Returns:
+        dict: The size in bytes of the entries under each directory, by path.
+
+    Raises:
+        OSError: If the snapshot can't be read.
+        ValueError: If the file is not a snapshot.
+    """
+    sizes = collections.defaultdict(int)
+    for entry in snapshot.read_snapshot(snapshot_path):
+        sizes[os.path.dirname(entry.path)] += entry.size
+    for path in sorted(sizes, key=lambda path: path.count(b"/"), reverse=True):
+        parent = os.path.dirname(path)
+        if parent != path and parent in sizes:
+            sizes[parent] += sizes[path]
+    return {os.fsdecode(path): size for path, size in sizes.items()}
+
+
+class DirectoryPriorities:
+    """
+    The DirectoryPriorities class ranks directories by the results of previous scans, so that
+    the heaviest or fastest-growing subtrees can be scanned first.
+
+    The priority of a directory is the size of its subtree in the latest snapshot. If an older
+    snapshot is given, it is the size the subtree will have if it keeps growing at the same pace:
+    the latest size plus the growth since the older snapshot.
+
+    Public Methods:
+        priority(path: str): Get the priority of a directory.
+        size(path: str): Get the size of the subtree of a directory in the latest snapshot.
+        coverage(root: str, pending: list): Get the bytes of the latest snapshot covered by a partial scan.
+        queue(paths: list): Create a queue of directories ordered by priority.
+    """
+
+    def __init__(self, snapshot_path: str, older_snapshot_path: str = None):
+        """
+        Initialize the DirectoryPriorities from snapshots of previous scans.
+
+        Args:
+            snapshot_path (str): The path to the latest snapshot.
+            older_snapshot_path (str): The path to an older snapshot to measure the growth of
+                                       the subtrees since (default: None, subtrees are ranked by size).
+
+        Raises:
+            OSError: If a snapshot can't be read.
+            ValueError: If a file is not a snapshot.
+        """
+        self._sizes = subtree_sizes(snapshot_path)
+        if older_snapshot_path is None:
+            self._priorities = self._sizes
+        else:
+            older = subtree_sizes(older_snapshot_path)
+            self._priorities = {
+                path: max(2 * size - older.get(path, 0), 0)
+                for path, size in self._sizes.items()
+            }
+
+    def priority(self, path: str) -> int:
+        """
+        Get the priority of a directory. Directories unknown to the snapshots have the lowest priority.
+
+        Args:
+            path (str): The absolute path to the directory.
+
+        Returns:
+            int: The priority, the expected size of the subtree in bytes.
+        """
+        return self._priorities.get(path, 0)
+
+    def size(self, path: str) -> int:
+        """
+        Get the size of the subtree of a directory in the latest snapshot.
+
+        Args:
+            path (str): The absolute path to the directory.
+
+        Returns:
+            int: The size in bytes, 0 if the directory is not in the snapshot.
+        """
+        return self._sizes.get(path, 0)
+
+    def coverage(self, root: str, pending: list) -> tuple:
+        """
+        Get the bytes of the latest snapshot covered by a partial scan.
+        The directories left in the queue of a scan are distinct subtrees, none of them scanned.
+
+        Args:
+            root (str): The absolute path to the scanned directory.
+            pending (list): The directories left unscanned.
+
+        Returns:
+            tuple: The bytes covered by the scan and the total size of the directory in the latest snapshot.
+        """
+        total = self.size(root)
+        return max(total - sum(self.size(path) for path in pending), 0), total
+
+    def queue(self, paths: list = ()) -> "DirectoryQueue":
+        """
+        Create a queue of directories ordered by priority.
+
+        Args:
+            paths (list): The directories to queue first (default: none).
+
+        Returns:
+            DirectoryQueue: The queue.
+        """
+        queue = DirectoryQueue(self)
+        for path in paths:
+            queue.append(path)
+        return queue
+
+
+class DirectoryQueue:
+    """
+    The DirectoryQueue class is a priority queue of directories to traverse, used in place of
+    the list of traverse_queue: the directory with the highest priority is popped first, and
+    directories with the same priority in the order they were appended.
+
+    Public Methods:
+        append(path: str): Add a directory to the queue.
+        pop(index: int): Remove and return the directory with the highest priority.
+    """
+
+    def __init__(self, priorities: DirectoryPriorities):
+        """
+        Initialize an empty DirectoryQueue.
+
+        Args:
+            priorities (DirectoryPriorities): The priorities of the directories.
+        """
+        self._priorities = priorities
+        self._heap = []
+        self._order = itertools.count()
+
+    def append(self, path: str):
+        """
+        Add a directory to the queue.
+
+        Args:
+            path (str): The absolute path to the directory.
+        """
+        heapq.heappush(
+            self._heap, (-self._priorities.priority(path), next(self._order), path)
+        )
+
+    def pop(self, index: int = 0) -> str:
+        """
+        Remove and return the directory with the highest priority.
+
+        Args:
+            index (int): Only 0, the head of the queue, as with the list of traverse_queue.
+
+        Returns:
+            str: The absolute path to the directory.
+
+        Raises:
+            IndexError: If the queue is empty.
+            ValueError: If the index is not 0.
+        """
+        if index != 0:
+            raise ValueError("Only the head of a DirectoryQueue can be popped.")
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self):
+        return (path for _, _, path in sorted(self._heap))
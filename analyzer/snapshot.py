@@ -0,0 +1,250 @@
+import collections
+import os
+import stat
+import struct
+
+_MAGIC = b"FSAS\x01"  # File signature and format version
+_COUNT = struct.Struct("<H")
+# Record: shared prefix length with the previous path, suffix length,
+# size, mode, uid, gid, modification time in ns and category index, followed by the suffix
+_RECORD = struct.Struct("<HHQIIIqH")
+# Estimated memory of an entry waiting to be written, in addition to the length of its path, in bytes
+_ENTRY_MEMORY = 150
+
+Entry = collections.namedtuple(
+    "Entry", ["path", "size", "mode", "uid", "gid", "mtime_ns", "category"]
+)
+Entry.__doc__ = (
+    "An entry of a snapshot. The path is in bytes, as it is sorted by bytes."
+)
+
+
+class SnapshotWriter:
+    """
+    The SnapshotWriter class writes scan results to a snapshot file, to be compared with
+    a later snapshot of the same directory.
+
+    Snapshots are in a compact binary format: entries are sorted by path, and each path is stored
+    as the length of the prefix it shares with the previous path and the remaining suffix.
+    Categories are stored once in the header and referred to by index.
+    Entries are sorted with an ExternalSorter, so that they can be spilled to temporary files
+    under a memory budget.
+
+    Public Methods:
+        record(path: str, file_stat: os.stat_result, category: str): Add an entry to the snapshot.
+        close(): Sort the entries and write the snapshot file.
+    """
+
+    def __init__(self, path: str, max_memory: int = 0):
+        """
+        Initialize the SnapshotWriter. The file is created right away, so that errors are reported
+        before the scan. An existing file at the path is overwritten.
+
+        Args:
+            path (str): The path to the snapshot file.
+            max_memory (int): The memory budget of the entries waiting to be written in bytes
+                              (default: 0, no limit).
+
+        Raises:
+            OSError: If the file can't be created.
+        """
+        # Deferred to keep startup fast for runs without a snapshot
+        from analyzer import spill
+
+        self._out = open(path, "wb")
+        self._entries = spill.ExternalSorter(
+            max_memory, lambda entry: _ENTRY_MEMORY + len(entry[0])
+        )
+        self._categories = {}  # Category index by category name
+
+    def record(self, path: str, file_stat: os.stat_result, category: str):
+        """
+        Add an entry to the snapshot.
+
+        Args:
+            path (str): The path to the entry.
+            file_stat (os.stat_result): The stat result of the entry.
+            category (str): The file type category of the entry.
+        """
+        category_index = self._categories.setdefault(category, len(self._categories))
+        self._entries.add(
+            (
+                os.fsencode(path),
+                file_stat.st_size,
+                file_stat.st_mode,
+                file_stat.st_uid,
+                file_stat.st_gid,
+                file_stat.st_mtime_ns,
+                category_index,
+            )
+        )
+
+    def close(self):
+        """
+        Sort the entries by path and write the snapshot file. An entry recorded more than once,
+        e.g. a file reached through several symbolic links, is written once.
+        """
+        if self._out.closed:
+            return
+        try:
+            self._out.write(_MAGIC)
+            self._out.write(_COUNT.pack(len(self._categories)))
+            for category in self._categories:
+                name = category.encode()
+                self._out.write(_COUNT.pack(len(name)) + name)
+            previous = b""
+            for path, *fields in self._entries:
+                if path == previous:
+                    continue
+                shared = len(os.path.commonprefix((previous, path)))
+                suffix = path[shared:]
+                self._out.write(_RECORD.pack(shared, len(suffix), *fields) + suffix)
+                previous = path
+        finally:
+            self._entries.close()
+            self._out.close()
+
+
+def read_snapshot(path: str):
+    """
+    Read the entries of a snapshot file one by one.
+
+    Args:
+        path (str): The path to the snapshot file.
+
+    Yields:
+        Entry: The entries of the snapshot, sorted by path.
+
+    Raises:
+        OSError: If the file can't be read.
+        ValueError: If the file is not a snapshot.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{path} is not a snapshot file.")
+        categories = []
+        for _ in range(_read(f, _COUNT, path)[0]):
+            length = _read(f, _COUNT, path)[0]
+            categories.append(_read_bytes(f, length, path).decode())
+        previous = b""
+        while True:
+            record = f.read(_RECORD.size)
+            if not record:
+                return
+            if len(record) < _RECORD.size:
+                raise ValueError(f"{path} is truncated.")
+            shared, length, size, mode, uid, gid, mtime_ns, category = _RECORD.unpack(
+                record
+            )
+            if shared > len(previous) or category >= len(categories):
+                raise ValueError(f"{path} is corrupt.")
+            previous = previous[:shared] + _read_bytes(f, length, path)
+            yield Entry(previous, size, mode, uid, gid, mtime_ns, categories[category])
+
+
+def _read_bytes(f, length: int, path: str) -> bytes:
+    """
+    Read bytes from a snapshot file.
+
+    Raises:
+        ValueError: If the file is truncated.
+    """
+    data = f.read(length)
+    if len(data) < length:
+        raise ValueError(f"{path} is truncated.")
+    return data
+
+
+def _read(f, structure: struct.Struct, path: str) -> tuple:
+    """
+    Read and unpack a structure from a snapshot file.
+
+    Raises:
+        ValueError: If the file is truncated.
+    """
+    data = f.read(structure.size)
+    if len(data) < structure.size:
+        raise ValueError(f"{path} is truncated.")
+    return structure.unpack(data)
+
+
+class SnapshotDiff:
+    """
+    The SnapshotDiff class compares two snapshots of a directory.
+
+    Both snapshots are read at the same time and merge-joined by path,
+    so the memory used doesn't depend on the size of the snapshots.
+
+    Public Attributes:
+        category_deltas (dict): (number of entries, size) change of each category,
+                                complete once the changes are iterated over.
+
+    Public Methods:
+        changes(): Iterate over the changed entries.
+    """
+
+    def __init__(self, old_path: str, new_path: str):
+        """
+        Initialize the SnapshotDiff.
+
+        Args:
+            old_path (str): The path to the older snapshot file.
+            new_path (str): The path to the newer snapshot file.
+        """
+        self._old_path = old_path
+        self._new_path = new_path
+        self.category_deltas = collections.defaultdict(lambda: [0, 0])
+
+    def _count(self, entry: Entry, sign: int):
+        """
+        Count an entry in the category deltas.
+
+        Args:
+            entry (Entry): The entry.
+            sign (int): 1 for an entry of the newer snapshot, -1 for an entry of the older one.
+        """
+        delta = self.category_deltas[entry.category]
+        delta[0] += sign
+        delta[1] += sign * entry.size
+
+    def changes(self):
+        """
+        Iterate over the changed entries, sorted by path.
+
+        Yields:
+            tuple: (kind, old, new), where kind is one of "added", "removed", "resized",
+                   "permissions" (mode, owner or group change) and "recategorized", and old and new
+                   are the Entry of the older and the newer snapshot, or None for added and removed
+                   entries. An entry with several kinds of changes is yielded once for each.
+                   Directories are not reported as resized.
+
+        Raises:
+            OSError: If a snapshot can't be read.
+            ValueError: If a file is not a snapshot.
+        """
+        old_entries = read_snapshot(self._old_path)
+        new_entries = read_snapshot(self._new_path)
+        old = next(old_entries, None)
+        new = next(new_entries, None)
+        while old is not None or new is not None:
+            if new is None or (old is not None and old.path < new.path):
+                self._count(old, -1)
+                yield "removed", old, None
+                old = next(old_entries, None)
+            elif old is None or new.path < old.path:
+                self._count(new, 1)
+                yield "added", None, new
+                new = next(new_entries, None)
+            else:
+                if old.size != new.size or old.category != new.category:
+                    self._count(old, -1)
+                    self._count(new, 1)
+                # Size changes of directories are not reported, as they depend on the file system
+                if old.size != new.size and not stat.S_ISDIR(new.mode):
+                    yield "resized", old, new
+                if (old.mode, old.uid, old.gid) != (new.mode, new.uid, new.gid):
+                    yield "permissions", old, new
+                if old.category != new.category:
+                    yield "recategorized", old, new
+                old = next(old_entries, None)
+                new = next(new_entries, None)
@@ -0,0 +1,352 @@
+import bisect
+import collections
+import heapq
+import os
+import pickle
+import struct
+import tempfile
+
+# Number of runs of a size merged into one run of the next size, and at most into the final merge
+# for each size. Merges hold a chunk of each run in memory
+_FAN_IN = 16
+# Number of chunks a run is written in: a merge of _FAN_IN runs holds 1/4 of the memory of a run
+_CHUNKS = 4 * _FAN_IN
+# Number of runs of a size merged into one run of a SpilledSet. Keys are small, so runs are merged
+# more often than in ExternalSorter, to keep the runs a lookup reads few
+_SET_FAN_IN = 4
+# Directory keys of a SpilledSet on disk: st_dev and st_ino
+_KEY = struct.Struct("<QQ")
+# Number of keys in a block of a SpilledSet run, read at once to look a key up
+_BLOCK_KEYS = 256
+# Estimated memory of a directory key in a set, in bytes
+KEY_MEMORY = 130
+# Estimated memory of a path in a list, in addition to its length, in bytes
+PATH_MEMORY = 60
+
+
+class ExternalSorter:
+    """
+    The ExternalSorter class sorts items that may not fit in memory.
+
+    Items are kept in memory up to a memory budget, then sorted and spilled to a temporary file
+    as a run. Runs are merged with heapq.merge: _FAN_IN runs of a size are merged into a run
+    of the next size as they are spilled, so that the final merge reads a bounded number of runs,
+    and each run is read back in chunks, so that merging doesn't hold more than the budget.
+
+    Public Methods:
+        add(item): Add an item.
+        close(): Remove the runs.
+    """
+
+    def __init__(self, max_memory: int = 0, item_memory=None):
+        """
+        Initialize an empty ExternalSorter.
+
+        Args:
+            max_memory (int): The memory budget of the items kept in memory in bytes (default: 0, no limit).
+            item_memory (function): A function estimating the memory of an item in bytes,
+                                    required with a memory budget.
+        """
+        self._max_memory = max_memory
+        self._item_memory = item_memory
+        self._items = []
+        self._memory = 0
+        # (level, file) pairs: a run of level n results of _FAN_IN**n spills
+        self._runs = []
+        self._chunk = 1
+
+    def add(self, item):
+        """
+        Add an item, spilling the items in memory to a run if they exceed the memory budget.
+
+        Args:
+            item: The item, comparable with the other items.
+        """
+        self._items.append(item)
+        if self._max_memory:
+            self._memory += self._item_memory(item)
+            if self._memory >= self._max_memory:
+                self._spill()
+
+    def _spill(self):
+        """
+        Sort the items in memory and write them to a new run, then merge the runs of the same size.
+        """
+        self._items.sort()
+        self._chunk = max(len(self._items) // _CHUNKS, 1)
+        self._runs.append((0, self._write_run(self._items)))
+        self._items = []
+        self._memory = 0
+        while len(self._runs) >= _FAN_IN and (
+            self._runs[-_FAN_IN][0] == self._runs[-1][0]
+        ):
+            level = self._runs[-1][0]
+            runs = [run for _, run in self._runs[-_FAN_IN:]]
+            merged = self._write_run(heapq.merge(*map(self._read_run, runs)))
+            for run in runs:
+                run.close()
+            del self._runs[-_FAN_IN:]
+            self._runs.append((level + 1, merged))
+
+    def _write_run(self, items):
+        """
+        Write sorted items to a temporary file in chunks.
+
+        Args:
+            items: The sorted items.
+
+        Returns:
+            file: The temporary file, removed when closed.
+        """
+        run = tempfile.TemporaryFile()
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self._chunk:
+                pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, run, pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+        return run
+
+    @staticmethod
+    def _read_run(run):
+        """
+        Read the items of a run one chunk at a time.
+
+        Args:
+            run (file): The file of the run.
+
+        Yields:
+            The items of the run, sorted.
+        """
+        while True:
+            try:
+                chunk = pickle.load(run)
+            except EOFError:
+                return
+            yield from chunk
+
+    def __iter__(self):
+        """
+        Iterate over the items, sorted. The sorter can't be added to afterwards.
+        """
+        if not self._runs:
+            self._items.sort()
+            return iter(self._items)
+        if self._items:
+            self._spill()
+        return heapq.merge(*(self._read_run(run) for _, run in self._runs))
+
+    def close(self):
+        """
+        Remove the runs and the items in memory.
+        """
+        for _, run in self._runs:
+            run.close()
+        self._runs = []
+        self._items = []
+
+
+class _KeyRun:
+    """
+    A sorted run of directory keys of a SpilledSet, with the first key of each block in memory.
+    """
+
+    def __init__(self, keys):
+        self._file = tempfile.TemporaryFile()
+        self.count = 0
+        self._fences = []
+        for key in keys:
+            if not self.count % _BLOCK_KEYS:
+                self._fences.append(key)
+            self._file.write(_KEY.pack(*key))
+            self.count += 1
+        self._file.flush()
+
+    def __contains__(self, key: tuple) -> bool:
+        block = bisect.bisect_right(self._fences, key) - 1
+        if block < 0:
+            return False
+        data = os.pread(
+            self._file.fileno(),
+            _BLOCK_KEYS * _KEY.size,
+            block * _BLOCK_KEYS * _KEY.size,
+        )
+        keys = list(_KEY.iter_unpack(data))
+        index = bisect.bisect_left(keys, key)
+        return index < len(keys) and keys[index] == key
+
+    def __iter__(self):
+        fd = self._file.fileno()
+        for block in range(len(self._fences)):
+            data = os.pread(
+                fd, _BLOCK_KEYS * _KEY.size, block * _BLOCK_KEYS * _KEY.size
+            )
+            yield from _KEY.iter_unpack(data)
+
+    def close(self):
+        self._file.close()
+
+
+class SpilledSet:
+    """
+    The SpilledSet class is a set of directory keys, (st_dev, st_ino) pairs, that may not fit in memory.
+
+    Keys are kept in a set up to a memory budget, then written to a temporary file as a sorted run
+    of fixed-size records. The first key of each block of a run is kept in memory, so looking
+    a key up in a run reads a single block. Runs of the same size are merged as in ExternalSorter,
+    by _SET_FAN_IN, so the number of runs a lookup reads stays logarithmic in the number of keys.
+
+    Public Methods:
+        add(key: tuple): Add a key.
+        close(): Remove the runs.
+    """
+
+    def __init__(self, max_memory: int = 0):
+        """
+        Initialize an empty SpilledSet.
+
+        Args:
+            max_memory (int): The memory budget of the keys kept in memory in bytes (default: 0, no limit).
+        """
+        self._max_keys = max(max_memory // KEY_MEMORY, 1) if max_memory else 0
+        self._keys = set()
+        self._runs = []  # (level, _KeyRun) pairs
+        self._count = 0
+
+    def add(self, key: tuple):
+        """
+        Add a key. The key must not be in the set already.
+
+        Args:
+            key (tuple): The (st_dev, st_ino) pair of a directory.
+        """
+        self._keys.add(key)
+        self._count += 1
+        if self._max_keys and len(self._keys) >= self._max_keys:
+            self._runs.append((0, _KeyRun(sorted(self._keys))))
+            self._keys = set()
+            while len(self._runs) >= _SET_FAN_IN and (
+                self._runs[-_SET_FAN_IN][0] == self._runs[-1][0]
+            ):
+                level = self._runs[-1][0]
+                runs = [run for _, run in self._runs[-_SET_FAN_IN:]]
+                merged = _KeyRun(heapq.merge(*runs))
+                for run in runs:
+                    run.close()
+                del self._runs[-_SET_FAN_IN:]
+                self._runs.append((level + 1, merged))
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self._keys or any(key in run for _, run in self._runs)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self):
+        """
+        Remove the runs and the keys in memory.
+        """
+        for _, run in self._runs:
+            run.close()
+        self._runs = []
+        self._keys = set()
+
+
+class SpilledQueue:
+    """
+    The SpilledQueue class is a FIFO queue of paths that may not fit in memory, used in place of
+    the list of traverse_queue.
+
+    Paths are appended to a list in memory. When the paths in memory exceed the memory budget,
+    the list is written to a temporary file as a segment, and segments are read back in order
+    once the paths before them are popped.
+
+    Public Methods:
+        append(path: str): Add a path at the end of the queue.
+        pop(index: int): Remove and return the path at the head of the queue.
+        close(): Remove the segments.
+    """
+
+    def __init__(self, max_memory: int = 0):
+        """
+        Initialize an empty SpilledQueue.
+
+        Args:
+            max_memory (int): The memory budget of the paths in memory in bytes (default: 0, no limit).
+        """
+        # The head and the tail of the queue each take half of the budget
+        self._max_memory = max_memory // 2
+        self._head = collections.deque()
+        self._segments = collections.deque()
+        self._tail = []
+        self._memory = 0
+        self._count = 0
+
+    def append(self, path: str):
+        """
+        Add a path at the end of the queue.
+
+        Args:
+            path (str): The path.
+        """
+        self._tail.append(path)
+        self._count += 1
+        if self._max_memory:
+            self._memory += PATH_MEMORY + len(path)
+            if self._memory >= self._max_memory:
+                segment = tempfile.TemporaryFile()
+                pickle.dump(self._tail, segment, pickle.HIGHEST_PROTOCOL)
+                segment.seek(0)
+                self._segments.append(segment)
+                self._tail = []
+                self._memory = 0
+
+    def pop(self, index: int = 0) -> str:
+        """
+        Remove and return the path at the head of the queue.
+
+        Args:
+            index (int): Only 0, the head of the queue, as with the list of traverse_queue.
+
+        Returns:
+            str: The path.
+
+        Raises:
+            IndexError: If the queue is empty.
+            ValueError: If the index is not 0.
+        """
+        if index != 0:
+            raise ValueError("Only the head of a SpilledQueue can be popped.")
+        if not self._head:
+            if self._segments:
+                with self._segments.popleft() as segment:
+                    self._head = collections.deque(pickle.load(segment))
+            else:
+                self._head, self._tail = collections.deque(self._tail), []
+                self._memory = 0
+        path = self._head.popleft()
+        self._count -= 1
+        return path
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        yield from self._head
+        for segment in self._segments:
+            yield from pickle.load(segment)
+            segment.seek(0)
+        yield from self._tail
+
+    def close(self):
+        """
+        Remove the segments and the paths in memory.
+        """
+        for segment in self._segments:
+            segment.close()
+        self._segments.clear()
+        self._head.clear()
+        self._tail = []
@@ -0,0 +1,330 @@
+import contextlib
+import threading
+import time
+
+from analyzer import utils
+
+# Time between two adaptations of the rates to the observed latency, in seconds
+_ADJUST_INTERVAL = 1.0
+# Factor applied to a rate when the latency is above the target
+_DECREASE = 0.5
+# Fraction of the budget added to a rate when the latency is below the target
+_INCREASE = 0.1
+# Fraction of the budget a rate is never lowered below
+_MIN_FRACTION = 0.05
+
+
+class TokenBucket:
+    """
+    The TokenBucket class limits the rate of operations or bytes.
+
+    Tokens are added at the rate, up to a burst, and taken by operations. An operation bigger
+    than the tokens available is let through and puts the bucket in debt: the operation waits
+    until the debt is paid, so the long-term rate stays at the limit whatever the size of the operations.
+    Buckets are safe to use from several threads.
+
+    Public Attributes:
+        rate (float): The number of tokens added per second.
+
+    Public methods:
+        take: Take tokens, waiting while the bucket is in debt.
+        set_rate: Change the rate.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst_time: float = 0.1,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """
+        Initialize the TokenBucket, full.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            burst_time (float): The burst, as the time the rate takes to fill the bucket (default: 0.1 s).
+            clock (function): The clock in seconds (default: time.monotonic).
+            sleep (function): The function to wait with (default: time.sleep).
+        """
+        self.rate = rate
+        self._burst_time = burst_time
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self._burst()
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _burst(self) -> float:
+        """
+        Get the maximum number of tokens in the bucket.
+
+        Returns:
+            float: The burst, at least one token.
+        """
+        return max(self.rate * self._burst_time, 1)
+
+    def _refill(self):
+        """
+        Add the tokens earned since the last refill. The lock must be held.
+        """
+        now = self._clock()
+        self._tokens = min(self._burst(), self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def take(self, amount: float = 1) -> float:
+        """
+        Take tokens, waiting until the debt they leave is paid.
+
+        Args:
+            amount (float): The number of tokens (default: 1).
+
+        Returns:
+            float: The time waited in seconds.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            self._sleep(wait)
+        return wait
+
+    def set_rate(self, rate: float):
+        """
+        Change the rate. The tokens earned so far are kept.
+
+        Args:
+            rate (float): The new number of tokens added per second.
+        """
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self._tokens = min(self._tokens, self._burst())
+
+
+class _Budget:
+    """
+    A budget of an IOScheduler: a token bucket whose rate adapts to the latency of the operations.
+    """
+
+    def __init__(self, rate: float, target_latency: float, clock, sleep):
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, clock=clock, sleep=sleep) if rate else None
+        self.waited = 0.0  # Time spent waiting for tokens, in seconds
+        self._target_latency = target_latency
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Time spent in the operations and their number since the last adaptation
+        self._elapsed = 0.0
+        self._operations = 0
+        self._last_adjusted = clock()
+
+    def take(self, amount: float):
+        if self.bucket is not None:
+            waited = self.bucket.take(amount)
+            if waited:
+                with self._lock:
+                    self.waited += waited
+
+    def observe(self, elapsed: float, operations: int):
+        """
+        Account for the time spent in operations and adapt the rate once per _ADJUST_INTERVAL:
+        halve it if the average latency is above the target, raise it back towards the budget otherwise.
+        """
+        if self.bucket is None or not self._target_latency:
+            return
+        with self._lock:
+            self._elapsed += elapsed
+            self._operations += operations
+            now = self._clock()
+            if now - self._last_adjusted < _ADJUST_INTERVAL or not self._operations:
+                return
+            latency = self._elapsed / self._operations
+            self._elapsed, self._operations = 0.0, 0
+            self._last_adjusted = now
+        rate = self.bucket.rate
+        if latency > self._target_latency:
+            rate = max(rate * _DECREASE, self.max_rate * _MIN_FRACTION)
+        else:
+            rate = min(rate + self.max_rate * _INCREASE, self.max_rate)
+        self.bucket.set_rate(rate)
+
+    @contextlib.contextmanager
+    def operation(self, amount: float, operations: int):
+        self.take(amount)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.observe(self._clock() - start, operations)
+
+
+class _ThrottledEntry:
+    """
+    A directory entry whose stat calls are throttled by an IOScheduler.
+    It has the interface of os.DirEntry used by the traversal.
+    """
+
+    __slots__ = ("_entry", "_scheduler", "name", "path")
+
+    def __init__(self, entry, scheduler: "IOScheduler"):
+        self._entry = entry
+        self._scheduler = scheduler
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self) -> bool:
+        return self._entry.is_symlink()
+
+    def inode(self) -> int:
+        return self._entry.inode()
+
+    def stat(self, follow_symlinks: bool = True):
+        with self._scheduler.metadata():
+            return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        return f"<_ThrottledEntry {self.name!r}>"
+
+
+class IOScheduler:
+    """
+    The IOScheduler class throttles the I/O of a scan, so that it can run on shared storage
+    without degrading the latency of other workloads.
+
+    There are separate budgets for metadata operations (directory listings and stat calls),
+    in operations per second, and for content reads (the bytes read to classify files by
+    their signature), in bytes per second. Each budget is a token bucket.
+    With a target latency, the rates adapt to the storage: once per second, the rate of a budget
+    is halved if the average latency of its operations was above the target, down to 5% of the budget,
+    and raised by 10% of the budget otherwise, up to the budget.
+
+    Public methods:
+        metadata: Throttle and time metadata operations done in a with block.
+        content: Throttle and time a content read done in a with block.
+        wrap_scandir: Get a throttled version of a function with the interface of os.scandir.
+        summary: Get the description of the budgets and the time spent waiting.
+    """
+
+    def __init__(
+        self,
+        metadata_rate: float = 0,
+        content_rate: float = 0,
+        target_latency: float = 0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        """
+        Initialize the IOScheduler.
+
+        Args:
+            metadata_rate (float): The budget of metadata operations per second (default: 0, no limit).
+            content_rate (float): The budget of bytes read per second (default: 0, no limit).
+            target_latency (float): The latency of single operations in seconds above which
+                                    the rates are lowered (default: 0, the rates don't adapt).
+            clock (function): The clock in seconds (default: time.monotonic).
+            sleep (function): The function to wait with (default: time.sleep).
+
+        Raises:
+            ValueError: If a rate or the target latency is negative.
+        """
+        if metadata_rate < 0 or content_rate < 0:
+            raise ValueError("Invalid I/O budget: rates should be positive.")
+        if target_latency < 0:
+            raise ValueError(
+                f"Invalid target latency {target_latency}: should be positive."
+            )
+        self._clock = clock
+        self._metadata = _Budget(metadata_rate, target_latency, clock, sleep)
+        self._content = _Budget(content_rate, target_latency, clock, sleep)
+
+    def metadata(self, operations: int = 1):
+        """
+        Wait for the budget of metadata operations, then time the operations done in a with block.
+
+        Args:
+            operations (int): The number of operations (default: 1).
+
+        Returns:
+            contextlib.AbstractContextManager: The context of the operations.
+        """
+        return self._metadata.operation(operations, operations)
+
+    def content(self, size: int):
+        """
+        Wait for the budget of content reads, then time the read done in a with block.
+
+        Args:
+            size (int): The number of bytes read.
+
+        Returns:
+            contextlib.AbstractContextManager: The context of the read.
+        """
+        return self._content.operation(size, 1)
+
+    def wrap_scandir(self, scandir):
+        """
+        Get a throttled version of a function with the interface of os.scandir.
+
+        Opening a directory takes one metadata operation and each stat call of an entry another one.
+        The time spent reading entries counts towards the latency of the operations,
+        so that backends which stat entries while listing them are also adapted to.
+
+        Args:
+            scandir (function): The function to enumerate directory entries.
+
+        Returns:
+            function: The throttled function, yielding entries with the interface of os.DirEntry.
+        """
+        clock = self._clock
+        budget = self._metadata
+
+        def throttled_scandir(path):
+            with self.metadata():
+                entries = iter(scandir(path))
+            try:
+                while True:
+                    start = clock()
+                    entry = next(entries, None)
+                    budget.observe(clock() - start, 0)
+                    if entry is None:
+                        return
+                    yield _ThrottledEntry(entry, self)
+            finally:
+                close = getattr(entries, "close", None)
+                if close is not None:
+                    close()
+
+        return throttled_scandir
+
+    def summary(self) -> list:
+        """
+        Get the description of the budgets, their current rates and the time spent waiting.
+
+        Returns:
+            list: Lines of the summary.
+        """
+        lines = []
+        for budget, name, unit in (
+            (self._metadata, "Metadata operations", lambda rate: f"{rate:.0f} ops"),
+            (self._content, "Content reads", lambda rate: utils.file_size(round(rate))),
+        ):
+            if budget.bucket is None:
+                continue
+            rate = budget.bucket.rate
+            adapted = f" (lowered to {unit(rate)}/s)" if rate < budget.max_rate else ""
+            lines.append(
+                f"{name} throttled to {unit(budget.max_rate)}/s{adapted}, "
+                f"{budget.waited:.1f} s waited."
+            )
+        return lines
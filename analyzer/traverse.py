@@ -1,35 +1,149 @@
+import contextlib
 import os
 import sys
+import stat
+import time
 
 from analyzer.analyze import Analyzer
 from analyzer import utils
 
+# Backends to enumerate directory entries
+SCANDIR_BACKENDS = ("scandir", "getdents")
+# Estimated memory of a resolved link in the link cache, in bytes
+_LINK_MEMORY = 500
 
-def manage_dir(path: str, visited: set, queue: list, sym_link: str = ""):
+
+def get_scandir(backend: str):
+    """
+    Get the function to enumerate directory entries of a backend.
+    The getdents backend is imported on demand, as it loads ctypes.
+
+    Args:
+        backend (str): The backend name, one of SCANDIR_BACKENDS.
+
+    Returns:
+        function: A function with the interface of os.scandir.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "scandir":
+        return os.scandir
+    if backend == "getdents":
+        from analyzer import getdents
+
+        return getdents.scandir
+    raise ValueError(f"Invalid backend: {backend}.")
+
+
+def dir_key(dir_stat: os.stat_result) -> tuple:
+    """
+    Get the identity of a directory.
+
+    Two paths refer to the same directory if and only if they share the device and inode numbers,
+    no matter how the paths are spelled (symlinks, '..' components, bind mounts).
+
+    Args:
+        dir_stat (os.stat_result): The stat result of the directory.
+
+    Returns:
+        tuple: A (st_dev, st_ino) pair identifying the directory.
+    """
+    return dir_stat.st_dev, dir_stat.st_ino
+
+
+def _metadata(scheduler):
+    """
+    Get the context of a metadata operation, throttled by a scheduler if any.
+
+    Args:
+        scheduler (IOScheduler): The scheduler, or None for no throttling.
+
+    Returns:
+        contextlib.AbstractContextManager: The context of the operation.
+    """
+    return contextlib.nullcontext() if scheduler is None else scheduler.metadata()
+
+
+def manage_dir(
+    path: str,
+    visited: set,
+    queue: list,
+    sym_link: str = "",
+    dir_stat=None,
+    scheduler=None,
+):
     """
     Manage a directory path.
 
-    If the directory path has not been visited before, add it to the queue of directories to traverse.
-    If the directory path has been visited before, print an error message indicating a symlink loop.
+    If the directory has not been visited before, add it to the queue of directories to traverse.
+    If the directory has been visited before, print an error message indicating a symlink loop.
+    Directories are identified by their (st_dev, st_ino) pair, so a loop is detected
+    even if the directory is reached through a differently spelled path.
 
     Args:
-        path (str): The directory path to manage.
-        visited (set): A set containing visited directory paths.
+        path (str): The directory path to manage, already normalized by utils.normalize_path
+                    or joined to a normalized directory.
+        visited (set): A set containing (st_dev, st_ino) pairs of visited directories.
         queue (list): A list representing the queue of directories to traverse.
         sym_link (str): A path to symbolic link that points to the directory.
                         If not the directory was not pointed by symlink, defaults to "".
+        dir_stat (os.stat_result): The stat result of the directory, if it is already known.
+                                   If not provided, the directory is stat'ed.
+        scheduler (IOScheduler): The scheduler throttling the stat call (default: None, no throttling).
     """
-    path = os.path.abspath(path)
-    if path not in visited:
-        visited.add(path)
+    if dir_stat is None:
+        with _metadata(scheduler):
+            dir_stat = os.stat(path)
+    key = dir_key(dir_stat)
+    if key not in visited:
+        visited.add(key)
         queue.append(path)
     else:
         sym_link_str = f" Pointed by: {sym_link}." if sym_link else ""
         print(f"Error: symlink loop detected at {path}.{sym_link_str}", file=sys.stderr)
 
 
+def resolve_link(item: os.DirEntry, link_cache: dict, scheduler=None) -> tuple:
+    """
+    Resolve a symbolic link to an absolute path and the stat result of its target.
+
+    Resolved targets are cached by the link contents (and by the link's parent directory
+    for relative links), so many links pointing to the same target are resolved only once.
+
+    Args:
+        item (os.DirEntry): The symbolic link encountered during traversal.
+        link_cache (dict): A cache of resolved links.
+        scheduler (IOScheduler): The scheduler throttling the readlink and stat calls, each one
+                                 a metadata operation (default: None, no throttling).
+
+    Returns:
+        tuple: The normalized path of the link target and its stat result.
+
+    Raises:
+        OSError: If the link can't be read or its target doesn't exist.
+    """
+    with _metadata(scheduler):
+        target = os.readlink(item)
+    parent_dir = os.path.dirname(item.path)
+    key = target if os.path.isabs(target) else (parent_dir, target)
+    resolved = link_cache.get(key)
+    if resolved is None:
+        target_path = utils.normalize_path(target, parent_dir)
+        with _metadata(scheduler):
+            resolved = (target_path, os.stat(target_path))
+        link_cache[key] = resolved
+    return resolved
+
+
 def manage_item(
-    item: os.DirEntry, visited: set, queue: list, analyzer: Analyzer, follow_links=False
+    item: os.DirEntry,
+    visited: set,
+    queue: list,
+    analyzer: Analyzer,
+    follow_links=False,
+    link_cache=None,
+    scheduler=None,
 ):
     """
     Manage an item (file or directory) encountered during directory traversal.
@@ -44,9 +158,13 @@ def manage_item(
 
     Args:
         item (os.DirEntry): The item encountered during traversal.
-        visited (set): A set containing visited directory paths.
+        visited (set): A set containing (st_dev, st_ino) pairs of visited directories.
         queue (list): A list representing the queue of directories to traverse.
         analyzer (Analyzer): An instance of the Analyzer class for analyzing files.
+        follow_links (bool): Whether to follow symbolic links.
+        link_cache (dict): A cache of resolved symbolic links shared during traversal.
+        scheduler (IOScheduler): The scheduler throttling the resolution of symbolic links
+                                 (default: None, no throttling).
 
     Returns:
         None
@@ -55,45 +173,168 @@ def manage_item(
         item_path = item.path
         if item.is_symlink():
             if follow_links:
-                item_path = os.readlink(item)  # get a symbolic link
-                item_path = utils.normalize_path(item_path, os.path.dirname(item.path))
-                if os.path.isdir(item_path):
-                    manage_dir(item_path, visited, queue, sym_link=item.path)
+                item_path, target_stat = resolve_link(
+                    item, {} if link_cache is None else link_cache, scheduler
+                )
+                if stat.S_ISDIR(target_stat.st_mode):
+                    manage_dir(
+                        item_path,
+                        visited,
+                        queue,
+                        sym_link=item.path,
+                        dir_stat=target_stat,
+                    )
+                analyzer.add(item_path, target_stat)
             else:
-                analyzer.add_link(item_path)
-                return
-        elif item.is_dir():
-            manage_dir(item_path, visited, queue)
+                analyzer.add_link(item_path, item.stat(follow_symlinks=False))
+            return
 
-        analyzer.add(item_path)
+        # The stat result is obtained once and shared with the analyzer
+        item_stat = item.stat()
+        if item.is_dir():
+            manage_dir(item_path, visited, queue, dir_stat=item_stat)
+        analyzer.add(item_path, item_stat)
     except OSError or ValueError as e:
         print(f"Error: {e.filename}: {e.strerror}. Skipping.", file=sys.stderr)
 
 
-def traverse_directory(directory: str, analyzer: Analyzer, follow_links=False):
+def traverse_queue(
+    queue: list,
+    analyzer: Analyzer,
+    visited: set,
+    follow_links=False,
+    backend="scandir",
+    excluded=frozenset(),
+    on_listed=None,
+    scheduler=None,
+    deadline=None,
+    max_links=0,
+):
     """
-    Traverse a directory recursively and analyze its contents.
+    Traverse the directories of a queue breadth-first and analyze their contents.
+    Directories found during traversal are appended to the queue.
+    With a DirectoryQueue, the directories are traversed by priority instead.
 
     Args:
-        directory (str): an absolute path to the directory to traverse.
+        queue (list): Absolute paths to the directories to traverse, or a DirectoryQueue or a SpilledQueue.
         analyzer (Analyzer): An instance of the Analyzer class for analyzing files.
+        visited (set): A set containing (st_dev, st_ino) pairs of the directories already queued,
+                       or a SpilledSet.
+        follow_links (bool): Whether to follow symbolic links.
+        backend (str): The backend to enumerate directory entries, one of SCANDIR_BACKENDS.
+        excluded (set): Paths to directories not to traverse, e.g. because they are traversed elsewhere.
+        on_listed (function): A function called with the queue after each directory is listed.
+                              It may remove directories from the queue, e.g. to hand them out.
+        scheduler (IOScheduler): The scheduler throttling directory listings, stat calls of entries
+                                 and the resolution of symbolic links (default: None, no throttling).
+        deadline (float): The time.monotonic() time after which no more directories are listed.
+                          The directories left are kept in the queue (default: None, no limit).
+        max_links (int): The number of resolved links cached, after which the cache is cleared
+                         (default: 0, no limit).
     """
-    visited = set()
-
-    directory = utils.normalize_path(directory)
-    queue = [directory]
-    visited.add(directory)
+    scandir = get_scandir(backend)
+    if scheduler is not None:
+        scandir = scheduler.wrap_scandir(scandir)
+    link_cache = {}
 
     while queue:
+        if deadline is not None and time.monotonic() >= deadline:
+            return
         cur_dir = queue.pop(0)
+        if cur_dir in excluded:
+            continue
         try:
-            for item in os.scandir(cur_dir):
-                manage_item(item, visited, queue, analyzer, follow_links=follow_links)
+            for item in scandir(cur_dir):
+                manage_item(
+                    item,
+                    visited,
+                    queue,
+                    analyzer,
+                    follow_links=follow_links,
+                    link_cache=link_cache,
+                    scheduler=scheduler,
+                )
 
         except OSError as e:
             print(
                 f"Error: {e.filename}: {e.strerror}. Skipping directory.",
                 file=sys.stderr,
             )
+        if on_listed is not None:
+            on_listed(queue)
+        if max_links and len(link_cache) > max_links:
+            link_cache.clear()
+
+
+def traverse_directory(
+    directory: str,
+    analyzer: Analyzer,
+    follow_links=False,
+    backend="scandir",
+    scheduler=None,
+    priorities=None,
+    time_budget=None,
+    max_memory=0,
+) -> list:
+    """
+    Traverse a directory recursively and analyze its contents.
+
+    Args:
+        directory (str): an absolute path to the directory to traverse.
+        analyzer (Analyzer): An instance of the Analyzer class for analyzing files.
+        follow_links (bool): Whether to follow symbolic links.
+        backend (str): The backend to enumerate directory entries, one of SCANDIR_BACKENDS:
+                       "scandir" (os.scandir) or "getdents" (getdents64 and statx system calls on Linux,
+                       falls back to os.scandir on other platforms). Defaults to "scandir".
+        scheduler (IOScheduler): The scheduler throttling directory listings, stat calls of entries
+                                 and the resolution of symbolic links (default: None, no throttling).
+        priorities (DirectoryPriorities): The priorities to traverse directories in, e.g. the heaviest
+                                          subtrees of a previous scan first (default: None, breadth-first).
+        time_budget (float): The time in seconds after which the traversal stops (default: None, no limit).
+        max_memory (int): The memory budget in bytes of the visited directories, the queue and the link cache.
+                          Beyond it, the visited directories and the queue are spilled to temporary files
+                          (default: 0, no limit).
 
-    analyzer.print_summary()
+    Returns:
+        list: The directories left unscanned when the time budget ran out, none if the scan is complete.
+    """
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    directory = utils.normalize_path(directory)
+    if max_memory:
+        # Deferred to keep startup fast for runs without a memory budget
+        from analyzer import spill
+
+        # The budget is shared by the visited directories, the queue and the link cache
+        visited = spill.SpilledSet(max_memory // 3)
+    else:
+        visited = set()
+    if priorities is not None:
+        queue = priorities.queue([directory])
+    elif max_memory:
+        queue = spill.SpilledQueue(max_memory // 3)
+        queue.append(directory)
+    else:
+        queue = [directory]
+    try:
+        with _metadata(scheduler):
+            visited.add(dir_key(os.stat(directory)))
+    except OSError:
+        pass  # The error is reported when the directory is scanned
+
+    try:
+        traverse_queue(
+            queue,
+            analyzer,
+            visited,
+            follow_links=follow_links,
+            backend=backend,
+            scheduler=scheduler,
+            deadline=deadline,
+            max_links=max_memory // 3 // _LINK_MEMORY,
+        )
+        return list(queue)
+    finally:
+        if max_memory:
+            visited.close()
+            if priorities is None:
+                queue.close()
@@ -0,0 +1,714 @@
+import errno
+import os
+import stat
+import struct
+import sys
+import time
+
+from collections import defaultdict
+
+from analyzer.analyze import Analyzer
+from analyzer import traverse
+from analyzer import utils
+
+# Requests answered on the socket of a Watcher
+REQUESTS = ("summary", "big-files", "permissions", "distribution")
+
+# inotify event bits
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_DONT_FOLLOW = 0x2000000
+_IN_EXCL_UNLINK = 0x4000000
+_IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+    | _IN_DONT_FOLLOW
+    | _IN_EXCL_UNLINK
+)
+_UPDATED = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_CREATE | _IN_MOVED_TO
+_REMOVED = _IN_DELETE | _IN_MOVED_FROM
+
+# struct inotify_event: wd, mask, cookie, len, followed by the name padded with null bytes
+_EVENT = struct.Struct("=iIII")
+_READ_SIZE = 64 * 1024  # Size of a read of events, larger than the largest event
+# Time a client of the socket has to send its request, and to read each part of the answer, in seconds
+_CLIENT_TIMEOUT = 1.0
+
+
+class DirectoryWatches:
+    """
+    The DirectoryWatches class watches directories for changes with inotify.
+
+    It is meant to be a recorder of an analyzer: every directory is watched as soon as it is
+    analyzed, before its entries are listed, so changes made during a traversal are not missed.
+
+    Public Methods:
+        watch(path: str): Watch a directory.
+        unwatch_tree(path: str): Stop watching a directory and the directories under it.
+        read_events(): Read the pending events without blocking.
+        fileno(): Get the file descriptor of the inotify instance.
+        record(path: str, file_stat: os.stat_result, category: str): Watch an analyzed directory.
+        close(): Close the inotify instance.
+    """
+
+    def __init__(self):
+        """
+        Initialize the DirectoryWatches.
+
+        Raises:
+            OSError: If inotify is not available or the instance can't be created.
+        """
+        import ctypes  # Deferred to keep startup fast for runs without watching
+
+        self._fd = -1
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self._add_watch = libc.inotify_add_watch
+        self._rm_watch = libc.inotify_rm_watch
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = self._get_errno()
+            raise OSError(err, os.strerror(err))
+        self._paths = {}  # Watched directory by watch descriptor
+        self._wds = {}  # Watch descriptor by watched directory
+        self._limit_reported = False
+
+    def fileno(self) -> int:
+        """
+        Get the file descriptor of the inotify instance, readable when events are pending.
+        """
+        return self._fd
+
+    def watch(self, path: str):
+        """
+        Watch a directory. Errors are reported to stderr, as the directory is still analyzed.
+
+        Args:
+            path (str): The path to the directory.
+        """
+        wd = self._add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = self._get_errno()
+            if err != errno.ENOSPC:
+                print(
+                    f"Error: {path}: {os.strerror(err)}. Changes are not watched.",
+                    file=sys.stderr,
+                )
+            elif not self._limit_reported:
+                print(
+                    f"Error: the inotify watch limit (fs.inotify.max_user_watches) is reached. "
+                    f"Changes in {path} and further directories are not watched.",
+                    file=sys.stderr,
+                )
+                self._limit_reported = True
+            return
+        # A directory moved within the tree keeps its watch descriptor
+        previous = self._paths.get(wd)
+        if previous is not None and previous != path:
+            self._wds.pop(previous, None)
+        self._paths[wd] = path
+        self._wds[path] = wd
+
+    def unwatch_tree(self, path: str):
+        """
+        Stop watching a directory and the directories under it, e.g. when it is moved out of the tree.
+
+        Args:
+            path (str): The path to the directory.
+        """
+        prefix = os.path.join(path, "")
+        for watched in [p for p in self._wds if p == path or p.startswith(prefix)]:
+            wd = self._wds.pop(watched)
+            del self._paths[wd]
+            self._rm_watch(self._fd, wd)
+
+    def read_events(self) -> list:
+        """
+        Read the pending events without blocking.
+
+        Returns:
+            list: (directory, mask, name) tuples, where directory is the watched directory
+                  the event happened in, or None if it is not watched anymore or for a queue overflow,
+                  and name is the name of the entry in it, or "" for the directory itself.
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                name_start = offset + _EVENT.size
+                name = data[name_start : name_start + length].rstrip(b"\0")
+                offset = name_start + length
+                if mask & _IN_IGNORED:
+                    # The watch was removed, because the directory was deleted or unwatched
+                    path = self._paths.pop(wd, None)
+                    if path is not None and self._wds.get(path) == wd:
+                        del self._wds[path]
+                    continue
+                events.append((self._paths.get(wd), mask, os.fsdecode(name)))
+
+    def record(self, path: str, file_stat: os.stat_result, category: str):
+        """
+        Watch an analyzed entry if it is a directory.
+
+        Args:
+            path (str): The path to the entry.
+            file_stat (os.stat_result): The stat result of the entry.
+            category (str): The file type category of the entry.
+        """
+        if category == "directories":
+            self.watch(path)
+
+    def close(self):
+        """
+        Close the inotify instance, which removes all the watches.
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class IncrementalAnalyzer(Analyzer):
+    """
+    The IncrementalAnalyzer class is an Analyzer whose results are kept up to date as entries change.
+
+    The state of every analyzed entry is kept, so an entry analyzed again replaces its previous
+    contribution to the results, and a removed entry is subtracted from them.
+    Entries whose status didn't change are not analyzed again, which makes rescans cheap.
+    Large files and files with unusual permissions are collected for the result.
+
+    Public Methods:
+        add(path: str, file_stat: os.stat_result = None): Add or update a file or a directory.
+        add_link(path: str, link_stat: os.stat_result = None): Add or update a symbolic link.
+        remove_tree(path: str): Remove an entry and, for a directory, all the entries under it.
+        new_pass(): Start a rescan.
+        prune(path: str): Remove the entries under a directory not seen since the rescan started.
+        print_summary(): Print the summary of file types and their sizes to stdout.
+        result(): Get the current results of the analysis as a ScanResult.
+        close(): Close the recorders.
+    """
+
+    def __init__(self, threshold: int = 2048, **options):
+        """
+        Initialize the IncrementalAnalyzer.
+
+        Args:
+            threshold (int): The size threshold for identifying large files (default: 2048 bytes).
+            **options: Classification options and recorders passed to the Analyzer.
+
+        Raises:
+            ValueError: If the classification options are invalid.
+        """
+        super().__init__(threshold, collect=True, **options)
+        # (size, mtime_ns, mode, ino, category, pass) of every entry by path
+        self._entries = {}
+        self._children = defaultdict(set)  # Paths of the entries of each directory
+        self._counts = defaultdict(int)  # Number of entries of each category
+        self._pass = 0
+
+    def _seen(self, path: str, file_stat: os.stat_result) -> bool:
+        """
+        Mark an entry as seen in the current pass. If it changed, its previous state is removed.
+
+        Args:
+            path (str): The path to the entry.
+            file_stat (os.stat_result): The current stat result of the entry.
+
+        Returns:
+            bool: True if the entry is unchanged since it was analyzed.
+        """
+        entry = self._entries.get(path)
+        if entry is None:
+            return False
+        if entry[:4] == (
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+            file_stat.st_mode,
+            file_stat.st_ino,
+        ):
+            self._entries[path] = entry[:5] + (self._pass,)
+            return True
+        if stat.S_ISDIR(entry[2]) and not stat.S_ISDIR(file_stat.st_mode):
+            self.remove_tree(path)  # A directory replaced by a file
+        else:
+            self._remove(path)
+        return False
+
+    def add(self, path: str, file_stat: os.stat_result = None):
+        """
+        Add a file or a directory to the analyzer, or update it if it changed.
+
+        Args:
+            path (str): The path to the file/directory to analyze.
+            file_stat (os.stat_result): The stat result of the file/directory, if it is already known.
+                                        If not provided, the path is stat'ed.
+        """
+        if file_stat is None:
+            file_stat = os.stat(path)
+        if not self._seen(path, file_stat):
+            super().add(path, file_stat)
+
+    def add_link(self, path: str, link_stat: os.stat_result = None):
+        """
+        Add a symbolic link to the analyzer, or update it if it changed.
+
+        Args:
+            path (str): The path to the link.
+            link_stat (os.stat_result): The lstat result of the link, if it is already known.
+                                        If not provided, the path is lstat'ed.
+        """
+        if link_stat is None:
+            link_stat = os.lstat(path)
+        if not self._seen(path, link_stat):
+            super().add_link(path, link_stat)
+
+    def _record(self, path: str, file_stat: os.stat_result, category: str):
+        """
+        Keep the state of an analyzed entry and pass it to the recorders.
+
+        Args:
+            path (str): The path to the entry.
+            file_stat (os.stat_result): The stat result of the entry.
+            category (str): The file type category of the entry.
+        """
+        self._entries[path] = (
+            file_stat.st_size,
+            file_stat.st_mtime_ns,
+            file_stat.st_mode,
+            file_stat.st_ino,
+            category,
+            self._pass,
+        )
+        self._children[os.path.dirname(path)].add(path)
+        self._counts[category] += 1
+        super()._record(path, file_stat, category)
+
+    def _remove(self, path: str):
+        """
+        Subtract an entry from the results. The entries under it are kept.
+
+        Args:
+            path (str): The path to the entry.
+        """
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        size, mode, category = entry[0], entry[2], entry[4]
+        if not stat.S_ISDIR(mode) and not stat.S_ISLNK(mode):
+            distribution = self._distributions[category]
+            distribution.remove(size)
+            if not distribution.count():
+                del self._distributions[category]
+        self._counts[category] -= 1
+        if self._counts[category] == 0:
+            del self._counts[category]
+            self._type_size_count.pop(category, None)
+        else:
+            self._type_size_count[category] -= size
+        self._big_files.pop(path, None)
+        self._unusual_permissions.pop(path, None)
+        siblings = self._children.get(os.path.dirname(path))
+        if siblings is not None:
+            siblings.discard(path)
+            if not siblings:
+                del self._children[os.path.dirname(path)]
+
+    def remove_tree(self, path: str):
+        """
+        Subtract an entry and, for a directory, all the entries under it from the results.
+
+        Args:
+            path (str): The path to the entry.
+        """
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            stack.extend(self._children.pop(current, ()))
+            self._remove(current)
+
+    def new_pass(self):
+        """
+        Start a rescan. Entries analyzed or found unchanged from now on are marked as seen.
+        """
+        self._pass += 1
+
+    def prune(self, path: str):
+        """
+        Remove the entries under a directory which were not seen since new_pass() was called,
+        i.e. which were not found by the rescan of the directory.
+
+        Args:
+            path (str): The path to the rescanned directory.
+        """
+        stack = [path]
+        while stack:
+            for child in list(self._children.get(stack.pop(), ())):
+                if self._entries[child][5] != self._pass:
+                    self.remove_tree(child)
+                else:
+                    stack.append(child)
+
+
+class Watcher:
+    """
+    The Watcher class keeps the analysis of a directory up to date and serves it over a Unix socket.
+
+    The directory is traversed once, then the changes reported by inotify are applied to the results:
+    changed entries are analyzed again, removed ones are subtracted and new directories are scanned.
+    Changes are applied at most once per settle period, so a file written repeatedly is analyzed once.
+    If the kernel event queue overflows and events are lost, the directory is rescanned,
+    which stats every entry but analyzes only the changed ones. Symbolic links are not followed.
+
+    A client gets the current results by connecting to the socket and sending one of REQUESTS
+    followed by a newline. The answer is text, and the connection is closed after it.
+
+    Public Methods:
+        start(): Traverse the directory and start serving results.
+        poll(timeout: float = None): Apply changes and answer clients for up to timeout seconds.
+        run(): Poll until stopped.
+        stop(): Stop running.
+        result(): Get the current results as a ScanResult.
+        close(): Close the socket and stop watching.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        socket_path: str,
+        threshold: int = 100,
+        backend: str = "scandir",
+        settle: float = 1.0,
+        scheduler=None,
+        **options,
+    ):
+        """
+        Initialize the Watcher.
+
+        Args:
+            directory (str): The path to the directory to watch.
+            socket_path (str): The path to the Unix socket to serve results on.
+            threshold (int): The size threshold for identifying large files (default: 100 bytes).
+            backend (str): The backend to enumerate directory entries: "scandir" or "getdents" (default: "scandir").
+            settle (float): The minimum time between two applications of changes in seconds (default: 1.0).
+            scheduler (IOScheduler): The scheduler throttling the I/O of the scans of directories
+                                     (default: None, no throttling).
+            **options: Classification options passed to the Analyzer, e.g. policy="extension".
+
+        Raises:
+            OSError: If inotify is not available.
+            ValueError: If the classification options are invalid.
+        """
+        self._directory = utils.normalize_path(directory)
+        self._socket_path = socket_path
+        self._backend = backend
+        self._settle = settle
+        self._scheduler = scheduler
+        self._watches = DirectoryWatches()
+        try:
+            self._analyzer = IncrementalAnalyzer(
+                threshold, recorders=[self._watches], scheduler=scheduler, **options
+            )
+        except Exception:
+            self._watches.close()
+            raise
+        self._pending = set()  # Paths changed since changes were last applied
+        self._last_applied = 0.0
+        self._server = None
+        self._selector = None
+        self._stopped = False
+
+    def _bind(self):
+        """
+        Create the Unix socket. A socket left over by a stopped watcher is replaced.
+
+        Raises:
+            OSError: If the socket can't be created or another watcher is serving on it.
+        """
+        import selectors  # Deferred to keep startup fast for runs without watching
+        import socket
+
+        if os.path.exists(self._socket_path) and stat.S_ISSOCK(
+            os.stat(self._socket_path).st_mode
+        ):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self._socket_path)
+                except ConnectionRefusedError:
+                    os.remove(self._socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self._socket_path)
+        except OSError:
+            server.close()
+            raise
+        # The socket file is removed on close() only once it is ours
+        self._server = server
+        self._server.listen()
+        self._server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self._selector.register(self._watches, selectors.EVENT_READ)
+
+    def start(self):
+        """
+        Create the socket, then watch and traverse the directory.
+        Clients connecting during the traversal are answered once it is over.
+
+        Raises:
+            OSError: If the socket can't be created.
+        """
+        self._bind()
+        self._watches.watch(self._directory)
+        self._rescan(self._directory)
+        self._last_applied = time.monotonic()
+
+    def _rescan(self, path: str):
+        """
+        Traverse a directory, analyze its new and changed entries and remove the vanished ones.
+
+        Args:
+            path (str): The path to the directory.
+        """
+        self._analyzer.new_pass()
+        traverse.traverse_directory(
+            path, self._analyzer, backend=self._backend, scheduler=self._scheduler
+        )
+        self._analyzer.prune(path)
+
+    def _update(self, path: str, scan: bool = False):
+        """
+        Analyze a changed entry again, or remove it if it doesn't exist anymore.
+
+        Args:
+            path (str): The path to the entry.
+            scan (bool): Whether to scan the entry if it is a directory, e.g. a new one.
+        """
+        try:
+            file_stat = os.lstat(path)
+            if stat.S_ISLNK(file_stat.st_mode):
+                self._analyzer.add_link(path, file_stat)
+                return
+            self._analyzer.add(path, file_stat)
+        except FileNotFoundError:
+            self._analyzer.remove_tree(path)
+            return
+        except OSError as e:
+            print(f"Error: {e.filename}: {e.strerror}. Skipping.", file=sys.stderr)
+            return
+        if scan and stat.S_ISDIR(file_stat.st_mode):
+            self._rescan(path)
+
+    def _read_events(self):
+        """
+        Read the pending inotify events. Removed entries and new directories are handled right away,
+        other changes are applied by _apply_changes().
+        """
+        overflow = False
+        for directory, mask, name in self._watches.read_events():
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if directory is None:
+                continue  # An event of a directory not watched anymore
+            path = os.path.join(directory, name) if name else directory
+            if path == self._directory:
+                continue  # The watched directory itself is not an entry of the results
+            if mask & _REMOVED:
+                self._pending.discard(path)
+                if mask & _IN_ISDIR:
+                    self._watches.unwatch_tree(path)
+                self._analyzer.remove_tree(path)
+            elif mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._pending.discard(path)
+                self._update(path, scan=True)
+            elif mask & _UPDATED:
+                self._pending.add(path)
+        if overflow:
+            print(
+                f"Warning: inotify event queue overflowed. Rescanning {self._directory}.",
+                file=sys.stderr,
+            )
+            self._pending.clear()
+            self._rescan(self._directory)
+
+    def _apply_changes(self):
+        """
+        Analyze the changed entries again.
+        """
+        pending, self._pending = self._pending, set()
+        for path in pending:
+            self._update(path)
+        self._last_applied = time.monotonic()
+
+    def _answer(self):
+        """
+        Answer a client of the socket with the current results. Clients are answered one at a time,
+        so a client which doesn't send its request within _CLIENT_TIMEOUT is disconnected unanswered.
+        """
+        try:
+            connection, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        with connection:
+            deadline = time.monotonic() + _CLIENT_TIMEOUT
+            try:
+                data = b""
+                while b"\n" not in data and len(data) < 1024:
+                    # The timeout is the time left, so a client sending a byte at a time is cut off too
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    connection.settimeout(remaining)
+                    chunk = connection.recv(1024)
+                    if not chunk:
+                        break
+                    data += chunk
+            except OSError:  # Including socket.timeout
+                return
+            # Results are brought up to date before answering
+            self._read_events()
+            if self._pending:
+                self._apply_changes()
+            request = data.decode(errors="replace").strip() or "summary"
+            answer = "".join(line + "\n" for line in self._answer_lines(request))
+            try:
+                connection.settimeout(_CLIENT_TIMEOUT)
+                connection.sendall(answer.encode(errors="surrogateescape"))
+            except OSError:
+                pass  # The client is gone, or doesn't read the answer
+
+    def _answer_lines(self, request: str) -> list:
+        """
+        Get the lines of the answer to a request.
+
+        Args:
+            request (str): One of REQUESTS.
+
+        Returns:
+            list: Lines of the answer.
+        """
+        result = self._analyzer.result()
+        if request == "summary":
+            return result.summary()
+        if request == "big-files":
+            return [
+                f"{path}: {utils.file_size(size)}"
+                for path, size in sorted(result.big_files, key=lambda item: -item[1])
+            ]
+        if request == "permissions":
+            return [
+                f"{path}: {stat.filemode(mode)} ({description})"
+                for path, mode, description in sorted(result.unusual_permissions)
+            ]
+        if request == "distribution":
+            return result.distribution_summary()
+        return [
+            f"Error: unknown request {request}. Valid requests: {', '.join(REQUESTS)}."
+        ]
+
+    def poll(self, timeout: float = None):
+        """
+        Wait for changes and clients for up to timeout seconds, handle them,
+        and apply the pending changes if the settle period is over.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds, or None to wait until something happens.
+        """
+        if self._pending:
+            remaining = max(0.0, self._last_applied + self._settle - time.monotonic())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        for key, _ in self._selector.select(timeout):
+            if key.fileobj is self._server:
+                self._answer()
+            else:
+                self._read_events()
+        if self._pending and time.monotonic() - self._last_applied >= self._settle:
+            self._apply_changes()
+
+    def run(self):
+        """
+        Poll until stop() is called, which may happen before running.
+        """
+        while not self._stopped:
+            self.poll(timeout=1.0)
+
+    def stop(self):
+        """
+        Stop running. run() returns within a second.
+        """
+        self._stopped = True
+
+    def result(self):
+        """
+        Get the current results of the analysis.
+
+        Returns:
+            ScanResult: The current results.
+        """
+        return self._analyzer.result()
+
+    def close(self):
+        """
+        Close the socket and remove it, and stop watching the directory.
+        """
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self._socket_path):
+                os.remove(self._socket_path)
+        self._analyzer.close()
+
+
+def request(socket_path: str, name: str = "summary", timeout: float = 10.0) -> list:
+    """
+    Request the current results from a Watcher serving on a Unix socket.
+
+    Args:
+        socket_path (str): The path to the Unix socket.
+        name (str): The request, one of REQUESTS (default: "summary").
+        timeout (float): The maximum time to wait for the answer in seconds (default: 10.0).
+
+    Returns:
+        list: Lines of the answer.
+
+    Raises:
+        OSError: If the watcher can't be reached.
+    """
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(name.encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks).decode(errors="surrogateescape").splitlines()
@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of the extension and MIME type classification fast path.
+
+Compares Typer.from_extension and the memoized Typer._get_general_category
+with the plain mimetypes.guess_type based classification.
+
+Usage:
+    python benchmarks/bench_categories.py [--calls N]
+"""
+
+import argparse
+import mimetypes
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer.categories import Typer  # noqa: E402
+
+PATHS = [
+    "/data/photos/IMG_0001.jpg",
+    "/data/music/track.mp3",
+    "/data/docs/report.pdf",
+    "/data/src/module.py",
+    "/data/backup/home.tar.gz",
+    "/data/backup/home.tgz",
+    "/data/bin/tool.exe",
+    "/data/misc/README",
+    "/data/misc/notes.TXT",
+    "/data/misc/blob.unknownext",
+]
+
+MIME_TYPES = [
+    "image/jpeg",
+    "audio/mpeg",
+    "application/pdf",
+    "text/x-python",
+    "application/x-tar",
+    "application/gzip",
+    "application/x-executable",
+    "text/plain",
+    "inode/x-empty",
+    "application/octet-stream",
+]
+
+
+def uncached_category(file_type: str) -> str:
+    """
+    Classify a MIME type the way Typer did before memoization.
+    """
+    return Typer._get_general_category.__wrapped__(file_type)
+
+
+def guess_type_category(path: str) -> str:
+    """
+    Classify a path the way Typer did before the extension table.
+    """
+    file_type = mimetypes.guess_type(path)[0]
+    if not file_type:
+        return "unknown"
+    return uncached_category(file_type)
+
+
+def bench(name: str, func, args: list, calls: int) -> float:
+    """
+    Call a function repeatedly on the given arguments and print the throughput.
+
+    Returns:
+        float: The elapsed time in seconds.
+    """
+    rounds = calls // len(args)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for arg in args:
+            func(arg)
+    elapsed = time.perf_counter() - start
+    total = rounds * len(args)
+    print(f"{name:<40} {total / elapsed / 1e6:6.2f} M calls/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    typer = Typer()
+    typer.from_extension("warmup.txt")  # Build the extension table
+
+    old = bench("mimetypes.guess_type", guess_type_category, PATHS, args.calls)
+    new = bench("Typer.from_extension", typer.from_extension, PATHS, args.calls)
+    print(f"{'speedup':<40} {old / new:6.2f}x")
+
+    old = bench("MIME category (uncached)", uncached_category, MIME_TYPES, args.calls)
+    new = bench(
+        "MIME category (memoized)", typer._get_general_category, MIME_TYPES, args.calls
+    )
+    print(f"{'speedup':<40} {old / new:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
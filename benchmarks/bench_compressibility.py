@@ -0,0 +1,152 @@
+"""
+Benchmark the compressibility sampling against the exact savings on a synthetic tree.
+
+The tree has files of several categories and compressibilities: text, logs, zero-filled
+data and random binaries, of sizes spread over orders of magnitude. The exact savings of
+each category are computed by compressing every block of every file, then the tree is
+sampled with each budget. The estimated savings, their error and the time of each run
+are output.
+
+Usage:
+    python benchmarks/bench_compressibility.py [--files N] [--budgets SIZE [SIZE ...]]
+"""
+
+import argparse
+import collections
+import lzma
+import os
+import random
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import compressibility, utils  # noqa: E402
+from analyzer.cli import size_type  # noqa: E402
+from analyzer.analyze import Analyzer  # noqa: E402
+from analyzer.traverse import traverse_directory  # noqa: E402
+
+WORDS = [f"word{i}" for i in range(500)]
+
+
+def content(extension: str, size: int, rng: random.Random) -> bytes:
+    """
+    Generate the content of a file of a category.
+
+    Args:
+        extension (str): The extension of the file: txt, log, dat or bin.
+        size (int): The size of the file.
+        rng (random.Random): The random generator of the tree.
+
+    Returns:
+        bytes: The content.
+    """
+    if extension == "bin":
+        return rng.randbytes(size)
+    if extension == "dat":
+        # Zeros with random runs, as in sparse data files
+        data = bytearray(size)
+        for _ in range(size // 4096):
+            offset = rng.randrange(size)
+            data[offset : offset + 256] = rng.randbytes(256)
+        return bytes(data[:size])
+    if extension == "log":
+        line = "2024-01-01 00:00:00 INFO request served in {} ms\n"
+        text = "".join(line.format(rng.randrange(1000)) for _ in range(size // 40 + 1))
+    else:
+        text = " ".join(rng.choices(WORDS, k=size // 4 + 1))
+    return text.encode()[:size]
+
+
+def build_tree(root: str, files: int, rng: random.Random):
+    """
+    Build a tree of files of the four categories, of sizes from 1 KB to 4 MB.
+
+    Args:
+        root (str): The directory to build the tree in.
+        files (int): The number of files.
+        rng (random.Random): The random generator of the tree.
+    """
+    for i in range(files):
+        extension = rng.choice(["txt", "log", "dat", "bin"])
+        directory = os.path.join(root, f"dir-{i % 20}")
+        os.makedirs(directory, exist_ok=True)
+        size = int(1024 * 2 ** rng.uniform(0, 12))
+        with open(os.path.join(directory, f"file-{i}.{extension}"), "wb") as f:
+            f.write(content(extension, size, rng))
+
+
+class ExactRecorder:
+    """
+    Compress every block of every file, to get the exact savings of each category.
+    """
+
+    def __init__(self):
+        self.sizes = collections.defaultdict(lambda: [0, 0])
+
+    def record(self, path: str, file_stat: os.stat_result, category: str):
+        if not stat.S_ISREG(file_stat.st_mode):
+            return
+        with open(path, "rb") as f:
+            while block := f.read(compressibility.BLOCK_SIZE):
+                self.sizes[category][0] += len(block)
+                self.sizes[category][1] += compressibility.compressed_sizes(
+                    block, lzma.compress
+                )[0]
+
+    def close(self):
+        pass
+
+
+def scan(root: str, recorder):
+    analyzer = Analyzer(policy="extension", collect=True, recorders=[recorder])
+    traverse_directory(root, analyzer)
+    analyzer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument(
+        "--budgets",
+        nargs="+",
+        type=size_type,
+        default=[4 * 1024**2, 16 * 1024**2, 64 * 1024**2],
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_tree(root, args.files, random.Random(0))
+        exact = ExactRecorder()
+        start = time.perf_counter()
+        scan(root, exact)
+        elapsed = time.perf_counter() - start
+        total = sum(size for size, _ in exact.sizes.values())
+        saved = sum(size - compressed for size, compressed in exact.sizes.values())
+        print(
+            f"{'exact':>8}: zlib saves {utils.file_size(saved)} ({saved / total:.1%}) "
+            f"of {utils.file_size(total)}, {utils.file_size(total)} read in {elapsed:.2f} s"
+        )
+        for budget in args.budgets:
+            sampler = compressibility.CompressionSampler(budget, seed=0)
+            start = time.perf_counter()
+            scan(root, sampler)
+            estimates = sampler.estimates()
+            elapsed = time.perf_counter() - start
+            estimate = sum(
+                size * (1 - zlib_ratio)
+                for size, _, zlib_ratio, _ in estimates.values()
+                if zlib_ratio is not None
+            )
+            print(
+                f"{utils.file_size(budget):>8}: zlib saves {utils.file_size(round(estimate))} "
+                f"({estimate / total:.1%}), error {(estimate - saved) / total:+.1%} "
+                f"of the total, {utils.file_size(sampler._stats['read'])} read "
+                f"in {elapsed:.2f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
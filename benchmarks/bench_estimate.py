@@ -0,0 +1,148 @@
+"""
+Benchmark estimates against exact scans on synthetic trees.
+
+Two trees are generated: a random tree, where directories have varying numbers of
+subdirectories and files but no branch dominates, and a skewed tree, where most of the
+data sits in one deep branch next to many small directories. For each number of samples, several estimates with different seeds are
+compared with the exact scan: the mean relative error of the total size, the share of
+estimates whose margin covers the exact total, and the time against the exact scan.
+
+Usage:
+    python benchmarks/bench_estimate.py [--samples N [N ...]] [--runs N]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import estimate, scan  # noqa: E402
+
+
+def build_balanced(root: str, fan_out: int, depth: int, files: int):
+    """
+    Build a tree where every directory has the same number of subdirectories and files.
+
+    Args:
+        root (str): The directory to build the tree in.
+        fan_out (int): The number of subdirectories of each directory.
+        depth (int): The number of levels of subdirectories.
+        files (int): The number of files in each directory.
+    """
+    for i in range(files):
+        with open(os.path.join(root, f"file-{i}.txt"), "w") as f:
+            f.write("x" * (64 * (i + 1)))
+    if depth:
+        for i in range(fan_out):
+            subdir = os.path.join(root, f"dir-{i}")
+            os.mkdir(subdir)
+            build_balanced(subdir, fan_out, depth - 1, files)
+
+
+def build_random(root: str, rng: random.Random, depth: int = 5):
+    """
+    Build a tree where every directory has a random number of subdirectories and files.
+
+    Args:
+        root (str): The directory to build the tree in.
+        rng (random.Random): The random generator of the tree.
+        depth (int): The maximum number of levels of subdirectories.
+    """
+    for i in range(rng.randint(0, 20)):
+        with open(os.path.join(root, f"file-{i}.txt"), "w") as f:
+            f.write("x" * rng.randint(1, 4096))
+    if depth:
+        for i in range(rng.randint(1, 8)):
+            subdir = os.path.join(root, f"dir-{i}")
+            os.mkdir(subdir)
+            build_random(subdir, rng, depth - 1)
+
+
+def build_skewed(root: str):
+    """
+    Build a tree with one big branch of large files next to many directories of small files.
+
+    Args:
+        root (str): The directory to build the tree in.
+    """
+    big = os.path.join(root, "big")
+    os.mkdir(big)
+    build_balanced(big, fan_out=8, depth=3, files=5)
+    for i in range(200):
+        small = os.path.join(root, f"small-{i}")
+        os.mkdir(small)
+        for j in range(3):
+            with open(os.path.join(small, f"file-{j}.txt"), "w") as f:
+                f.write("x" * 16)
+
+
+def total(categories: dict) -> float:
+    """
+    Get the total size of the categories of a scan result or the estimated total of an estimate.
+
+    Args:
+        categories (dict): The sizes or the (size, margin, count, margin) of each category.
+
+    Returns:
+        float: The total size.
+    """
+    return sum(
+        value[0] if isinstance(value, tuple) else value for value in categories.values()
+    )
+
+
+def run(name: str, root: str, samples: list, runs: int):
+    """
+    Compare estimates with different numbers of samples against the exact scan of a tree.
+
+    Args:
+        name (str): The name of the tree.
+        root (str): The root of the tree.
+        samples (list): The numbers of samples to estimate with.
+        runs (int): The number of estimates with different seeds for each number of samples.
+    """
+    start = time.perf_counter()
+    exact = total(scan(root, policy="extension").categories)
+    scan_time = time.perf_counter() - start
+    print(f"{name}: exact scan {scan_time:.3f} s")
+    for count in samples:
+        errors, covered, elapsed = [], 0, 0.0
+        for seed in range(runs):
+            start = time.perf_counter()
+            result = estimate(root, samples=count, seed=seed, policy="extension")
+            elapsed += time.perf_counter() - start
+            size = total(result.categories)
+            # Margins of the categories are combined as if they were independent
+            margin = sum(value[1] ** 2 for value in result.categories.values()) ** 0.5
+            errors.append(abs(size - exact) / exact)
+            covered += abs(size - exact) <= margin
+        print(
+            f"  {count:>6} samples: error {statistics.fmean(errors):6.1%}, "
+            f"covered {covered / runs:4.0%}, {elapsed / runs:.3f} s "
+            f"({elapsed / runs / scan_time:.0%} of the scan)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--samples", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_random(root, random.Random(0))
+        run("random", root, args.samples, args.runs)
+    with tempfile.TemporaryDirectory() as root:
+        build_skewed(root)
+        run("skewed", root, args.samples, args.runs)
+
+
+if __name__ == "__main__":
+    main()
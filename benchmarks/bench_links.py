@@ -0,0 +1,93 @@
+"""
+Benchmark traversal with --follow-links on a link-heavy tree.
+
+The generated tree imitates a Nix store or a set of conda environments:
+a store of package directories and many "profile" directories whose entries
+are symbolic links into the store, several of them pointing to the same package.
+
+Usage:
+    python benchmarks/bench_links.py [--packages N] [--profiles N] [--links N]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr, redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer import traverse  # noqa: E402
+from analyzer.analyze import Analyzer  # noqa: E402
+
+
+def build_tree(root: str, packages: int, profiles: int, links: int):
+    """
+    Build a store of packages and profiles made of symbolic links into the store.
+
+    Args:
+        root (str): The directory to build the tree in.
+        packages (int): The number of package directories in the store.
+        profiles (int): The number of profile directories.
+        links (int): The number of links in each profile.
+    """
+    store = os.path.join(root, "store")
+    for i in range(packages):
+        package = os.path.join(store, f"pkg-{i}", "lib")
+        os.makedirs(package)
+        with open(os.path.join(package, "lib.txt"), "w") as f:
+            f.write("x" * 16)
+        # Every package refers back to the store, as self-referencing envs do
+        os.symlink(store, os.path.join(store, f"pkg-{i}", "store"))
+    for i in range(profiles):
+        profile = os.path.join(root, "profiles", f"profile-{i}")
+        os.makedirs(profile)
+        for j in range(links):
+            target = os.path.join(store, f"pkg-{(i + j) % packages}")
+            os.symlink(target, os.path.join(profile, f"link-{j}"))
+
+
+def run(root: str) -> float:
+    """
+    Traverse the tree following symbolic links.
+
+    Args:
+        root (str): The root of the tree.
+
+    Returns:
+        float: The elapsed time in seconds.
+    """
+    with tempfile.TemporaryDirectory() as out_dir:
+        analyzer = Analyzer(
+            threshold=2**40, unusual_perm_out=os.path.join(out_dir, "report.txt")
+        )
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            traverse.traverse_directory(root, analyzer, follow_links=True)
+        elapsed = time.perf_counter() - start
+        analyzer.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--packages", type=int, default=200)
+    parser.add_argument("--profiles", type=int, default=50)
+    parser.add_argument("--links", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_tree(root, args.packages, args.profiles, args.links)
+        total_links = args.packages + args.profiles * args.links
+        best = min(run(root) for _ in range(args.repeat))
+        print(
+            f"{total_links} links: {best:.3f} s, "
+            f"{total_links / best:.0f} links/s (best of {args.repeat})"
+        )
+
+
+if __name__ == "__main__":
+    main()
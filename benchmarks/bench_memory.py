@@ -0,0 +1,86 @@
+"""
+Benchmark the peak memory of scans with and without a memory budget.
+
+A tree of empty files is generated, then scanned to a snapshot without a budget and with
+each budget, each scan in its own process. The peak resident memory and the time of each scan
+are output, and the snapshots are checked to be the same.
+
+Usage:
+    python benchmarks/bench_memory.py [--files N] [--budgets SIZE [SIZE ...]]
+"""
+
+import argparse
+import filecmp
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_tree(root: str, files: int):
+    """
+    Build a tree of empty files, 40 per directory and 100 directories per parent.
+
+    Args:
+        root (str): The directory to build the tree in.
+        files (int): The number of files.
+    """
+    for i in range(files // 40):
+        directory = os.path.join(
+            root, f"project-{i // 100:04d}", f"module-{i % 100:03d}"
+        )
+        os.makedirs(directory)
+        for j in range(40):
+            open(os.path.join(directory, f"source-file-{j:04d}.txt"), "w").close()
+
+
+def run(tree: str, snapshot: str, budget: str = None) -> tuple:
+    """
+    Scan the tree to a snapshot in a new process.
+
+    Args:
+        tree (str): The root of the tree.
+        snapshot (str): The path to write the snapshot to.
+        budget (str): The memory budget, e.g. '64MB' (default: None, no budget).
+
+    Returns:
+        tuple: The peak resident memory of the process in MB and the time of the scan in seconds.
+    """
+    command = [sys.executable, os.path.join(ROOT, "main.py"), tree, "-c", "extension"]
+    command += ["-f", os.devnull, "--snapshot", snapshot]
+    if budget:
+        command += ["--max-memory", budget]
+    start = time.perf_counter()
+    # wait4 gives the resource usage of this process only
+    pid = subprocess.Popen(command, stdout=subprocess.DEVNULL).pid
+    _, _, usage = os.wait4(pid, 0)
+    return usage.ru_maxrss / 1024, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=400000)
+    parser.add_argument("--budgets", nargs="+", default=["32MB", "64MB"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        tree = os.path.join(root, "tree")
+        build_tree(tree, args.files)
+        reference = os.path.join(root, "reference.fsas")
+        peak, elapsed = run(tree, reference)
+        print(f"{'no budget':>10}: peak {peak:6.1f} MB, {elapsed:.2f} s")
+        for budget in args.budgets:
+            snapshot = os.path.join(root, f"{budget}.fsas")
+            peak, elapsed = run(tree, snapshot, budget)
+            same = filecmp.cmp(reference, snapshot, shallow=False)
+            print(
+                f"{budget:>10}: peak {peak:6.1f} MB, {elapsed:.2f} s, "
+                f"snapshot {'identical' if same else 'DIFFERENT'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark prioritized traversal against breadth-first traversal on a synthetic tree.
+
+The tree has many directories of small files and a few big files deep in random branches.
+A first scan writes a snapshot, then the tree is scanned breadth-first and by the priorities
+of the snapshot. For each traversal, the share of the big files found after listing
+a share of the directories is output, as a time-boxed scan stopped there would report it,
+along with the time of the complete traversal.
+
+Usage:
+    python benchmarks/bench_priority.py [--directories N] [--big-files N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analyzer.analyze import Analyzer  # noqa: E402
+from analyzer.priority import DirectoryPriorities  # noqa: E402
+from analyzer.snapshot import SnapshotWriter  # noqa: E402
+from analyzer.traverse import traverse_directory  # noqa: E402
+
+BIG_FILE_SIZE = 1024**2
+# Shares of the directories listed to report the bytes of big files found at
+CHECKPOINTS = (0.1, 0.25, 0.5)
+
+
+def build_tree(root: str, directories: int, big_files: int, rng: random.Random):
+    """
+    Build a random tree of small files with a few big sparse files deep in random branches.
+
+    Args:
+        root (str): The directory to build the tree in.
+        directories (int): The number of directories.
+        big_files (int): The number of big files.
+        rng (random.Random): The random generator of the tree.
+    """
+    paths = [root]
+    for i in range(directories):
+        path = os.path.join(rng.choice(paths), f"dir-{i}")
+        os.mkdir(path)
+        paths.append(path)
+        for j in range(rng.randint(0, 5)):
+            with open(os.path.join(path, f"file-{j}.txt"), "w") as f:
+                f.write("x" * rng.randint(1, 4096))
+    # The deepest directories hold the big files
+    paths.sort(key=lambda path: path.count(os.sep), reverse=True)
+    for i, path in enumerate(rng.sample(paths[: len(paths) // 10], big_files)):
+        with open(os.path.join(path, f"big-{i}.bin"), "wb") as f:
+            f.truncate(BIG_FILE_SIZE)
+
+
+class OrderRecorder:
+    """
+    Record the number of directories listed when each big file is found.
+    """
+
+    def __init__(self):
+        self.directories = set()
+        self.found = []
+
+    def record(self, path: str, file_stat: os.stat_result, category: str):
+        self.directories.add(os.path.dirname(path))
+        if file_stat.st_size >= BIG_FILE_SIZE:
+            self.found.append(len(self.directories))
+
+    def close(self):
+        pass
+
+
+def run(name: str, root: str, priorities=None):
+    """
+    Traverse the tree and output the share of big files found at each checkpoint.
+
+    Args:
+        name (str): The name of the traversal.
+        root (str): The root of the tree.
+        priorities (DirectoryPriorities): The priorities of the traversal (default: None, breadth-first).
+    """
+    recorder = OrderRecorder()
+    analyzer = Analyzer(
+        BIG_FILE_SIZE, collect=True, policy="extension", recorders=[recorder]
+    )
+    start = time.perf_counter()
+    traverse_directory(root, analyzer, priorities=priorities)
+    elapsed = time.perf_counter() - start
+    listed = len(recorder.directories)
+    shares = ", ".join(
+        f"{checkpoint:.0%} listed: "
+        f"{sum(n <= checkpoint * listed for n in recorder.found) / len(recorder.found):4.0%}"
+        for checkpoint in CHECKPOINTS
+    )
+    print(f"{name:>13}: big files found at {shares}; complete in {elapsed:.3f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directories", type=int, default=5000)
+    parser.add_argument("--big-files", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        build_tree(root, args.directories, args.big_files, random.Random(0))
+        snapshot_path = os.path.join(root, "previous.fsas")
+        writer = SnapshotWriter(snapshot_path)
+        analyzer = Analyzer(
+            BIG_FILE_SIZE, collect=True, policy="extension", recorders=[writer]
+        )
+        traverse_directory(root, analyzer)
+        analyzer.close()
+
+        start = time.perf_counter()
+        priorities = DirectoryPriorities(snapshot_path)
+        print(
+            f"priorities read from the snapshot in {time.perf_counter() - start:.3f} s"
+        )
+        run("breadth-first", root)
+        run("prioritized", root, priorities)
+
+
+if __name__ == "__main__":
+    main()
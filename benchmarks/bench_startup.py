@@ -0,0 +1,95 @@
+"""
+Benchmark the startup time of the script against a budget.
+
+Measures the wall time of `python main.py` on a small directory and the import time
+of the analyzer modules reported by `python -X importtime`. Exits with a non-zero status
+if the import time is over the budget or if libmagic is imported during startup.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--budget MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times() -> dict:
+    """
+    Get the cumulative import time of every top-level import of main.py.
+
+    Returns:
+        dict: Cumulative import time in microseconds by module name.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def run_time(directory: str, runs: int, options: list) -> float:
+    """
+    Get the median wall time of running the script on a directory.
+
+    Returns:
+        float: The median wall time in milliseconds.
+    """
+    samples = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        command = [sys.executable, "main.py", directory, "-f"]
+        command += [os.path.join(out_dir, "report.txt")] + options
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=ROOT, capture_output=True, check=True)
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument(
+        "--budget", type=float, default=50, help="Import time budget in ms."
+    )
+    args = parser.parse_args()
+
+    times = import_times()
+    total = times.get("main", 0) / 1000
+    print(f"{'import main':<40} {total:8.1f} ms (budget {args.budget:.0f} ms)")
+    for name in ("argparse", "analyzer", "analyzer.categories", "magic"):
+        if name in times:
+            print(f"  {name:<38} {times[name] / 1000:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(10):
+            with open(os.path.join(directory, f"file{i}.txt"), "w") as f:
+                f.write("test")
+        baseline = run_time(directory, args.runs, ["-c", "extension"])
+        print(f"{'main.py -c extension (10 files)':<40} {baseline:8.1f} ms")
+        signature = run_time(directory, args.runs, ["-c", "signature"])
+        print(f"{'main.py -c signature (10 files)':<40} {signature:8.1f} ms")
+
+    if "magic" in times:
+        sys.exit("libmagic is imported at startup")
+    if total > args.budget:
+        sys.exit(f"import time {total:.1f} ms is over the {args.budget:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,95 @@
 import os
+import stat
 import sys
 from analyzer import cli
 from analyzer import traverse
+from analyzer import utils
 from analyzer.analyze import Analyzer
 
+# Estimated memory of a libmagic handle and its database, in bytes
+_MAGIC_MEMORY = 16 * 1024**2
+# Estimated memory of the sqlite3 module, its page cache and the sorter building the indexes, in bytes
+_SQLITE_MEMORY = 6 * 1024**2
+
+
+def get_scheduler(args):
+    """
+    Create the scheduler throttling the I/O of a scan to the budgets given on the command line.
+
+    Args:
+        args: Command-line arguments parsed by the cli module.
+
+    Returns:
+        IOScheduler: The scheduler, or None if no budget is given.
+    """
+    if not (args.max_metadata_rate or args.max_read_rate):
+        return None
+    # Deferred to keep startup fast for runs without throttling
+    from analyzer import throttle
+
+    return throttle.IOScheduler(
+        metadata_rate=args.max_metadata_rate or 0,
+        content_rate=args.max_read_rate or 0,
+        target_latency=(args.target_latency or 0) / 1000,
+    )
+
+
+def get_memory_budget(args) -> int:
+    """
+    Get the memory available to the data of a scan under the memory budget given on the command line:
+    2/3 of the budget left after the memory used so far, the memory libmagic takes if files are read
+    and the memory SQLite takes for an index, the rest being left for the sorts, merges and buffers of the spills.
+
+    Args:
+        args: Command-line arguments parsed by the cli module.
+
+    Returns:
+        int: The memory available in bytes, or 0 if no budget is given.
+
+    Raises:
+        ValueError: If the budget is below the memory the analyzer takes by itself.
+    """
+    if not args.max_memory:
+        return 0
+    import resource  # Deferred to keep startup fast for runs without a memory budget
+
+    # The peak resident set size is in kilobytes on Linux, in bytes on macOS
+    used = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    used *= 1 if sys.platform == "darwin" else 1024
+    if args.classify != "extension":
+        used += _MAGIC_MEMORY
+    if args.index:
+        used += _SQLITE_MEMORY
+    if args.max_memory <= used:
+        raise ValueError(
+            f"the memory budget of {utils.file_size(args.max_memory)} is below the "
+            f"{utils.file_size(used)} the analyzer takes by itself"
+        )
+    return (args.max_memory - used) * 2 // 3
+
+
+def print_coverage(directory: str, pending: list, time_budget: float, priorities=None):
+    """
+    Output the coverage of a scan stopped by its time budget.
+
+    Args:
+        directory (str): The scanned directory.
+        pending (list): The directories left unscanned.
+        time_budget (float): The time budget in seconds.
+        priorities (DirectoryPriorities): The priorities of the scan, from the previous snapshots (default: None).
+    """
+    print(
+        f"Time budget of {time_budget:g} s exhausted: "
+        f"{len(pending)} directories left unscanned."
+    )
+    if priorities is not None:
+        covered, total = priorities.coverage(directory, pending)
+        if total:
+            print(
+                f"Coverage: {utils.file_size(covered)} of the {utils.file_size(total)} "
+                f"of the previous scan ({covered / total:.1%})."
+            )
+
 
 def main(args):
     """
@@ -19,6 +105,19 @@ def main(args):
     path, threshold = args.path, args.threshold
     big_files_out, unusual_perm_out = args.report_big_files, args.report_file
     follow_links = args.follow_links
+    policy, sample_rate = args.classify, args.sample_rate
+    empty_files, max_sniff_size = args.empty_files, args.sniff_max_size
+    sniff_offline = args.sniff_offline
+    index_path, snapshot_path = args.index, args.snapshot
+    scheduler = get_scheduler(args)
+    try:
+        max_memory = get_memory_budget(args)
+    except ValueError as e:
+        print(f"Error: {e}.\nAborting.", file=sys.stderr)
+        return
+    # The budget is shared by the traversal, the index and the snapshot
+    if max_memory:
+        max_memory //= 1 + bool(index_path) + bool(snapshot_path)
 
     # Normalizing arguments
     threshold = 100 if not threshold else threshold
@@ -26,14 +125,105 @@ def main(args):
     if not unusual_perm_out:
         unusual_perm_out = f"{directory}_report.txt"
 
+    # Reading the previous snapshots before the new snapshot may overwrite them
+    priorities = None
+    if args.prioritize:
+        # Deferred to keep startup fast for runs without prioritization
+        from analyzer import priority
+
+        try:
+            priorities = priority.DirectoryPriorities(*args.prioritize)
+        except (OSError, ValueError) as e:
+            print(f"Error: could not read snapshot: {e}.\nAborting.", file=sys.stderr)
+            return
+
+    # Opening the index and the snapshot of scan results
+    recorders = []
+    if index_path:
+        # Deferred to keep startup fast for runs without an index
+        from analyzer import index
+
+        try:
+            recorders.append(index.ScanIndex(index_path, max_memory=max_memory))
+        except Exception as e:
+            print(
+                f"Error: could not create index {index_path}: {e}.\nAborting.",
+                file=sys.stderr,
+            )
+            return
+    if snapshot_path:
+        # Deferred to keep startup fast for runs without a snapshot
+        from analyzer import snapshot
+
+        try:
+            recorders.append(
+                snapshot.SnapshotWriter(snapshot_path, max_memory=max_memory)
+            )
+        except OSError as e:
+            print(
+                f"Error: could not create snapshot {snapshot_path}: {e.strerror}.\nAborting.",
+                file=sys.stderr,
+            )
+            for recorder in recorders:
+                recorder.close()
+            return
+    sampler = None
+    if args.compressibility:
+        # Deferred to keep startup fast for runs without compressibility sampling
+        from analyzer import compressibility
+
+        try:
+            sampler = compressibility.CompressionSampler(
+                args.compressibility,
+                workers=args.compress_workers,
+                scheduler=scheduler,
+                max_sniff_size=max_sniff_size,
+                sniff_offline=sniff_offline,
+            )
+        except ValueError as e:
+            print(f"Error: {e}\nAborting.", file=sys.stderr)
+            for recorder in recorders:
+                recorder.close()
+            return
+        recorders.append(sampler)
+
     # Initializing analyzer
     try:
         analyzer = Analyzer(
-            threshold, unusual_perm_out=unusual_perm_out, big_files_out=big_files_out
+            threshold,
+            unusual_perm_out=unusual_perm_out,
+            big_files_out=big_files_out,
+            policy=policy,
+            sample_rate=sample_rate,
+            empty_files=empty_files,
+            max_sniff_size=max_sniff_size,
+            sniff_offline=sniff_offline,
+            recorders=recorders,
+            scheduler=scheduler,
         )
         # Recursively traverse directory
         try:
-            traverse.traverse_directory(directory, analyzer, follow_links=follow_links)
+            pending = traverse.traverse_directory(
+                directory,
+                analyzer,
+                follow_links=follow_links,
+                scheduler=scheduler,
+                priorities=priorities,
+                time_budget=args.time_budget,
+                max_memory=max_memory,
+            )
+            analyzer.print_summary()
+            if args.distribution:
+                for line in analyzer.result().distribution_summary():
+                    print(line)
+            if sampler is not None:
+                for line in sampler.summary():
+                    print(line)
+            if scheduler is not None:
+                for line in scheduler.summary():
+                    print(line)
+            if pending:
+                print_coverage(directory, pending, args.time_budget, priorities)
         except Exception as e:
             print(f"Unexpected error occurred: {e}.\nAborting.", file=sys.stderr)
         finally:
@@ -53,6 +243,304 @@ def main(args):
         )
 
 
+def estimate_directory(args):
+    """
+    Estimate the size and the number of entries of each category of a directory from random paths.
+
+    Args:
+        args: Command-line arguments parsed by the cli module.
+
+    Returns:
+        None
+    """
+    from analyzer import estimator  # Deferred to keep startup fast for full scans
+
+    directory = os.path.realpath(os.path.expanduser(args.path))
+    scheduler = get_scheduler(args)
+    try:
+        result = estimator.estimate(
+            directory,
+            samples=args.estimate,
+            follow_links=args.follow_links,
+            scheduler=scheduler,
+            policy=args.classify,
+            sample_rate=args.sample_rate,
+            empty_files=args.empty_files,
+            max_sniff_size=args.sniff_max_size,
+            sniff_offline=args.sniff_offline,
+        )
+    except OSError as e:
+        print(f"Error: {e.filename}: {e.strerror}.\nAborting.", file=sys.stderr)
+        return
+    print(f"Estimated summary for {directory}:")
+    for line in result.summary():
+        print(line)
+    if scheduler is not None:
+        for line in scheduler.summary():
+            print(line)
+
+
+def coordinate(args):
+    """
+    Scan a directory with workers: local worker processes and workers connecting to the coordinator address.
+
+    Args:
+        args: Command-line arguments parsed by the cli module.
+
+    Returns:
+        None
+    """
+    import tempfile
+
+    # Deferred to keep startup fast for runs on a single host
+    from analyzer import distributed
+
+    threshold = 100 if not args.threshold else args.threshold
+    directory = os.path.realpath(os.path.expanduser(args.path))
+    unusual_perm_out = args.report_file or f"{directory}_report.txt"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Local workers alone are coordinated over a private Unix socket
+        address = args.coordinator or os.path.join(tmp_dir, "coordinator.sock")
+        try:
+            coordinator = distributed.Coordinator(
+                directory,
+                address,
+                threshold=threshold,
+                worker_timeout=args.worker_timeout,
+                unusual_perm_out=unusual_perm_out,
+                big_files_out=args.report_big_files,
+                policy=args.classify,
+                sample_rate=args.sample_rate,
+                empty_files=args.empty_files,
+                max_sniff_size=args.sniff_max_size,
+                sniff_offline=args.sniff_offline,
+            )
+        except (OSError, ValueError) as e:
+            print(
+                f"Error: could not open logfile {e.filename}: {e.strerror}.\nAborting.",
+                file=sys.stderr,
+            )
+            return
+        try:
+            coordinator.start()
+            if not args.workers:
+                print(f"Waiting for workers on {coordinator.address}.", file=sys.stderr)
+            processes = distributed.start_workers(coordinator.address, args.workers)
+            coordinator.run(processes)
+            coordinator.print_summary()
+            if args.distribution:
+                for line in coordinator.result().distribution_summary():
+                    print(line)
+        except Exception as e:
+            print(f"Unexpected error occurred: {e}.\nAborting.", file=sys.stderr)
+        finally:
+            coordinator.close()
+
+
+def work(args):
+    """
+    Scan the work handed out by a coordinator until the scan is complete.
+
+    Args:
+        args: Command-line arguments of the worker command parsed by the cli module.
+
+    Returns:
+        None
+    """
+    from analyzer import distributed  # Deferred to keep startup fast for other commands
+
+    try:
+        distributed.run_worker(args.address)
+    except OSError as e:
+        print(
+            f"Error: could not reach the coordinator at {args.address}: {e}.",
+            file=sys.stderr,
+        )
+
+
+def watch_directory(args):
+    """
+    Analyze a directory, then keep the results up to date as it changes and serve them on a Unix socket
+    until interrupted.
+
+    Args:
+        args: Command-line arguments parsed by the cli module, with the socket path in 'watch'.
+
+    Returns:
+        None
+    """
+    # Deferred to keep startup fast for runs without watching
+    from analyzer import watch
+
+    threshold = 100 if not args.threshold else args.threshold
+    directory = os.path.realpath(os.path.expanduser(args.path))
+    try:
+        watcher = watch.Watcher(
+            directory,
+            args.watch,
+            threshold=threshold,
+            scheduler=get_scheduler(args),
+            policy=args.classify,
+            sample_rate=args.sample_rate,
+            empty_files=args.empty_files,
+            max_sniff_size=args.sniff_max_size,
+            sniff_offline=args.sniff_offline,
+        )
+    except Exception as e:
+        print(f"Error: could not watch {directory}: {e}.\nAborting.", file=sys.stderr)
+        return
+    import signal  # Deferred to keep startup fast for runs without watching
+
+    # Stopping with SIGTERM removes the socket like an interrupt
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.start()
+        result = watcher.result()
+        for line in result.summary():
+            print(line)
+        if args.distribution:
+            for line in result.distribution_summary():
+                print(line)
+        print(f"Watching {directory}. Results are served on {args.watch}.", flush=True)
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(
+            f"Error: {e.filename or args.watch}: {e.strerror}.\nAborting.",
+            file=sys.stderr,
+        )
+    finally:
+        watcher.close()
+
+
+def status(args):
+    """
+    Print the current results of a directory watched with --watch.
+
+    Args:
+        args: Command-line arguments of the status command parsed by the cli module.
+
+    Returns:
+        None
+    """
+    from analyzer import watch  # Deferred to keep startup fast for other commands
+
+    try:
+        lines = watch.request(args.socket, args.request)
+    except OSError as e:
+        print(
+            f"Error: could not reach the watch at {args.socket}: {e}.", file=sys.stderr
+        )
+        return
+    for line in lines:
+        print(line)
+
+
+def query(args):
+    """
+    Query an index of scan results and print the matching entries.
+
+    Args:
+        args: Command-line arguments of the query command parsed by the cli module.
+
+    Returns:
+        None
+    """
+    from analyzer import index  # Deferred to keep startup fast for other commands
+
+    try:
+        entries = index.query(
+            args.index,
+            category=args.category,
+            min_size=args.min_size,
+            max_size=args.max_size,
+            uid=args.owner,
+            gid=args.group,
+            flags=args.perm,
+            parent=args.parent,
+            limit=args.limit,
+        )
+    except OSError as e:
+        print(f"Error: {e.filename}: {e.strerror}.", file=sys.stderr)
+        return
+    except Exception as e:
+        print(f"Error: could not query index {args.index}: {e}.", file=sys.stderr)
+        return
+    for path, category, size, uid, gid, mode in entries:
+        print(
+            f"{path}: {utils.file_size(size)} "
+            f"({category}, {stat.filemode(mode)}, uid {uid}, gid {gid})"
+        )
+
+
+def diff(args):
+    """
+    Compare two snapshots of scan results and print the changed entries and the change of each category.
+
+    Args:
+        args: Command-line arguments of the diff command parsed by the cli module.
+
+    Returns:
+        None
+    """
+    from analyzer import snapshot  # Deferred to keep startup fast for other commands
+
+    snapshot_diff = snapshot.SnapshotDiff(args.old, args.new)
+    try:
+        for kind, old, new in snapshot_diff.changes():
+            path = os.fsdecode((new or old).path)
+            if kind == "added":
+                unusual = utils.unusual_permissions(new.mode)
+                details = f"{new.category}, {unusual}" if unusual else new.category
+                print(f"+ {path}: {utils.file_size(new.size)} ({details})")
+            elif kind == "removed":
+                print(f"- {path}: {utils.file_size(old.size)} ({old.category})")
+            elif kind == "resized":
+                print(
+                    f"~ {path}: {utils.file_size(old.size)} -> {utils.file_size(new.size)}"
+                )
+            elif kind == "recategorized":
+                print(f"* {path}: {old.category} -> {new.category}")
+            else:
+                line = (
+                    f"! {path}: {stat.filemode(old.mode)} -> {stat.filemode(new.mode)}"
+                )
+                if (old.uid, old.gid) != (new.uid, new.gid):
+                    line += f", owner {old.uid}:{old.gid} -> {new.uid}:{new.gid}"
+                unusual = utils.unusual_permissions(new.mode)
+                if unusual and unusual != utils.unusual_permissions(old.mode):
+                    line += f" ({unusual})"
+                print(line)
+    except OSError as e:
+        print(f"Error: {e.filename}: {e.strerror}.", file=sys.stderr)
+        return
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return
+
+    print("Changes by category:")
+    for category, (count, size) in sorted(snapshot_diff.category_deltas.items()):
+        if count or size:
+            sign = "-" if size < 0 else "+"
+            print(f"{category}: {count:+d} entries, {sign}{utils.file_size(abs(size))}")
+
+
 if __name__ == "__main__":
     args = cli.get_args()
-    main(args)
+    if args.command == "query":
+        query(args)
+    elif args.command == "diff":
+        diff(args)
+    elif args.command == "status":
+        status(args)
+    elif args.command == "worker":
+        work(args)
+    elif args.watch:
+        watch_directory(args)
+    elif args.estimate:
+        estimate_directory(args)
+    elif args.workers or args.coordinator:
+        coordinate(args)
+    else:
+        main(args)
@@ -110,6 +110,7 @@ def test_print_summary(capsys, empty_analyzer):
     captured = capsys.readouterr()
     assert "text: 1.0 KB.\n" in captured.out
     assert "application: 2.0 KB.\n" in captured.out
+    assert "classification policy: signature (0 of 0 files read).\n" in captured.out
 
 
 def test_close(flags_analyzer, tmp_path):
@@ -119,3 +120,25 @@ def test_close(flags_analyzer, tmp_path):
     # Check if the output files are closed
     assert flags_analyzer._up_out.closed
     assert flags_analyzer._bf_out.closed
+
+
+def test_merge(flags_analyzer, tmp_path):
+    # Results of analyses done elsewhere are added to the totals and the reports
+    big_file = tmp_path / "big.txt"
+    big_file.write_text("A" * 100)
+    other = Analyzer(threshold=10, policy="extension", collect=True)
+    other.add(str(big_file))
+    os.chmod(big_file, 0o666)
+    other.add(str(big_file))
+    flags_analyzer.merge(other.result())
+    flags_analyzer.merge(other.result())
+    flags_analyzer.close()
+
+    result = flags_analyzer.result()
+    assert result.categories == {"text": 400}
+    assert result.classification_stats["files"] == 4
+    assert result.distributions["text"].buckets() == [(64, 128, 4, 400)]
+    with open(tmp_path / "big_files_report.txt") as f:
+        assert f.read() == f"{big_file}: 100.0 B\n" * 2
+    with open(tmp_path / "report.txt") as f:
+        assert f.read() == f"{big_file}: -rw-rw-rw- (world writable)\n" * 2
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import pytest
+
+from analyzer import scan, ScanResult
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a temporary directory with a small and a big file
+    (tmp_path / "dir1").mkdir()
+    (tmp_path / "dir1" / "small.txt").write_text("test")
+    (tmp_path / "big.txt").write_text("A" * 200)
+    os.chmod(tmp_path / "big.txt", 0o666)
+    yield tmp_path
+
+
+def test_scan(tmp_dir, capsys):
+    result = scan(str(tmp_dir), threshold=100)
+    assert isinstance(result, ScanResult)
+    assert result.categories["text"] == 204
+    assert "directories" in result.categories
+    assert result.big_files == [(str(tmp_dir / "big.txt"), 200)]
+    assert result.unusual_permissions == [
+        (str(tmp_dir / "big.txt"), 0o100666, "world writable")
+    ]
+    assert result.classification == [
+        "classification policy: signature (2 of 2 files read)."
+    ]
+    assert "text: 204.0 B." in result.summary()
+
+    # Nothing is printed or written in library mode
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert not os.path.exists(f"{tmp_dir}_report.txt")
+
+
+def test_scan_invalid_options(tmp_dir):
+    with pytest.raises(ValueError):
+        scan(str(tmp_dir), policy="content")
+
+
+def test_lazy_magic(tmp_dir):
+    # libmagic is not loaded on import nor for runs without content classification
+    code = (
+        "import sys, analyzer, analyzer.cli\n"
+        "assert 'magic' not in sys.modules\n"
+        f"analyzer.scan({str(tmp_dir)!r}, policy='extension')\n"
+        "assert 'magic' not in sys.modules\n"
+        f"analyzer.scan({str(tmp_dir)!r}, policy='signature')\n"
+        "assert 'magic' in sys.modules\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
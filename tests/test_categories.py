@@ -1,5 +1,7 @@
+import os
 import pytest
-from analyzer.categories import Typer
+from concurrent.futures import ThreadPoolExecutor
+from analyzer.categories import Classifier, MagicPool, Typer
 
 
 @pytest.fixture
@@ -28,6 +30,25 @@ def tmp_empty_file(tmp_path):
     tmp_file.unlink()
 
 
+def test_magic_pool_reuse():
+    pool = MagicPool(max_size=2)
+    assert pool.size() == 0  # Handles are created lazily
+    with pool.handle() as first:
+        pass
+    with pool.handle() as second:
+        assert second is first  # Idle handle is reused
+    assert pool.size() == 1
+
+
+def test_magic_pool_threads(tmp_file):
+    pool = MagicPool(max_size=2)
+    typer = Typer(pool)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        categories = list(executor.map(typer.from_signature, [str(tmp_file)] * 64))
+    assert categories == ["text"] * 64
+    assert 1 <= pool.size() <= 2
+
+
 def test_from_extension(typer_instance):
     # Test with text
     assert typer_instance.from_extension("file.txt") == "text"
@@ -54,3 +75,127 @@ def test_from_signature_empty(typer_instance, tmp_empty_file):
 
 def test_from_signature(typer_instance, tmp_file):
     assert typer_instance.from_signature(str(tmp_file)) == "text"
+
+
+def test_from_extension_compound(typer_instance):
+    # Test with uppercase extension
+    assert typer_instance.from_extension("FILE.TXT") == "text"
+
+    # Test with an encoding suffix and a suffix alias
+    assert typer_instance.from_extension("file.tar.gz") == "archive"
+    assert typer_instance.from_extension("file.tgz") == "archive"
+
+    # Test with an encoding suffix only
+    assert typer_instance.from_extension("file.gz") == "unknown"
+
+    # Test with no extension
+    assert typer_instance.from_extension("dir.d/file") == "unknown"
+
+
+def test_extension_category(typer_instance):
+    assert typer_instance.extension_category("FILE.TXT") == (".txt", "text")
+    assert typer_instance.extension_category("file.tgz") == (".tar", "archive")
+    assert typer_instance.extension_category("dir.d/file") == ("", "unknown")
+
+
+def test_get_general_category_memoized(typer_instance):
+    typer_instance._get_general_category("application/pdf")
+    hits = Typer._get_general_category.cache_info().hits
+    assert typer_instance._get_general_category("application/pdf") == "pdf"
+    assert Typer._get_general_category.cache_info().hits == hits + 1
+
+
+def test_classifier_invalid():
+    with pytest.raises(ValueError):
+        Classifier("content")
+    with pytest.raises(ValueError):
+        Classifier("sample", sample_rate=0)
+
+
+def test_classifier_signature(tmp_path):
+    classifier = Classifier("signature")
+    file = tmp_path / "text.mp3"
+    file.write_text("test")
+    assert classifier.classify(str(file)) == "text"
+    assert classifier.summary() == [
+        "classification policy: signature (1 of 1 files read)."
+    ]
+
+
+def test_classifier_extension(tmp_path):
+    classifier = Classifier("extension")
+    file = tmp_path / "text.mp3"
+    file.write_text("test")
+    assert classifier.classify(str(file)) == "audio"
+    assert classifier.summary() == [
+        "classification policy: extension (0 of 1 files read)."
+    ]
+
+
+def test_classifier_extension_first(tmp_path):
+    classifier = Classifier("extension-first")
+    for name in ("text.mp3", "text.bin", "text"):
+        (tmp_path / name).write_text("test")
+
+    # Known extension is trusted
+    assert classifier.classify(str(tmp_path / "text.mp3")) == "audio"
+
+    # Ambiguous and unknown extensions are checked by signature
+    assert classifier.classify(str(tmp_path / "text.bin")) == "text"
+    assert classifier.classify(str(tmp_path / "text")) == "text"
+    assert classifier.summary() == [
+        "classification policy: extension-first (2 of 3 files read)."
+    ]
+
+
+def test_classifier_sample(tmp_path):
+    classifier = Classifier("sample", sample_rate=0.5)
+    for i in range(4):
+        (tmp_path / f"{i}.mp3").write_text("test")
+    categories = [classifier.classify(str(tmp_path / f"{i}.mp3")) for i in range(4)]
+
+    # Every other file is verified and found to be mislabeled
+    assert categories == ["text", "audio", "text", "audio"]
+    assert classifier.summary() == [
+        "classification policy: sample (2 of 4 files read).",
+        ".mp3: 2 of 2 sampled files mislabeled (100.0%).",
+    ]
+
+
+def make_stat(size, blocks):
+    return os.stat_result(
+        (0o100644, 1, 1, 1, 0, 0, size, 0, 0, 0), {"st_blocks": blocks}
+    )
+
+
+def test_classifier_size_policies(tmp_path):
+    file = tmp_path / "text.mp3"
+    file.write_text("test")
+    path = str(file)
+
+    # Files within the limits are read
+    classifier = Classifier("signature", max_sniff_size=1024)
+    assert classifier.classify(path, make_stat(4, 8)) == "text"
+
+    # Empty, offline and too big files are classified by extension
+    assert classifier.classify(path, make_stat(0, 0)) == "audio"
+    assert classifier.classify(path, make_stat(10**6, 0)) == "audio"
+    assert classifier.classify(path, make_stat(2048, 8)) == "audio"
+    assert classifier.summary() == [
+        "classification policy: signature (1 of 4 files read, 3 skipped by size)."
+    ]
+
+    # Small files with no blocks may be stored inline and are read
+    assert classifier.classify(path, make_stat(4, 0)) == "text"
+
+    # Offline files are read if requested
+    classifier = Classifier("signature", sniff_offline=True)
+    assert classifier.classify(path, make_stat(10**6, 0)) == "text"
+
+
+def test_classifier_empty_files(tmp_path):
+    with pytest.raises(ValueError):
+        Classifier(empty_files="skip")
+    classifier = Classifier("extension", empty_files="empty")
+    assert classifier.classify("file.txt", make_stat(0, 0)) == "empty"
+    assert classifier.classify("file.txt", make_stat(1, 8)) == "text"
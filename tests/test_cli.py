@@ -64,6 +64,18 @@ def test_size_type():
         cli.size_type("-10KB")
 
 
+def test_rate_type():
+    assert cli.rate_type("0.25") == 0.25
+    assert cli.rate_type("5%") == 0.05
+    assert cli.rate_type("1") == 1
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.rate_type("invalid")
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.rate_type("0")
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.rate_type("150%")
+
+
 def test_get_args(monkeypatch, tmp_directory):
     # Test with valid directory
     monkeypatch.setattr(
@@ -85,12 +97,196 @@ def test_get_args(monkeypatch, tmp_directory):
     assert args.report_big_files == "report.txt"
     assert args.report_file == "output.txt"
     assert args.follow_links == False
+    assert args.classify == "signature"
+    assert args.sample_rate == 0.1
+    assert args.empty_files == "extension"
+    assert args.sniff_max_size == 0
+    assert args.sniff_offline == False
+    assert args.index is None
+    assert args.snapshot is None
+    assert args.watch is None
+    assert args.workers == 0
+    assert args.worker_timeout == 60.0
+    assert args.distribution is False
+    assert args.prioritize is None
+    assert args.time_budget is None
+    assert args.max_memory is None
+    assert args.compressibility is None
+    assert args.compress_workers == 4
+    assert args.coordinator is None
+    assert args.estimate is None
+    assert args.max_metadata_rate is None
+    assert args.max_read_rate is None
+    assert args.target_latency is None
+    assert args.command == "scan"
 
     # Test with follow_links flag
     monkeypatch.setattr("sys.argv", ["script.py", str(tmp_directory), "-l"])
     args = cli.get_args()
     assert args.follow_links == True
 
+    # Test with classification policy
+    monkeypatch.setattr(
+        "sys.argv",
+        ["script.py", str(tmp_directory), "-c", "sample", "--sample-rate", "5%"],
+    )
+    args = cli.get_args()
+    assert args.classify == "sample"
+    assert args.sample_rate == 0.05
+
+    # Test with size policies
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script.py",
+            str(tmp_directory),
+            "--empty-files",
+            "empty",
+            "--sniff-max-size",
+            "1GB",
+            "--sniff-offline",
+        ],
+    )
+    args = cli.get_args()
+    assert args.empty_files == "empty"
+    assert args.sniff_max_size == 1024**3
+    assert args.sniff_offline == True
+
+
+def test_get_query_args(monkeypatch):
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script.py",
+            "query",
+            "index.db",
+            "--min-size",
+            "1GB",
+            "--owner",
+            "1003",
+            "--perm",
+            "world-writable",
+            "--perm",
+            "setuid",
+        ],
+    )
+    args = cli.get_args()
+    assert args.command == "query"
+    assert args.index == "index.db"
+    assert args.min_size == 1024**3
+    assert args.owner == 1003
+    assert args.perm == ["world-writable", "setuid"]
+    assert args.category is None
+
+    # Test with owner and group names
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", "query", "index.db", "--owner", "root"]
+    )
+    assert cli.get_args().owner == 0
+    with pytest.raises(argparse.ArgumentTypeError):
+        cli.id_type("group")("no_such_group_name")
+
+
+def test_get_diff_args(monkeypatch):
+    monkeypatch.setattr("sys.argv", ["script.py", "diff", "old.snap", "new.snap"])
+    args = cli.get_args()
+    assert args.command == "diff"
+    assert (args.old, args.new) == ("old.snap", "new.snap")
+
+
+def test_get_status_args(monkeypatch, tmp_directory):
+    monkeypatch.setattr("sys.argv", ["script.py", "status", "watch.sock"])
+    args = cli.get_args()
+    assert args.command == "status"
+    assert (args.socket, args.request) == ("watch.sock", "summary")
+
+    # Watching can't be combined with outputs of a single scan
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--watch", "s", "--index", "i"]
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+
+
+def test_get_worker_args(monkeypatch, tmp_directory):
+    monkeypatch.setattr("sys.argv", ["script.py", "worker", "host:7000"])
+    args = cli.get_args()
+    assert (args.command, args.address) == ("worker", "host:7000")
+
+    monkeypatch.setattr(
+        "sys.argv",
+        ["script.py", str(tmp_directory), "--workers", "4", "--coordinator", ":7000"],
+    )
+    args = cli.get_args()
+    assert (args.workers, args.coordinator) == (4, ":7000")
+
+    # Distributed scans don't write indexes
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--workers", "4", "--index", "i"]
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+
+    # Units of work don't share their visited directories to follow links
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--workers", "4", "-l"]
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+
+
+def test_get_estimate_args(monkeypatch, tmp_directory):
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--estimate", "200"]
+    )
+    assert cli.get_args().estimate == 200
+
+    # The spread of one path is unknown
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--estimate", "1"]
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+
+    # Estimates don't record entries
+    monkeypatch.setattr(
+        "sys.argv",
+        ["script.py", str(tmp_directory), "--estimate", "200", "--snapshot", "s"],
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+
+
+def test_get_throttle_args(monkeypatch, tmp_directory):
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "script.py",
+            str(tmp_directory),
+            "--max-metadata-rate",
+            "2000",
+            "--max-read-rate",
+            "20MB",
+            "--target-latency",
+            "20",
+        ],
+    )
+    args = cli.get_args()
+    assert (args.max_metadata_rate, args.max_read_rate) == (2000, 20 * 1024**2)
+    assert args.target_latency == 20
+
+    # The target latency adapts budgets, which must be given
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--target-latency", "20"]
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+    monkeypatch.setattr(
+        "sys.argv", ["script.py", str(tmp_directory), "--max-metadata-rate", "0"]
+    )
+    with pytest.raises(SystemExit):
+        cli.get_args()
+
 
 def test_valid_dir(tmp_directory, tmp_file):
     assert cli.valid_dir(str(tmp_directory))
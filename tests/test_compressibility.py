@@ -0,0 +1,156 @@
+import os
+import stat
+import pytest
+
+from types import SimpleNamespace
+
+from analyzer import compressibility
+from analyzer.analyze import Analyzer
+from analyzer.traverse import traverse_directory
+
+BLOCK = 4096
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create files of zeros, random bytes and text of several blocks each
+    (tmp_path / "zeros").mkdir()
+    (tmp_path / "random").mkdir()
+    (tmp_path / "text").mkdir()
+    for i in range(5):
+        (tmp_path / "zeros" / f"file{i}.dat").write_bytes(bytes(8 * BLOCK))
+        (tmp_path / "random" / f"file{i}.bin").write_bytes(os.urandom(8 * BLOCK))
+        (tmp_path / "text" / f"file{i}.txt").write_text(
+            ("the quick brown fox jumps over the lazy dog\n" * 800)[: 8 * BLOCK]
+        )
+    (tmp_path / "empty.txt").touch()
+    yield tmp_path
+
+
+def scan(path, sampler):
+    analyzer = Analyzer(policy="extension", collect=True, recorders=[sampler])
+    traverse_directory(str(path), analyzer)
+    analyzer.close()
+
+
+def test_byte_entropy():
+    assert compressibility.byte_entropy(b"") == 0
+    assert compressibility.byte_entropy(bytes(100000)) == 0
+    assert compressibility.byte_entropy(b"ab" * 100) == pytest.approx(1)
+    assert compressibility.byte_entropy(os.urandom(100000)) > 7.9
+
+
+def test_compressed_sizes():
+    assert compressibility.compressed_sizes(os.urandom(BLOCK)) == (BLOCK, BLOCK, False)
+    zlib_size, lzma_size, compressed = compressibility.compressed_sizes(bytes(BLOCK))
+    assert compressed
+    assert zlib_size < BLOCK // 10
+    assert lzma_size < BLOCK // 10
+
+
+def test_sampler(tmp_dir):
+    # The budget allows for all the files with a block size of 1/8 of the files
+    sampler = compressibility.CompressionSampler(
+        15 * 4 * BLOCK, block_size=BLOCK, blocks=4, workers=2, seed=0
+    )
+    scan(tmp_dir, sampler)
+    sampler.close()
+    estimates = sampler.estimates()
+    assert set(estimates) == {"unknown", "executable", "text"}
+    assert estimates["unknown"][:2] == (5 * 8 * BLOCK, 5)
+    assert estimates["unknown"][2] < 0.1
+    assert estimates["executable"][2:] == (1, 1)
+    assert estimates["text"][3] < 0.5
+    assert sampler._stats["read"] == 15 * 4 * BLOCK
+    assert sampler._stats["blocks"] - sampler._stats["compressed"] == 5 * 4
+    # Sampling once
+    assert sampler.estimates() is estimates
+
+    lines = sampler.summary()
+    assert lines[-1] == (
+        "Compressibility sampling: 240.0 KB read, "
+        "20 of 60 blocks skipped by the entropy prefilter."
+    )
+    assert any(
+        line.startswith("executable: 160.0 KB, 5 files sampled, zlib saves 0 B (0%)")
+        for line in lines
+    )
+
+
+def test_sampler_budget(tmp_dir):
+    # The budget allows for 2 files of the 15
+    sampler = compressibility.CompressionSampler(
+        2 * 4 * BLOCK, block_size=BLOCK, blocks=4, seed=0
+    )
+    scan(tmp_dir, sampler)
+    estimates = sampler.estimates()
+    assert sum(files for _, files, _, _ in estimates.values()) == 2
+    assert sampler._stats["read"] <= 2 * 4 * BLOCK
+    assert sum(ratio is None for _, _, ratio, _ in estimates.values()) == 1
+    assert any(line.endswith("not sampled.") for line in sampler.summary())
+
+
+def test_sampler_unreadable(tmp_dir):
+    sampler = compressibility.CompressionSampler(
+        15 * 4 * BLOCK, block_size=BLOCK, blocks=4, seed=0
+    )
+    scan(tmp_dir, sampler)
+    os.remove(tmp_dir / "zeros" / "file0.dat")
+    estimates = sampler.estimates()
+    assert estimates["unknown"][1] == 4
+    assert sampler.summary()[-1].endswith(", 1 files unreadable.")
+
+
+def test_sampler_allocated(tmp_dir):
+    # A sparse file with no allocated blocks is not sampled nor counted
+    sparse = tmp_dir / "zeros" / "sparse.dat"
+    with open(sparse, "wb") as f:
+        f.truncate(64 * BLOCK)
+    if os.stat(sparse).st_blocks:
+        pytest.skip("The filesystem doesn't support sparse files.")
+    sampler = compressibility.CompressionSampler(
+        16 * 4 * BLOCK, block_size=BLOCK, blocks=4, seed=0
+    )
+    scan(tmp_dir, sampler)
+    estimates = sampler.estimates()
+    assert estimates["unknown"][:2] == (5 * 8 * BLOCK, 5)
+    assert sum(files for _, files, _, _ in estimates.values()) == 15
+
+
+def test_sampler_size_policies():
+    sampler = compressibility.CompressionSampler(
+        4 * 4 * BLOCK, block_size=BLOCK, blocks=4, max_sniff_size=16 * BLOCK, seed=0
+    )
+    regular = stat.S_IFREG | 0o644
+    # Partly sparse: weighted and counted by its allocated space
+    sampler.record(
+        "a", SimpleNamespace(st_mode=regular, st_size=8 * BLOCK, st_blocks=8), "text"
+    )
+    # Offline stub and file bigger than max_sniff_size: not sampled
+    sampler.record(
+        "b", SimpleNamespace(st_mode=regular, st_size=8 * BLOCK, st_blocks=0), "text"
+    )
+    sampler.record(
+        "c", SimpleNamespace(st_mode=regular, st_size=32 * BLOCK, st_blocks=256), "text"
+    )
+    assert sampler._sizes == {"text": 8 * 512}
+    assert [path for _, _, path, _, _ in sampler._reservoir] == ["a"]
+
+    # Offline files are sampled with sniff_offline
+    sampler = compressibility.CompressionSampler(
+        4 * 4 * BLOCK, block_size=BLOCK, blocks=4, sniff_offline=True, seed=0
+    )
+    sampler.record(
+        "b", SimpleNamespace(st_mode=regular, st_size=8 * BLOCK, st_blocks=0), "text"
+    )
+    # but still not counted, with no allocated space
+    assert not sampler._sizes
+
+
+def test_sampler_invalid():
+    with pytest.raises(ValueError):
+        compressibility.CompressionSampler(4 * BLOCK - 1, block_size=BLOCK, blocks=4)
+    with pytest.raises(ValueError):
+        compressibility.CompressionSampler(4 * BLOCK, block_size=BLOCK, workers=0)
+    with pytest.raises(ValueError):
+        compressibility.CompressionSampler(4 * BLOCK, block_size=0)
@@ -0,0 +1,225 @@
+import os
+import time
+import pytest
+
+from analyzer import scan
+from analyzer.analyze import Analyzer
+from analyzer.distributed import (
+    Coordinator,
+    _Worker,
+    _WorkerConnection,
+    parse_address,
+    run_worker,
+    start_workers,
+)
+
+
+class FakeConnection:
+    # A connection of a worker which is not read from
+    def fileno(self):
+        return id(self)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a skewed tree: one directory with many subdirectories
+    scanned = tmp_path / "scanned"
+    for i in range(20):
+        (scanned / "deep" / f"sub{i}").mkdir(parents=True)
+        (scanned / "deep" / f"sub{i}" / "file.txt").write_text("A" * (i * 10))
+    (scanned / "small").mkdir()
+    (scanned / "small" / "file.txt").write_text("test")
+    os.chmod(scanned / "small" / "file.txt", 0o666)
+    yield tmp_path
+
+
+def coordinator(tmp_dir, address):
+    return Coordinator(
+        str(tmp_dir / "scanned"), address, collect=True, policy="extension"
+    )
+
+
+def assert_same(result, expected):
+    assert result.categories == expected.categories
+    assert sorted(result.big_files) == sorted(expected.big_files)
+    assert sorted(result.unusual_permissions) == sorted(expected.unusual_permissions)
+    assert result.classification == expected.classification
+    assert {
+        category: distribution.to_dict()
+        for category, distribution in result.distributions.items()
+    } == {
+        category: distribution.to_dict()
+        for category, distribution in expected.distributions.items()
+    }
+
+
+def test_parse_address():
+    assert parse_address("localhost:7000")[1] == ("localhost", 7000)
+    assert parse_address(":7000")[1] == ("127.0.0.1", 7000)
+    assert parse_address("/tmp/coordinator.sock")[1] == "/tmp/coordinator.sock"
+
+
+@pytest.mark.parametrize("address", ["unix", "127.0.0.1:0"])
+def test_distributed_scan(tmp_dir, address):
+    if address == "unix":
+        address = str(tmp_dir / "coordinator.sock")
+    scan_coordinator = coordinator(tmp_dir, address)
+    scan_coordinator.start()
+    try:
+        processes = start_workers(scan_coordinator.address, 3)
+        scan_coordinator.run(processes)
+        result = scan_coordinator.result()
+    finally:
+        scan_coordinator.close()
+    for process in processes:
+        process.join(10)
+        assert process.exitcode == 0
+    assert_same(result, scan(str(tmp_dir / "scanned"), policy="extension"))
+    assert not os.path.exists(tmp_dir / "coordinator.sock")
+
+
+def test_work_stealing_and_reassignment(tmp_dir):
+    scan_coordinator = coordinator(tmp_dir, str(tmp_dir / "coordinator.sock"))
+    scan_coordinator.start()
+    busy, idle = _Worker(FakeConnection()), _Worker(FakeConnection())
+    scan_coordinator._workers = {1: busy, 2: idle}
+    root = str(tmp_dir / "scanned")
+
+    assert scan_coordinator._answer(busy, {"type": "hello"})["type"] == "config"
+    work = scan_coordinator._answer(busy, {"type": "request"})
+    assert (work["unit"], work["dirs"], work["excluded"]) == (0, [root], [])
+    assert scan_coordinator._answer(idle, {"type": "request"})["type"] == "wait"
+
+    # The busy worker is asked to hand out part of its queue to the idle one
+    answer = scan_coordinator._answer(busy, {"type": "progress", "unit": 0})
+    assert answer == {"type": "ok", "donate": True}
+    donated = [os.path.join(root, "deep")]
+    scan_coordinator._answer(busy, {"type": "donate", "unit": 0, "dirs": donated})
+    work = scan_coordinator._answer(idle, {"type": "request"})
+    assert (work["unit"], work["dirs"]) == (1, donated)
+
+    # The unit of a lost worker is assigned again, without the directories handed out
+    scan_coordinator._drop(busy)
+    other = _Worker(FakeConnection())
+    work = scan_coordinator._answer(other, {"type": "request"})
+    assert (work["unit"], work["dirs"], work["excluded"]) == (0, [root], donated)
+    # Messages of a worker about a unit it lost are rejected
+    answer = scan_coordinator._answer(busy, {"type": "progress", "unit": 0})
+    assert answer["type"] == "abandon"
+    scan_coordinator.close()
+
+
+def test_lost_worker(tmp_dir):
+    import socket
+    import threading
+
+    scan_coordinator = coordinator(tmp_dir, str(tmp_dir / "coordinator.sock"))
+    scan_coordinator.start()
+    thread = threading.Thread(target=scan_coordinator.run)
+    thread.start()
+    try:
+        # A worker takes the whole directory and disconnects without completing it
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as lost:
+            lost.connect(scan_coordinator.address)
+            reader = lost.makefile("rb")
+            lost.sendall(b'{"type":"hello"}\n{"type":"request"}\n')
+            reader.readline()
+            assert b'"work"' in reader.readline()
+            reader.close()
+        processes = start_workers(scan_coordinator.address, 2)
+        thread.join(30)
+        assert not thread.is_alive()
+        result = scan_coordinator.result()
+    finally:
+        scan_coordinator.close()
+    for process in processes:
+        process.join(10)
+    assert_same(result, scan(str(tmp_dir / "scanned"), policy="extension"))
+
+
+def run_worker_thread(address):
+    import threading
+
+    thread = threading.Thread(target=run_worker, args=(address,))
+    thread.start()
+    return thread
+
+
+def test_slow_listing_heartbeat(tmp_dir, monkeypatch, capsys):
+    import threading
+
+    expected = scan(str(tmp_dir / "scanned"), policy="extension")
+    add = Analyzer.add
+
+    def slow_add(self, path, file_stat=None):
+        # Listing the directory with 20 subdirectories takes longer than the timeout
+        time.sleep(0.05)
+        add(self, path, file_stat)
+
+    monkeypatch.setattr(Analyzer, "add", slow_add)
+    scan_coordinator = Coordinator(
+        str(tmp_dir / "scanned"),
+        str(tmp_dir / "coordinator.sock"),
+        worker_timeout=0.4,
+        collect=True,
+        policy="extension",
+    )
+    scan_coordinator.start()
+    thread = threading.Thread(target=scan_coordinator.run)
+    thread.start()
+    try:
+        worker = run_worker_thread(scan_coordinator.address)
+        thread.join(30)
+        assert not thread.is_alive()
+        result = scan_coordinator.result()
+    finally:
+        scan_coordinator.close()
+    worker.join(10)
+    assert not worker.is_alive()
+    assert "a worker was lost" not in capsys.readouterr().err
+    assert_same(result, expected)
+
+
+def test_dropped_worker_reconnects(tmp_dir, monkeypatch, capsys):
+    import threading
+
+    expected = scan(str(tmp_dir / "scanned"), policy="extension")
+    add = Analyzer.add
+    stalled = threading.Event()
+
+    def stalling_add(self, path, file_stat=None):
+        # The first entry stalls the worker, without heartbeats, past the timeout
+        if not stalled.is_set():
+            stalled.set()
+            time.sleep(2.5)
+        add(self, path, file_stat)
+
+    monkeypatch.setattr(Analyzer, "add", stalling_add)
+    monkeypatch.setattr(
+        _WorkerConnection, "start_heartbeat", lambda self, interval: None
+    )
+    scan_coordinator = Coordinator(
+        str(tmp_dir / "scanned"),
+        str(tmp_dir / "coordinator.sock"),
+        worker_timeout=0.3,
+        collect=True,
+        policy="extension",
+    )
+    scan_coordinator.start()
+    thread = threading.Thread(target=scan_coordinator.run)
+    thread.start()
+    try:
+        worker = run_worker_thread(scan_coordinator.address)
+        thread.join(30)
+        assert not thread.is_alive()
+        result = scan_coordinator.result()
+    finally:
+        scan_coordinator.close()
+    worker.join(10)
+    assert not worker.is_alive()
+    # The same worker completed the unit it was dropped from
+    assert "a worker was lost" in capsys.readouterr().err
+    assert_same(result, expected)
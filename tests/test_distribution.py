@@ -0,0 +1,80 @@
+import random
+import pytest
+
+from analyzer.distribution import DDSketch, SizeDistribution
+
+
+@pytest.fixture
+def sizes():
+    # File sizes spread over several orders of magnitude, with empty files
+    rng = random.Random(0)
+    yield [int(rng.lognormvariate(10, 3)) for _ in range(10000)] + [0] * 100
+
+
+def exact_quantile(sizes, q):
+    return sorted(sizes)[int(q * (len(sizes) - 1))]
+
+
+def test_sketch_accuracy(sizes):
+    sketch = DDSketch(relative_accuracy=0.01)
+    for size in sizes:
+        sketch.add(size)
+    assert sketch.count == len(sizes)
+    assert sketch.quantile(0) == 0
+    for q in (0.1, 0.5, 0.9, 0.99, 1):
+        assert sketch.quantile(q) == pytest.approx(exact_quantile(sizes, q), rel=0.01)
+
+
+def test_sketch_merge(sizes):
+    # Merged sketches are the same as a sketch of all the sizes
+    whole, first, second = DDSketch(), DDSketch(), DDSketch()
+    for i, size in enumerate(sizes):
+        whole.add(size)
+        (first if i % 2 else second).add(size)
+    first.merge(second)
+    assert first.to_dict() == whole.to_dict()
+    assert DDSketch.from_dict(whole.to_dict()).quantile(0.5) == whole.quantile(0.5)
+
+    with pytest.raises(ValueError):
+        whole.merge(DDSketch(relative_accuracy=0.02))
+
+
+def test_sketch_invalid():
+    assert DDSketch().quantile(0.5) is None
+    with pytest.raises(ValueError):
+        DDSketch().quantile(1.5)
+    with pytest.raises(ValueError):
+        DDSketch(relative_accuracy=1)
+
+
+def test_size_distribution():
+    distribution = SizeDistribution()
+    for size in (0, 1, 3, 1000, 1000, 1024):
+        distribution.add(size)
+    assert distribution.count() == 6
+    assert distribution.buckets() == [
+        (0, 1, 1, 0),
+        (1, 2, 1, 1),
+        (2, 4, 1, 3),
+        (512, 1024, 2, 2000),
+        (1024, 2048, 1, 1024),
+    ]
+    assert distribution.summary("text")[0] == (
+        "text: 6 files, p50 3.0 B, p90 1002.0 B, p99 1002.0 B."
+    )
+    assert distribution.summary("text")[4] == "  [512.0 B, 1.0 KB): 2 files, 2.0 KB."
+
+    # Removed sizes leave the distribution as if they were never added
+    copy = distribution.copy()
+    distribution.remove(1000)
+    distribution.remove(0)
+    assert distribution.buckets()[0] == (1, 2, 1, 1)
+    assert distribution.buckets()[2] == (512, 1024, 1, 1000)
+    distribution.add(0)
+    distribution.add(1000)
+    assert distribution.to_dict() == copy.to_dict()
+
+    merged = SizeDistribution.from_dict(copy.to_dict())
+    merged.merge(copy)
+    assert merged.count() == 12
+    assert merged.sizes == [2 * size for size in copy.sizes]
@@ -0,0 +1,96 @@
+import os
+import pytest
+
+from analyzer import estimator, scan
+from analyzer.estimator import estimate
+
+
+def make_tree(root, fan_out, depth, files):
+    # Create a tree of depth levels, every directory having fan_out subdirectories and files files
+    for i in range(files):
+        (root / f"file{i}.txt").write_text("A" * (i + 1))
+    if depth:
+        for i in range(fan_out):
+            (root / f"dir{i}").mkdir()
+            make_tree(root / f"dir{i}", fan_out, depth - 1, files)
+
+
+@pytest.fixture
+def uniform_dir(tmp_path):
+    make_tree(tmp_path, 3, 3, 2)
+    yield tmp_path
+
+
+@pytest.fixture
+def skewed_dir(tmp_path):
+    # One wide and deep branch next to many small directories
+    (tmp_path / "wide").mkdir()
+    make_tree(tmp_path / "wide", 6, 2, 3)
+    for i in range(10):
+        (tmp_path / f"small{i}").mkdir()
+        (tmp_path / f"small{i}" / "file.txt").write_text("test")
+    yield tmp_path
+
+
+def test_uniform_tree_is_exact(uniform_dir):
+    # Every path of a uniform tree gives the exact totals
+    exact = scan(str(uniform_dir), policy="extension").categories
+    result = estimate(str(uniform_dir), samples=5, policy="extension")
+    assert result.categories.keys() == exact.keys()
+    for category, (size, size_margin, count, count_margin) in result.categories.items():
+        assert size == pytest.approx(exact[category])
+        assert size_margin == pytest.approx(0)
+        assert count_margin == pytest.approx(0)
+    assert result.categories["text"][2] == 2 * (1 + 3 + 9 + 27)
+    # Listings are shared by the paths: the root is listed once
+    assert result.directories <= 1 + 5 * 3
+
+
+def test_one_analyzer(uniform_dir, monkeypatch):
+    # The listings of an estimate share one analyzer
+    analyzers = []
+
+    class CountedAnalyzer(estimator.Analyzer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            analyzers.append(self)
+
+    monkeypatch.setattr(estimator, "Analyzer", CountedAnalyzer)
+    result = estimate(str(uniform_dir), samples=5, policy="extension")
+    assert len(analyzers) == 1
+    assert result.directories > 1
+    assert result.categories["text"][2] == 2 * (1 + 3 + 9 + 27)
+
+
+def test_skewed_tree(skewed_dir):
+    exact = scan(str(skewed_dir), policy="extension").categories
+    result = estimate(str(skewed_dir), samples=2000, seed=1, policy="extension")
+    size, size_margin, _, _ = result.categories["text"]
+    # The normal approximation of the margins is loose on skewed trees
+    assert size_margin > 0
+    assert abs(size - exact["text"]) <= 2 * size_margin
+    # The same seed walks the same paths
+    again = estimate(str(skewed_dir), samples=2000, seed=1, policy="extension")
+    assert again.categories == result.categories
+
+
+def test_symlink_loop(uniform_dir):
+    os.symlink(uniform_dir, uniform_dir / "dir0" / "loop")
+    result = estimate(str(uniform_dir), samples=50, follow_links=True)
+    assert result.samples == 50
+
+
+def test_summary(uniform_dir):
+    summary = estimate(str(uniform_dir), samples=10, policy="extension").summary()
+    assert summary[-1].startswith("estimated from 10 random paths (")
+    assert summary[-1].endswith("margins at 95% confidence.")
+    assert any(line.startswith("text: ~") for line in summary)
+
+
+def test_invalid_arguments(uniform_dir):
+    with pytest.raises(ValueError):
+        estimate(str(uniform_dir), samples=1)
+    with pytest.raises(ValueError):
+        estimate(str(uniform_dir), confidence=1)
+    with pytest.raises(ValueError):
+        estimate(str(uniform_dir), policy="unknown")
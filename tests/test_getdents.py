@@ -0,0 +1,102 @@
+import ctypes
+import errno
+import os
+import pytest
+from pathlib import Path
+
+from analyzer import getdents
+from analyzer.analyze import Analyzer
+from analyzer.traverse import traverse_directory
+
+pytestmark = pytest.mark.skipif(
+    not getdents.AVAILABLE, reason="getdents64 and statx are not available"
+)
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a directory with a file, a subdirectory and symbolic links
+    (tmp_path / "dir1").mkdir()
+    (tmp_path / "file1.txt").write_text("content")
+    Path(str(tmp_path / "link_dir")).symlink_to(Path(str(tmp_path / "dir1")))
+    Path(str(tmp_path / "link_broken")).symlink_to(Path(str(tmp_path / "missing")))
+    yield tmp_path
+
+
+def test_scandir_entries(tmp_dir):
+    expected = {
+        item.name: (item.path, item.inode(), item.is_dir(), item.is_symlink())
+        for item in os.scandir(tmp_dir)
+    }
+    entries = {
+        item.name: (item.path, item.inode(), item.is_dir(), item.is_symlink())
+        for item in getdents.scandir(tmp_dir)
+    }
+    assert entries == expected
+
+
+def test_scandir_stat(tmp_dir):
+    fields = ("st_mode", "st_ino", "st_dev", "st_size", "st_blocks", "st_uid")
+    for item in getdents.scandir(tmp_dir):
+        for follow_symlinks in (False, True):
+            if item.name == "link_broken" and follow_symlinks:
+                with pytest.raises(FileNotFoundError):
+                    item.stat(follow_symlinks=follow_symlinks)
+                continue
+            expected = os.stat(item.path, follow_symlinks=follow_symlinks)
+            result = item.stat(follow_symlinks=follow_symlinks)
+            for field in fields:
+                assert getattr(result, field) == getattr(expected, field)
+            assert result.st_mtime_ns == expected.st_mtime_ns
+
+
+def test_scandir_large_directory(tmp_path):
+    # More entries than fit in a single read
+    names = {f"file_{i:05d}_{'x' * 200}" for i in range(6000)}
+    for name in names:
+        (tmp_path / name).touch()
+    assert {item.name for item in getdents.scandir(tmp_path)} == names
+
+
+def test_scandir_errors(tmp_dir):
+    with pytest.raises(FileNotFoundError) as exc:
+        getdents.scandir(str(tmp_dir / "missing"))
+    assert exc.value.filename == str(tmp_dir / "missing")
+    with pytest.raises(NotADirectoryError):
+        getdents.scandir(str(tmp_dir / "file1.txt"))
+
+
+def test_scandir_fallback(tmp_dir, monkeypatch):
+    monkeypatch.setattr(getdents, "AVAILABLE", False)
+    with getdents.scandir(tmp_dir) as entries:
+        assert {item.name for item in entries} == set(os.listdir(tmp_dir))
+
+
+@pytest.mark.parametrize(
+    "error, available",
+    [(errno.ENOSYS, False), (errno.EPERM, False), (errno.ENOENT, True)],
+)
+def test_statx_probe(tmp_dir, monkeypatch, error, available):
+    def failing_statx(*args):
+        ctypes.set_errno(error)
+        return -1
+
+    assert getdents._probe_statx()
+    # statx missing from the kernel or denied by seccomp makes scandir fall back to os.scandir
+    monkeypatch.setattr(getdents, "_statx_call", failing_statx)
+    monkeypatch.setattr(getdents, "AVAILABLE", getdents._probe_statx())
+    assert getdents.AVAILABLE == available
+    with getdents.scandir(tmp_dir) as entries:
+        assert isinstance(next(iter(entries)), os.DirEntry) != available
+
+
+def test_traverse_directory_getdents(tmp_dir, tmp_path_factory, capsys):
+    reports = tmp_path_factory.mktemp("reports")
+    results = []
+    for backend in ("scandir", "getdents"):
+        analyzer = Analyzer(unusual_perm_out=str(reports / f"{backend}.txt"))
+        traverse_directory(tmp_dir / "dir1", analyzer, backend=backend)
+        traverse_directory(tmp_dir, analyzer, follow_links=True, backend=backend)
+        results.append(analyzer._type_size_count)
+        analyzer.close()
+    assert results[0] == results[1]
@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import pytest
+
+from analyzer.analyze import Analyzer
+from analyzer.index import FLAGS, ScanIndex, permission_flags, query
+from analyzer.traverse import traverse_directory
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a directory with files of different sizes and permissions
+    scanned = tmp_path / "scanned"
+    (scanned / "dir1").mkdir(parents=True)
+    (scanned / "dir1" / "small.txt").write_text("test")
+    (scanned / "big.txt").write_text("A" * 2000)
+    (scanned / "setuid.txt").write_text("test")
+    os.chmod(scanned / "big.txt", 0o666)
+    os.chmod(scanned / "setuid.txt", 0o4757)
+    yield tmp_path
+
+
+@pytest.fixture
+def index_path(tmp_dir):
+    # Scan the directory into an index
+    path = str(tmp_dir / "index.db")
+    analyzer = Analyzer(
+        unusual_perm_out=str(tmp_dir / "report.txt"),
+        big_files_out=str(tmp_dir / "big_files.txt"),
+        policy="extension",
+        recorders=[ScanIndex(path)],
+    )
+    traverse_directory(str(tmp_dir / "scanned"), analyzer)
+    analyzer.close()
+    yield path
+
+
+def test_permission_flags():
+    assert permission_flags(0o100644) == 0
+    assert permission_flags(0o104757) == FLAGS["setuid"] | FLAGS["world-writable"]
+    assert permission_flags(0o102644) == FLAGS["setgid"]
+    assert permission_flags(0o100000) == FLAGS["no-permissions"]
+
+
+def test_index_entries(index_path, tmp_dir):
+    paths = {entry[0] for entry in query(index_path)}
+    scanned = tmp_dir / "scanned"
+    assert paths == {
+        str(scanned / name)
+        for name in ("dir1", "dir1/small.txt", "big.txt", "setuid.txt")
+    }
+    # Indexes are built and the journal is back in rollback mode once the index is written
+    connection = sqlite3.connect(index_path)
+    indexes = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"
+    ).fetchall()
+    assert len(indexes) == 6
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("delete",)
+    connection.close()
+
+
+def test_query(index_path, tmp_dir):
+    scanned = tmp_dir / "scanned"
+    uid = os.getuid()
+
+    # Sorted by size, the biggest first
+    entries = query(index_path, category="text")
+    assert [entry[0] for entry in entries][0] == str(scanned / "big.txt")
+    assert len(entries) == 3
+
+    # Combined conditions
+    entries = query(index_path, uid=uid, min_size=1000, flags=["world-writable"])
+    assert entries == [
+        (str(scanned / "big.txt"), "text", 2000, uid, os.getgid(), 0o100666)
+    ]
+    entries = query(index_path, flags=["world-writable", "setuid"])
+    assert [entry[0] for entry in entries] == [str(scanned / "setuid.txt")]
+    assert query(index_path, uid=uid + 1) == []
+
+    # Parent directory and limit
+    entries = query(index_path, parent=str(scanned / "dir1"))
+    assert [entry[0] for entry in entries] == [str(scanned / "dir1" / "small.txt")]
+    assert len(query(index_path, limit=2)) == 2
+
+
+def test_query_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        query(str(tmp_path / "missing.db"))
+
+
+def test_query_read_only(index_path, tmp_dir):
+    # No -wal or -shm files are left next to the index, nor needed to query it
+    assert sorted(os.listdir(tmp_dir)) == [
+        "big_files.txt",
+        "index.db",
+        "report.txt",
+        "scanned",
+    ]
+    os.chmod(tmp_dir, 0o555)
+    try:
+        assert len(query(index_path)) == 4
+    finally:
+        os.chmod(tmp_dir, 0o755)
+    assert sorted(os.listdir(tmp_dir)) == [
+        "big_files.txt",
+        "index.db",
+        "report.txt",
+        "scanned",
+    ]
+
+
+def test_index_overwrite(index_path):
+    index = ScanIndex(index_path)
+    index.close()
+    assert query(index_path) == []
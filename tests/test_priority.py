@@ -0,0 +1,101 @@
+import os
+import pytest
+
+from analyzer.analyze import Analyzer
+from analyzer.priority import DirectoryPriorities, subtree_sizes
+from analyzer.snapshot import SnapshotWriter
+from analyzer.traverse import traverse_directory
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a tree with the most data in a deep directory
+    tree = tmp_path / "tree"
+    (tree / "a" / "small").mkdir(parents=True)
+    (tree / "b" / "big").mkdir(parents=True)
+    (tree / "a" / "small" / "file.txt").write_text("A" * 10)
+    (tree / "b" / "big" / "file.txt").write_text("A" * 1000)
+    (tree / "c.txt").write_text("A" * 100)
+    yield tmp_path
+
+
+def take_snapshot(directory, path):
+    # Scan the directory to a snapshot file
+    writer = SnapshotWriter(str(path))
+    analyzer = Analyzer(10**9, collect=True, policy="extension", recorders=[writer])
+    traverse_directory(str(directory), analyzer)
+    analyzer.close()
+    return str(path)
+
+
+def visit_order(directory, priorities=None):
+    # The directories in the order they were listed
+    listed = []
+
+    class Recorder:
+        def record(self, path, file_stat, category):
+            parent = os.path.dirname(path)
+            if parent not in listed:
+                listed.append(parent)
+
+        def close(self):
+            pass
+
+    analyzer = Analyzer(10**9, collect=True, policy="extension", recorders=[Recorder()])
+    traverse_directory(str(directory), analyzer, priorities=priorities)
+    return listed
+
+
+def test_subtree_sizes(tmp_dir):
+    tree = tmp_dir / "tree"
+    sizes = subtree_sizes(take_snapshot(tree, tmp_dir / "snapshot"))
+    dir_size = os.stat(tree / "a").st_size
+    assert sizes[str(tree / "b" / "big")] == 1000
+    assert sizes[str(tree / "b")] == 1000 + dir_size
+    assert sizes[str(tree)] == 1110 + 4 * dir_size
+    assert str(tmp_dir) not in sizes
+
+
+def test_prioritized_traversal(tmp_dir):
+    tree = tmp_dir / "tree"
+    priorities = DirectoryPriorities(take_snapshot(tree, tmp_dir / "snapshot"))
+    # The heaviest directories queued are scanned first, and directories unknown to the snapshot last
+    (tree / "new").mkdir()
+    (tree / "new" / "file.txt").write_text("A" * 10000)
+    assert visit_order(tree, priorities) == [
+        str(tree),
+        str(tree / "b"),
+        str(tree / "a"),
+        str(tree / "b" / "big"),
+        str(tree / "a" / "small"),
+        str(tree / "new"),
+    ]
+
+
+def test_growth_priorities(tmp_dir):
+    tree = tmp_dir / "tree"
+    older = take_snapshot(tree, tmp_dir / "older")
+    (tree / "a" / "small" / "file.txt").write_text("A" * 900)
+    priorities = DirectoryPriorities(take_snapshot(tree, tmp_dir / "latest"), older)
+    # a grew by 890 bytes to 900: it is expected to reach 1790, more than b
+    assert priorities.priority(str(tree / "a" / "small")) == 1790
+    assert priorities.priority(str(tree / "b" / "big")) == 1000
+    assert visit_order(tree, priorities)[1] == str(tree / "a")
+
+
+def test_time_budget(tmp_dir):
+    tree = tmp_dir / "tree"
+    priorities = DirectoryPriorities(take_snapshot(tree, tmp_dir / "snapshot"))
+    analyzer = Analyzer(10**9, collect=True, policy="extension")
+    assert traverse_directory(str(tree), analyzer, time_budget=60) == []
+
+    # Nothing is scanned without time left, and the root is left in the queue
+    analyzer = Analyzer(10**9, collect=True, policy="extension")
+    pending = traverse_directory(
+        str(tree), analyzer, priorities=priorities, time_budget=0
+    )
+    assert pending == [str(tree)]
+    assert analyzer.result().categories == {}
+    assert priorities.coverage(str(tree), pending) == (0, priorities.size(str(tree)))
+    covered, total = priorities.coverage(str(tree), [str(tree / "b")])
+    assert total - covered == priorities.size(str(tree / "b"))
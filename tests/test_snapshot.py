@@ -0,0 +1,144 @@
+import os
+import pytest
+from types import SimpleNamespace
+
+from analyzer.analyze import Analyzer
+from analyzer.snapshot import SnapshotDiff, SnapshotWriter, read_snapshot
+from analyzer.traverse import traverse_directory
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a directory with files of different sizes and permissions
+    scanned = tmp_path / "scanned"
+    (scanned / "dir1").mkdir(parents=True)
+    (scanned / "dir1" / "small.txt").write_text("test")
+    (scanned / "dir1" / "removed.txt").write_text("test")
+    (scanned / "big.txt").write_text("A" * 2000)
+    (scanned / "program").write_text("test")
+    yield tmp_path
+
+
+def scan(tmp_dir, name: str) -> str:
+    # Scan the directory into a snapshot
+    path = str(tmp_dir / name)
+    analyzer = Analyzer(
+        unusual_perm_out=str(tmp_dir / "report.txt"),
+        big_files_out=str(tmp_dir / "big_files.txt"),
+        policy="extension",
+        recorders=[SnapshotWriter(path)],
+    )
+    traverse_directory(str(tmp_dir / "scanned"), analyzer)
+    analyzer.close()
+    return path
+
+
+def test_read_snapshot(tmp_dir):
+    path = scan(tmp_dir, "snapshot")
+    entries = list(read_snapshot(path))
+    scanned = os.fsencode(tmp_dir / "scanned")
+
+    # Sorted by path, with the prefixes of the paths restored
+    assert [entry.path for entry in entries] == [
+        os.path.join(scanned, name)
+        for name in (
+            b"big.txt",
+            b"dir1",
+            b"dir1/removed.txt",
+            b"dir1/small.txt",
+            b"program",
+        )
+    ]
+    big = entries[0]
+    assert (big.size, big.uid, big.category) == (2000, os.getuid(), "text")
+    assert big.mtime_ns == os.stat(tmp_dir / "scanned" / "big.txt").st_mtime_ns
+    assert entries[1].category == "directories"
+
+
+def test_not_a_snapshot(tmp_dir):
+    (tmp_dir / "other").write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        list(read_snapshot(str(tmp_dir / "other")))
+
+    # A truncated snapshot
+    data = open(scan(tmp_dir, "snapshot"), "rb").read()
+    (tmp_dir / "truncated").write_bytes(data[:-20])
+    with pytest.raises(ValueError):
+        list(read_snapshot(str(tmp_dir / "truncated")))
+    # A snapshot truncated in the suffix of its last path
+    (tmp_dir / "truncated").write_bytes(data[:-2])
+    with pytest.raises(ValueError):
+        list(read_snapshot(str(tmp_dir / "truncated")))
+
+    # A record referring to a category not in the header: the last record, of "program"
+    corrupt = bytearray(data)
+    offset = len(data) - len(b"program") - 2
+    corrupt[offset : offset + 2] = (7).to_bytes(2, "little")
+    (tmp_dir / "corrupt").write_bytes(corrupt)
+    with pytest.raises(ValueError):
+        list(read_snapshot(str(tmp_dir / "corrupt")))
+
+
+def test_duplicate_entries(tmp_dir):
+    # An entry reached through several links is written once
+    path = str(tmp_dir / "snapshot")
+    writer = SnapshotWriter(path)
+    file_stat = os.stat(tmp_dir / "scanned" / "big.txt")
+    for name in ("b", "a", "b", "c", "b"):
+        writer.record(str(tmp_dir / name), file_stat, "text")
+    writer.close()
+    assert [os.path.basename(entry.path) for entry in read_snapshot(path)] == [
+        b"a",
+        b"b",
+        b"c",
+    ]
+    assert list(SnapshotDiff(path, path).changes()) == []
+
+
+def test_diff(tmp_dir):
+    old = scan(tmp_dir, "old")
+    scanned = tmp_dir / "scanned"
+    (scanned / "dir1" / "removed.txt").unlink()
+    (scanned / "dir1" / "added.txt").write_text("test")
+    (scanned / "big.txt").write_text("A" * 3000)
+    os.chmod(scanned / "program", 0o4755)
+    new = scan(tmp_dir, "new")
+
+    snapshot_diff = SnapshotDiff(old, new)
+    changes = [
+        (kind, os.path.relpath(os.fsdecode((new or old).path), scanned))
+        for kind, old, new in snapshot_diff.changes()
+    ]
+    assert changes == [
+        ("resized", "big.txt"),
+        ("added", "dir1/added.txt"),
+        ("removed", "dir1/removed.txt"),
+        ("permissions", "program"),
+    ]
+    assert dict(snapshot_diff.category_deltas) == {"text": [0, 1000]}
+
+    # A file rewritten with contents of another category, of the same size and time
+    other = str(tmp_dir / "other")
+    writer = SnapshotWriter(other)
+    for entry in read_snapshot(new):
+        category = "image" if entry.path.endswith(b"program") else entry.category
+        writer.record(
+            os.fsdecode(entry.path),
+            SimpleNamespace(
+                st_size=entry.size,
+                st_mode=entry.mode,
+                st_uid=entry.uid,
+                st_gid=entry.gid,
+                st_mtime_ns=entry.mtime_ns,
+            ),
+            category,
+        )
+    writer.close()
+    snapshot_diff = SnapshotDiff(new, other)
+    assert [
+        (kind, os.path.basename(new.path)) for kind, _, new in snapshot_diff.changes()
+    ] == [("recategorized", b"program")]
+
+    # No changes between identical snapshots
+    snapshot_diff = SnapshotDiff(new, new)
+    assert list(snapshot_diff.changes()) == []
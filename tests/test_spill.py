@@ -0,0 +1,85 @@
+import random
+import pytest
+
+from analyzer import spill
+from analyzer.analyze import Analyzer
+from analyzer.snapshot import SnapshotWriter, read_snapshot
+from analyzer.traverse import traverse_directory
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a tree with many directories
+    tree = tmp_path / "tree"
+    for i in range(20):
+        for j in range(5):
+            (tree / f"dir{i}" / f"sub{j}").mkdir(parents=True)
+            (tree / f"dir{i}" / f"sub{j}" / "file.txt").write_text("test" * j)
+    yield tmp_path
+
+
+def test_external_sorter():
+    items = list(range(10000))
+    random.Random(0).shuffle(items)
+    # Every 10 items are spilled to a run, so runs of each size are merged
+    sorter = spill.ExternalSorter(max_memory=100, item_memory=lambda item: 10)
+    for item in items:
+        sorter.add(item)
+    assert len(sorter._runs) < spill._FAN_IN * 3
+    assert list(sorter) == sorted(items)
+    sorter.close()
+
+    sorter = spill.ExternalSorter()
+    for item in items:
+        sorter.add(item)
+    assert not sorter._runs
+    assert list(sorter) == sorted(items)
+
+
+def test_spilled_set():
+    rng = random.Random(0)
+    keys = {(rng.randrange(2**64), rng.randrange(2**64)) for _ in range(2000)}
+    visited = spill.SpilledSet(max_memory=20 * spill.KEY_MEMORY)
+    for key in keys:
+        visited.add(key)
+    assert len(visited) == len(keys)
+    assert len(visited._keys) < 20
+    assert len(visited._runs) < (spill._SET_FAN_IN - 1) * 5
+    assert all(key in visited for key in keys)
+    assert not any((dev, ino + 1) in visited for dev, ino in keys)
+    assert (0, 0) not in visited
+    visited.close()
+
+
+def test_spilled_queue():
+    queue = spill.SpilledQueue(max_memory=4 * (spill.PATH_MEMORY + 5))
+    paths = [f"/d{i:03d}" for i in range(50)]
+    for path in paths[:30]:
+        queue.append(path)
+    assert queue._segments
+    assert [queue.pop(0) for _ in range(10)] == paths[:10]
+    for path in paths[30:]:
+        queue.append(path)
+    assert list(queue) == paths[10:]
+    assert [queue.pop(0) for _ in range(len(queue))] == paths[10:]
+    with pytest.raises(IndexError):
+        queue.pop(0)
+    queue.close()
+
+
+def test_bounded_traversal(tmp_dir):
+    # A traversal and a snapshot under a tiny budget have the results of unbounded ones
+    tree = str(tmp_dir / "tree")
+    results, snapshots = [], []
+    for max_memory in (0, 1000):
+        path = str(tmp_dir / f"snapshot-{max_memory}")
+        writer = SnapshotWriter(path, max_memory=max_memory)
+        analyzer = Analyzer(10, collect=True, policy="extension", recorders=[writer])
+        assert traverse_directory(tree, analyzer, max_memory=max_memory) == []
+        analyzer.close()
+        results.append(analyzer.result())
+        snapshots.append(list(read_snapshot(path)))
+    assert results[0].categories == results[1].categories
+    assert sorted(results[0].big_files) == sorted(results[1].big_files)
+    assert snapshots[0] == snapshots[1]
+    assert len(snapshots[0]) == 220
@@ -0,0 +1,122 @@
+import os
+import pytest
+
+from analyzer import scan
+from analyzer.categories import Classifier
+from analyzer.throttle import IOScheduler, TokenBucket
+
+
+class FakeClock:
+    # A clock advanced by sleeping and by the operations
+    def __init__(self):
+        self.now = 0.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock():
+    yield FakeClock()
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a directory with files and subdirectories
+    for i in range(5):
+        (tmp_path / f"dir{i}").mkdir()
+        (tmp_path / f"dir{i}" / "file.txt").write_text("test" * (i + 1))
+    yield tmp_path
+
+
+def test_token_bucket(clock):
+    bucket = TokenBucket(100, burst_time=0.1, clock=clock, sleep=clock.sleep)
+    # The burst is let through, then operations wait for their tokens
+    for _ in range(10):
+        assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.01)
+    for _ in range(99):
+        bucket.take()
+    assert clock.now == pytest.approx(1.0)
+
+    # An operation bigger than the burst waits until its debt is paid
+    clock.sleep(1)
+    assert bucket.take(60) == pytest.approx(0.5)
+    bucket.set_rate(10)
+    assert bucket.take() == pytest.approx(0.1)
+
+
+def test_adaptive_rate(clock):
+    scheduler = IOScheduler(
+        metadata_rate=1000, target_latency=0.01, clock=clock, sleep=clock.sleep
+    )
+    bucket = scheduler._metadata.bucket
+
+    def operate(latency, seconds):
+        # Operations of a given latency during a number of seconds
+        end = clock.now + seconds
+        while clock.now < end:
+            with scheduler.metadata():
+                clock.now += latency
+
+    # Slow operations halve the rate down to a floor
+    operate(0.05, 1.5)
+    assert bucket.rate == 500
+    operate(0.05, 10)
+    assert bucket.rate == 50
+    # Fast operations raise it back to the budget, step by step
+    operate(0.001, 3)
+    assert 50 < bucket.rate < 1000
+    operate(0.001, 20)
+    assert bucket.rate == 1000
+    assert "lowered" not in scheduler.summary()[0]
+
+
+def test_unlimited_budgets(clock):
+    scheduler = IOScheduler(content_rate=1000, clock=clock, sleep=clock.sleep)
+    for _ in range(1000):
+        with scheduler.metadata():
+            pass
+    assert clock.slept == 0
+    with scheduler.content(2000):
+        pass
+    assert clock.slept == pytest.approx(1.9)
+    assert scheduler.summary() == [
+        "Content reads throttled to 1000.0 B/s, 1.9 s waited."
+    ]
+
+    with pytest.raises(ValueError):
+        IOScheduler(metadata_rate=-1)
+
+
+def test_throttled_scan(tmp_dir, clock):
+    scheduler = IOScheduler(metadata_rate=10, clock=clock, sleep=clock.sleep)
+    result = scan(str(tmp_dir), policy="extension", scheduler=scheduler)
+    assert result.categories == scan(str(tmp_dir), policy="extension").categories
+    # The directory stat'ed, 6 directories listed and 10 entries stat'ed, 1 operation of burst
+    assert clock.slept == pytest.approx(1.6)
+
+
+def test_throttled_links(tmp_dir, clock):
+    os.symlink(tmp_dir / "dir0" / "file.txt", tmp_dir / "link1")
+    os.symlink(tmp_dir / "dir0" / "file.txt", tmp_dir / "dir1" / "link2")
+    scheduler = IOScheduler(metadata_rate=10, clock=clock, sleep=clock.sleep)
+    scan(str(tmp_dir), policy="extension", follow_links=True, scheduler=scheduler)
+    # In addition, each link read and its target stat'ed once, as it is cached
+    assert clock.slept == pytest.approx(1.6 + 0.3)
+
+
+def test_throttled_reads(tmp_dir, clock, monkeypatch):
+    scheduler = IOScheduler(content_rate=100, clock=clock, sleep=clock.sleep)
+    classifier = Classifier(scheduler=scheduler)
+    monkeypatch.setattr(classifier._typer, "read_size", lambda: 10)
+    path = tmp_dir / "dir4" / "file.txt"
+    # Reads are charged the bytes libmagic reads: the file, up to its read size
+    classifier.classify(str(path), os.stat(path))
+    classifier.classify(str(path), os.stat(path))
+    assert clock.slept == pytest.approx(0.1)
@@ -1,7 +1,13 @@
 import os
 import pytest
 from unittest.mock import patch, MagicMock
-from analyzer.traverse import manage_dir, manage_item, traverse_directory
+from analyzer.traverse import (
+    dir_key,
+    manage_dir,
+    manage_item,
+    resolve_link,
+    traverse_directory,
+)
 from analyzer.analyze import Analyzer
 from pathlib import Path
 import shutil
@@ -55,13 +61,13 @@ def test_manage_dir(tmp_directory, capsys):
     visited = set()
     queue = []
     dir_path = str(tmp_directory)
-    manage_dir(tmp_directory, visited, queue)
-    assert dir_path in visited
+    manage_dir(dir_path, visited, queue)
+    assert dir_key(os.stat(dir_path)) in visited
     assert dir_path in queue
 
     # Test symlink loop: if a directory is added the second time
     queue.pop()
-    manage_dir(tmp_directory, visited, queue, "sym_link")
+    manage_dir(dir_path, visited, queue, "sym_link")
     captured = capsys.readouterr()
     assert (
         captured.err
@@ -70,6 +76,45 @@ def test_manage_dir(tmp_directory, capsys):
     assert queue == []
 
 
+def test_manage_dir_different_spelling(tmp_directory, capsys):
+    # The same directory reached through a differently spelled path is a loop
+    visited = set()
+    queue = []
+    manage_dir(str(tmp_directory), visited, queue)
+    manage_dir(str(tmp_directory / ".." / tmp_directory.name), visited, queue, "link")
+    captured = capsys.readouterr()
+    assert "symlink loop detected" in captured.err
+    assert queue == [str(tmp_directory)]
+
+
+def test_resolve_link_cache(tmp_dir):
+    # Links with the same contents are resolved once
+    link_cache = {}
+    Path(str(tmp_dir / "dir1" / "link_a")).symlink_to(
+        Path(str(tmp_dir / "dir1" / "dir2"))
+    )
+    Path(str(tmp_dir / "link_b")).symlink_to(Path(str(tmp_dir / "dir1" / "dir2")))
+    entries = [
+        item
+        for directory in (tmp_dir, tmp_dir / "dir1")
+        for item in os.scandir(directory)
+        if item.name in ("link_a", "link_b")
+    ]
+    resolved = [resolve_link(item, link_cache) for item in entries]
+    assert len(link_cache) == 1
+    assert resolved[0] == resolved[1]
+    assert resolved[0][0] == str(tmp_dir / "dir1" / "dir2")
+
+
+def test_traverse_directory_symlink_loop(tmp_dir, capsys, empty_analyzer):
+    # A link back to an ancestor directory is reported once and not traversed again
+    Path(str(tmp_dir / "dir1" / "dir2" / "up")).symlink_to(Path(".."))
+    traverse_directory(tmp_dir / "dir1", empty_analyzer, follow_links=True)
+    captured = capsys.readouterr()
+    assert captured.err.count("symlink loop detected") == 1
+    assert empty_analyzer._type_size_count["text"] == 7
+
+
 def test_traverse_directory(capsys, tmp_dir, empty_analyzer):
     empty_analyzer = Analyzer()
     traverse_directory(tmp_dir, empty_analyzer, follow_links=True)
@@ -0,0 +1,158 @@
+import os
+import threading
+import pytest
+
+from analyzer import watch
+from analyzer.traverse import traverse_directory
+from analyzer.watch import IncrementalAnalyzer, Watcher
+
+
+@pytest.fixture
+def tmp_dir(tmp_path):
+    # Create a directory with files of different sizes and permissions
+    watched = tmp_path / "watched"
+    (watched / "dir1").mkdir(parents=True)
+    (watched / "dir1" / "small.txt").write_text("test")
+    (watched / "big.txt").write_text("A" * 2000)
+    yield tmp_path
+
+
+@pytest.fixture
+def watcher(tmp_dir):
+    watcher = Watcher(
+        str(tmp_dir / "watched"),
+        str(tmp_dir / "watcher.sock"),
+        threshold=1000,
+        settle=0,
+        policy="extension",
+    )
+    watcher.start()
+    yield watcher
+    watcher.close()
+
+
+def poll(watcher):
+    # Apply the changes made so far
+    for _ in range(3):
+        watcher.poll(timeout=0.05)
+
+
+def test_incremental_analyzer(tmp_dir):
+    watched = tmp_dir / "watched"
+    analyzer = IncrementalAnalyzer(1000, policy="extension")
+    traverse_directory(str(watched), analyzer)
+    assert analyzer.result().categories == {
+        "directories": os.stat(watched / "dir1").st_size,
+        "text": 2004,
+    }
+    assert analyzer.result().big_files == [(str(watched / "big.txt"), 2000)]
+
+    # A changed file replaces its previous contribution
+    (watched / "big.txt").write_text("A" * 10)
+    analyzer.add(str(watched / "big.txt"))
+    assert analyzer.result().categories["text"] == 14
+    assert analyzer.result().big_files == []
+    assert analyzer.result().distributions["text"].buckets() == [
+        (4, 8, 1, 4),
+        (8, 16, 1, 10),
+    ]
+
+    # Rescan removes the vanished entries
+    (watched / "dir1" / "small.txt").unlink()
+    (watched / "dir1").rmdir()
+    analyzer.new_pass()
+    traverse_directory(str(watched), analyzer)
+    analyzer.prune(str(watched))
+    assert analyzer.result().categories == {"text": 10}
+
+    analyzer.remove_tree(str(watched / "big.txt"))
+    assert analyzer.result().categories == {}
+    assert analyzer.result().distributions == {}
+
+
+def test_watch_changes(watcher, tmp_dir):
+    watched = tmp_dir / "watched"
+    (watched / "big.txt").write_text("A" * 3000)
+    (watched / "dir1" / "small.txt").unlink()
+    os.chmod(watched / "dir1", 0o777)
+    # A new directory is scanned, including the entries created before it is watched
+    (watched / "dir2" / "sub").mkdir(parents=True)
+    (watched / "dir2" / "sub" / "new.txt").write_text("test")
+    poll(watcher)
+
+    result = watcher.result()
+    assert result.categories["text"] == 3004
+    assert result.big_files == [(str(watched / "big.txt"), 3000)]
+    assert [entry[0] for entry in result.unusual_permissions] == [str(watched / "dir1")]
+
+    # Changes in the new directory are watched
+    (watched / "dir2" / "sub" / "new.txt").write_text("test" * 10)
+    poll(watcher)
+    assert watcher.result().categories["text"] == 3040
+
+    # A directory moved out of the tree is removed with its entries
+    os.rename(watched / "dir2", tmp_dir / "moved")
+    poll(watcher)
+    assert watcher.result().categories["text"] == 3000
+    (tmp_dir / "moved" / "sub" / "new.txt").write_text("test")
+    poll(watcher)
+    assert watcher.result().categories["text"] == 3000
+
+
+def test_watch_overflow(watcher, tmp_dir, monkeypatch):
+    watched = tmp_dir / "watched"
+    # Simulate lost events: the changes are only found by the rescan
+    monkeypatch.setattr(
+        watcher._watches, "read_events", lambda: [(None, watch._IN_Q_OVERFLOW, "")]
+    )
+    (watched / "dir1" / "small.txt").unlink()
+    (watched / "new.txt").write_text("test")
+    watcher._read_events()
+    assert watcher.result().categories["text"] == 2004
+    paths = [path for path, _ in watcher.result().big_files]
+    assert paths == [str(watched / "big.txt")]
+
+
+def test_request(watcher, tmp_dir):
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        socket_path = str(tmp_dir / "watcher.sock")
+        assert "text: 2.0 KB." in watch.request(socket_path)
+        assert watch.request(socket_path, "big-files") == [
+            f"{tmp_dir / 'watched' / 'big.txt'}: 2.0 KB"
+        ]
+        assert watch.request(socket_path, "permissions") == []
+        assert watch.request(socket_path, "distribution")[0].startswith("text: 2 files")
+        assert watch.request(socket_path, "other")[0].startswith("Error")
+    finally:
+        watcher.stop()
+        thread.join()
+
+
+def test_silent_client(watcher, tmp_dir, monkeypatch):
+    import socket
+
+    monkeypatch.setattr(watch, "_CLIENT_TIMEOUT", 0.2)
+    thread = threading.Thread(target=watcher.run)
+    thread.start()
+    try:
+        socket_path = str(tmp_dir / "watcher.sock")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as silent:
+            silent.settimeout(10)
+            silent.connect(socket_path)
+            # The client sending nothing is disconnected unanswered, and doesn't hold up the others
+            assert "text: 2.0 KB." in watch.request(socket_path, timeout=5)
+            assert silent.recv(1024) == b""
+    finally:
+        watcher.stop()
+        thread.join()
+
+
+def test_socket_in_use(watcher, tmp_dir):
+    other = Watcher(str(tmp_dir / "watched"), str(tmp_dir / "watcher.sock"))
+    with pytest.raises(OSError):
+        other.start()
+    other.close()
+    # The socket of the running watcher is kept
+    assert os.path.exists(tmp_dir / "watcher.sock")